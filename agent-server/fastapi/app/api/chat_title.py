@@ -2,16 +2,75 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from app.services.ai_service import AIService
 from app.core.config import settings
+from app.core.metrics import metrics
 from langchain_openai import ChatOpenAI
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import json
+import re
 
 router = APIRouter()
 
+# Requirements at most this long are titled locally instead of by the model
+LOCAL_TITLE_MAX_WORDS = 8
+LOCAL_TITLE_MAX_CJK_CHARS = 16
+TITLE_CACHE_SIZE = 2048
+# Titles generated per model call by the batch endpoint
+TITLE_BATCH_SIZE = 40
+MAX_BATCH_REQUIREMENTS = 500
+
+# Request phrasing that carries no topic, stripped repeatedly from the start
+TITLE_PREFIXES = [
+    "i need help with", "i need help", "can you help me", "could you help me",
+    "can you please", "could you please", "can you", "could you", "would you",
+    "please help me", "please help", "help me", "please", "i want to", "i'd like to",
+    "i would like to", "i need to", "i need", "i want", "let's", "lets",
+    "能不能帮我", "能不能", "可以帮我", "可不可以", "请帮我", "请你", "帮我", "麻烦你", "麻烦",
+    "我想要", "我想", "我需要", "我要", "请",
+]
+TITLE_SUFFIXES = ["please", "thanks", "thank you", "谢谢", "吗", "呢", "吧"]
+TITLE_SMALL_WORDS = {"a", "an", "the", "and", "or", "but", "for", "to", "of", "in", "on", "at", "by", "with", "vs"}
+# A local title needs at least this many content words (CJK: about two characters per word);
+# anything less ("how are you", "ok thanks") is small talk, not a topic
+LOCAL_TITLE_MIN_CONTENT_WORDS = 2
+# Greetings, filler and function words that say nothing about the topic
+TITLE_STOP_WORDS = TITLE_SMALL_WORDS | {
+    "hi", "hello", "hey", "yo", "ok", "okay", "thanks", "thank", "thx", "yes", "yeah", "no", "nope", "sure",
+    "cool", "great", "nice", "good", "morning", "afternoon", "evening", "night", "bye", "lol",
+    "i", "me", "my", "you", "your", "we", "our", "it", "its", "this", "that", "these", "those", "there",
+    "is", "are", "am", "was", "were", "be", "been", "do", "does", "did", "doing", "have", "has", "had",
+    "can", "could", "will", "would", "should", "shall", "may", "might", "must",
+    "what", "how", "why", "when", "where", "who", "which", "so", "just", "also", "too", "very", "really",
+    "some", "something", "anything", "stuff", "thing", "things", "please", "help", "want", "need", "like",
+}
+TITLE_CJK_STOP_PHRASES = [
+    "你好", "您好", "谢谢", "好的", "没事", "哈哈", "在吗", "早上好", "晚上好", "再见",
+    "怎么样", "什么", "怎么", "为什么", "一下", "这个", "那个", "一个", "可以", "东西",
+    "我们", "你们", "我", "你", "他", "她", "它", "的", "了", "是", "吗", "呢", "吧", "啊", "嗯", "哦",
+]
+
+_CJK_RE = re.compile(r"[\u4e00-\u9fff\u3400-\u4dbf]")
+_NOT_CLEAN_RE = re.compile(r"```|https?://|[\n{}<>]")
+
+
+def normalize_requirement(user_requirement: str) -> str:
+    """Cache key for a requirement: case, whitespace and trailing punctuation do not matter"""
+    text = re.sub(r"\s+", " ", user_requirement).strip().lower()
+    return text.rstrip("?？.。!！,，~～ ")
+
+
 class ChatTitleRequest(BaseModel):
     user_requirement: str
 
 class ChatTitleResponse(BaseModel):
     title: str
 
+class ChatTitleBatchRequest(BaseModel):
+    user_requirements: List[str]
+
+class ChatTitleBatchResponse(BaseModel):
+    titles: List[str]
+
 class ChatTitleGenerator:
     """Service for generating chat titles based on user requirements"""
 
@@ -22,13 +81,53 @@ class ChatTitleGenerator:
             api_key=settings.openai_api_key,
             base_url=settings.openai_base_url,
         )
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    def _cached(self, key: str) -> Optional[str]:
+        title = self._cache.get(key)
+        if title is not None:
+            self._cache.move_to_end(key)
+        return title
+
+    def _remember(self, key: str, title: str):
+        self._cache[key] = title
+        self._cache.move_to_end(key)
+        while len(self._cache) > TITLE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def _resolve_without_llm(self, user_requirement: str) -> Optional[str]:
+        """Cache first, then the local heuristic; None means the model is needed"""
+        key = normalize_requirement(user_requirement)
+        title = self._cached(key)
+        if title is not None:
+            metrics.increment("chat_title_requests", tier="cache")
+            return title
+
+        title = self._local_title(user_requirement)
+        if title is not None:
+            metrics.increment("chat_title_requests", tier="local")
+            self._remember(key, title)
+        return title
+
+    def title_locally(self, user_requirement: str) -> str:
+        """Title from the cache or the local heuristic, never calling the model"""
+        return self._resolve_without_llm(user_requirement) or self._create_fallback_title(user_requirement)
 
     async def generate_title(self, user_requirement: str) -> str:
-        """Generate a concise, descriptive title for a chat based on user requirement"""
+        """Generate a concise, descriptive title for a chat based on user requirement
+
+        Short, clean requirements are titled locally and repeated requirements
+        come from the cache, so only the rest reach the model.
+        """
+        title = self._resolve_without_llm(user_requirement)
+        if title is not None:
+            return title
+
         if not settings.openai_api_key:
             # Fallback: create a simple title from the requirement
             return self._create_fallback_title(user_requirement)
 
+        metrics.increment("chat_title_requests", tier="llm")
         try:
             system_prompt = """You are a helpful assistant that generates concise, descriptive titles for chat conversations.
 
@@ -68,31 +167,152 @@ Generate only the title, nothing else."""
             if len(title) > 60:
                 title = title[:57] + "..."
 
+            self._remember(normalize_requirement(user_requirement), title)
             return title
 
         except Exception as e:
             print(f"Error generating title: {e}")
             return self._create_fallback_title(user_requirement)
 
-    def _create_fallback_title(self, user_requirement: str) -> str:
-        """Create a fallback title when AI generation fails"""
-        # Clean and truncate the requirement
-        title = user_requirement.strip()
-
-        # Remove common prefixes
-        prefixes_to_remove = [
-            "I need help with",
-            "Can you help me",
-            "I want to",
-            "Help me",
-            "I need",
-            "Please help",
-            "Could you",
+    async def generate_titles(self, user_requirements: List[str]) -> List[str]:
+        """Title many requirements, sending the ones that need the model in batched calls"""
+        titles: List[Optional[str]] = [self._resolve_without_llm(req) for req in user_requirements]
+
+        # Identical requirements share one slot in the prompt
+        pending: Dict[str, str] = {}
+        for requirement, title in zip(user_requirements, titles):
+            if title is None:
+                pending.setdefault(normalize_requirement(requirement), requirement)
+
+        if pending:
+            keys = list(pending)
+            if settings.openai_api_key:
+                for start in range(0, len(keys), TITLE_BATCH_SIZE):
+                    group = keys[start:start + TITLE_BATCH_SIZE]
+                    generated = await self._generate_title_batch([pending[key] for key in group])
+                    for key, title in zip(group, generated):
+                        if title:
+                            self._remember(key, title)
+
+        return [
+            title if title is not None
+            else self._cached(normalize_requirement(requirement)) or self._create_fallback_title(requirement)
+            for requirement, title in zip(user_requirements, titles)
         ]
 
-        for prefix in prefixes_to_remove:
-            if title.lower().startswith(prefix.lower()):
-                title = title[len(prefix):].strip()
+    async def _generate_title_batch(self, user_requirements: List[str]) -> List[Optional[str]]:
+        """One model call for a numbered list of requirements; missing entries come back as None"""
+        metrics.increment("chat_title_requests", len(user_requirements), tier="llm")
+        metrics.increment("chat_title_batch_calls")
+        try:
+            numbered = "\n".join(
+                f"{i}. {requirement.strip()[:500]}" for i, requirement in enumerate(user_requirements, start=1)
+            )
+            system_prompt = """You generate concise, descriptive titles (3-8 words) for chat conversations.
+
+You will get a numbered list of user requirements. Title each one independently, focusing on the main task or topic, in the language of the requirement. Avoid words like "chat about" or "help with".
+
+Return only a JSON object mapping each number to its title, e.g. {"1": "Marketing Plan for New App", "2": "Resignation Letter Writing"}."""
+
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": numbered}
+            ]
+            response = await self.llm.ainvoke(messages)
+            content = response.content.strip()
+            parsed = json.loads(content[content.find("{"):content.rfind("}") + 1])
+
+            titles = []
+            for i in range(1, len(user_requirements) + 1):
+                title = str(parsed.get(str(i), "")).strip().strip('"\'')
+                if len(title) > 60:
+                    title = title[:57] + "..."
+                titles.append(title or None)
+            return titles
+
+        except Exception as e:
+            print(f"Error generating title batch: {e}")
+            return [None] * len(user_requirements)
+
+    def _local_title(self, user_requirement: str) -> Optional[str]:
+        """Title a short, clean requirement locally; None when it needs the model"""
+        text = re.sub(r"[ \t]+", " ", user_requirement).strip()
+        if not text or _NOT_CLEAN_RE.search(text):
+            return None
+
+        cjk_chars = len(_CJK_RE.findall(text))
+        if cjk_chars > LOCAL_TITLE_MAX_CJK_CHARS:
+            return None
+        if cjk_chars == 0 and len(text.split()) > LOCAL_TITLE_MAX_WORDS:
+            return None
+        # Several sentences usually need summarizing rather than extracting
+        if len(re.findall(r"[.?!。？！]\s*\S", text)) > 0:
+            return None
+
+        title = self._strip_request_phrasing(text)
+        if not title or self._content_words(title) < LOCAL_TITLE_MIN_CONTENT_WORDS:
+            return None
+        if cjk_chars == 0:
+            title = self._title_case(title)
+        return title
+
+    @staticmethod
+    def _content_words(text: str) -> int:
+        """Words that are not greetings, filler or function words; CJK counts about two characters per word"""
+        words = re.findall(r"[a-z0-9']+", text.lower())
+        content = sum(1 for word in words if word not in TITLE_STOP_WORDS)
+        cjk_text = "".join(_CJK_RE.findall(text))
+        for phrase in TITLE_CJK_STOP_PHRASES:
+            cjk_text = cjk_text.replace(phrase, "")
+        return content + (len(cjk_text) + 1) // 2
+
+    @staticmethod
+    def _strip_request_phrasing(text: str) -> str:
+        """Remove polite prefixes, filler suffixes and trailing punctuation"""
+        title = text.strip()
+        changed = True
+        while changed:
+            changed = False
+            title = title.strip(" ,，:：?？.。!！~～")
+            lowered = title.lower()
+            for prefix in TITLE_PREFIXES:
+                if lowered.startswith(prefix) and (
+                    _CJK_RE.match(prefix) or len(title) == len(prefix) or not title[len(prefix)].isalnum()
+                ):
+                    title = title[len(prefix):]
+                    changed = True
+                    break
+            lowered = title.lower().rstrip(" ,，?？.。!！~～")
+            for suffix in TITLE_SUFFIXES:
+                if lowered.endswith(suffix) and len(lowered) > len(suffix):
+                    title = title.rstrip(" ,，?？.。!！~～")[:-len(suffix)]
+                    changed = True
+                    break
+        return title.strip()
+
+    @staticmethod
+    def _title_case(text: str) -> str:
+        """Capitalize English words, keeping small words lower-case and acronyms as they are"""
+        words = text.split()
+        result = []
+        for i, word in enumerate(words):
+            if any(ch.isupper() for ch in word):
+                result.append(word)
+            elif i > 0 and word in TITLE_SMALL_WORDS:
+                result.append(word)
+            else:
+                result.append(word[:1].upper() + word[1:])
+        return " ".join(result)
+
+    def _create_fallback_title(self, user_requirement: str) -> str:
+        """Create a fallback title when AI generation fails"""
+        # Keep the first sentence that still says something once the
+        # polite prefixes and filler are removed
+        title = ""
+        text = re.sub(r"\s+", " ", user_requirement).strip()
+        for sentence in re.split(r"(?<=[.?!。？！])\s*", text):
+            title = self._strip_request_phrasing(sentence)
+            if title:
                 break
 
         # Capitalize first letter
@@ -124,4 +344,23 @@ async def generate_chat_title(request: ChatTitleRequest):
         print(f"Error in generate_chat_title endpoint: {e}")
         # Return a fallback title
         fallback_title = title_generator._create_fallback_title(request.user_requirement)
-        return ChatTitleResponse(title=fallback_title)
\ No newline at end of file
+        return ChatTitleResponse(title=fallback_title)
+
+@router.post("/generate-chat-titles", response_model=ChatTitleBatchResponse)
+async def generate_chat_titles(request: ChatTitleBatchRequest):
+    """Generate titles for many chats at once, e.g. when backfilling untitled chats"""
+    if len(request.user_requirements) > MAX_BATCH_REQUIREMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_REQUIREMENTS} requirements per request"
+        )
+
+    try:
+        titles = await title_generator.generate_titles(request.user_requirements)
+        return ChatTitleBatchResponse(titles=titles)
+
+    except Exception as e:
+        print(f"Error in generate_chat_titles endpoint: {e}")
+        return ChatTitleBatchResponse(
+            titles=[title_generator._create_fallback_title(req) for req in request.user_requirements]
+        )
@@ -1,11 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import SessionLocal, get_db, get_chat_read_db, open_read_session, mark_written
+from app.core.metrics import metrics
+from app.core.security import get_current_user_id
 from app.models.chat import Chat
 from app.services.chat_service import ChatService
-from app.services.ai_service import AIService
+from app.services.ai_service import ANSWER_ERROR_MESSAGE, AIService
 from app.services.streaming_service import StreamingService
+from app.services.search_service import MessageSearchService
+from app.services.export_service import ChatExportService
+from app.services.ingest_service import MessageIngestService
+from app.services.summary_service import ChatSummaryService, schedule_summary_update
+from app.services.sse import ClientDisconnected, coalesce_events, until_disconnected, with_heartbeats
+from app.services.stream_hub import ChatStream, parse_event_id, stream_hub
+from app.services.idempotency import IdempotencyConflict, idempotency_store, request_fingerprint
+from app.api.chat_title import title_generator
 from pydantic import BaseModel
 from typing import Optional
 import json
@@ -16,6 +27,8 @@ router = APIRouter()
 
 class ChatMessage(BaseModel):
     message: str
+    # First message of a new chat: /stream also generates the chat title
+    first_turn: bool = False
 
 
 class ChatResponse(BaseModel):
@@ -29,114 +42,393 @@ class ChatResponse(BaseModel):
 async def get_ai_response(
     chat_id: str,
     message_data: ChatMessage,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_chat_read_db),
+    idempotency_key: Optional[str] = Header(None),
+    user_id: str = Depends(get_current_user_id)
 ):
-    """Get AI response for a chat message"""
+    """Get AI response for a chat message
+
+    A retry with the same Idempotency-Key header returns the original
+    answer (waiting for it if it is still being generated). A failed
+    answer is not replayed; the retry generates a new one.
+    """
     try:
-        chat_service = ChatService(db)
-        ai_service = AIService()
-        
-        # Get chat and validate ownership
-        chat = chat_service.get_chat(chat_id)
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
-        
-        # Get conversation history and document context
-        conversation_history = chat_service.get_conversation_history(chat_id)
-        document_context = chat_service.get_document_context(chat_id)
+        return await idempotency_store.run(
+            f"ai-response:{user_id}:{chat_id}",
+            idempotency_key,
+            request_fingerprint(message_data.model_dump()),
+            lambda: _answer(chat_id, user_id, message_data, db, read_db),
+            reusable=lambda response: response.content != ANSWER_ERROR_MESSAGE
+        )
+    except HTTPException:
+        raise
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _answer(chat_id: str, user_id: str, message_data: ChatMessage, db: Session, read_db: Session) -> ChatResponse:
+    chat_service = ChatService(db)
+    ai_service = AIService()
+    
+    # Get chat and validate ownership
+    chat = chat_service.get_user_chat(chat_id, user_id)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    # Get conversation history and document context (replica-tolerant reads)
+    history_service = ChatService(read_db)
+    conversation_history = history_service.get_conversation_history(
+        chat_id, limit=settings.context_history_fetch_limit
+    )
+    document_context = history_service.get_document_context(chat_id, message_data.message)
+    linked_documents = history_service.get_linked_documents(chat_id)
+    
+    # Older messages are covered by the running summary; send only the tail
+    summary = ChatSummaryService(read_db).get_summary(chat_id)
+    conversation_history = ChatSummaryService.recent_tail(conversation_history, summary)
+    conversation_summary = summary.summary if summary else None
+    
+    # Generate AI response
+    ai_response = await ai_service.process_message(
+        message_data.message,
+        conversation_history,
+        document_context,
+        conversation_summary,
+        linked_documents
+    )
+    
+    # Save AI message to database
+    saved_message = chat_service.create_message(
+        chat_id=chat_id,
+        content=ai_response,
+        role="assistant",
+        user_id=chat.user_id
+    )
+    schedule_summary_update(chat_id)
+    
+    return ChatResponse(
+        id=saved_message.id,
+        content=saved_message.content,
+        role=saved_message.role,
+        created_at=saved_message.created_at.isoformat()
+    )
+
+
+async def _generate_answer(
+    stream: ChatStream,
+    user_id: str,
+    message_data: ChatMessage,
+    conversation_history: list,
+    document_context: Optional[str],
+    conversation_summary: Optional[str]
+):
+    """Generate one answer into a ChatStream and save it
+
+    Runs as its own task with its own session, so it is not tied to the
+    connection that started it.
+    """
+    db = SessionLocal()
+    chat_service = ChatService(db)
+    streaming_service = StreamingService()
+    chat_id = stream.chat_id
+    
+    try:
+        if message_data.first_turn:
+            # Title and answer come from the same model call; the title is sent first
+            events = streaming_service.stream_first_turn(
+                message_data.message,
+                conversation_history,
+                document_context,
+                conversation_summary
+            )
+        else:
+            events = (
+                ("content", chunk)
+                async for chunk in streaming_service.stream_chat_response(
+                    message_data.message,
+                    conversation_history,
+                    document_context,
+                    conversation_summary
+                )
+            )
         
-        # Generate AI response
-        ai_response = await ai_service.process_message(
-            message_data.message,
-            conversation_history,
-            document_context
+        # Token chunks are merged so each event carries ~256 bytes or ~20ms of output
+        events = coalesce_events(
+            events,
+            max_bytes=settings.stream_coalesce_bytes,
+            max_delay=settings.stream_coalesce_ms / 1000
         )
         
-        # Save AI message to database
-        saved_message = chat_service.create_message(
+        title_sent = not message_data.first_turn
+        async for kind, chunk in events:
+            if not title_sent:
+                # If the model skipped the title line, title locally rather than make a second call
+                title = chunk if kind == "title" else title_generator.title_locally(message_data.message)
+                chat = chat_service.get_chat(chat_id)
+                chat.title = title
+                db.commit()
+                mark_written(f"chat:{chat_id}", f"user:{user_id}")
+                title_sent = True
+                stream.publish_title(title)
+                if kind == "title":
+                    continue
+            
+            stream.publish_content(chunk)
+        
+        # Save complete response to database (also bumps the chat's updated_at)
+        chat_service.create_message(
             chat_id=chat_id,
-            content=ai_response,
+            content=stream.content(),
             role="assistant",
-            user_id=chat.user_id
+            user_id=user_id
         )
+        schedule_summary_update(chat_id)
         
-        return ChatResponse(
-            id=saved_message.id,
-            content=saved_message.content,
-            role=saved_message.role,
-            created_at=saved_message.created_at.isoformat()
-        )
+        stream.failed = streaming_service.failed
+        stream.finish("[DONE]")
         
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except asyncio.CancelledError:
+        # Every client left and none came back: keep what was generated, marked as cut short
+        metrics.increment("chat_stream_cancelled")
+        if stream.parts:
+            chat_service.create_message(
+                chat_id=chat_id,
+                content=stream.content(),
+                role="assistant",
+                user_id=user_id,
+                truncated=True
+            )
+            schedule_summary_update(chat_id)
+        stream.failed = True
+        stream.finish(json.dumps({"error": "Stream cancelled"}))
+        raise
+        
+    except Exception as error:
+        print(f"Stream error: {error}")
+        stream.failed = True
+        stream.finish(json.dumps({"error": "Stream failed"}))
+        
+    finally:
+        db.close()
+        stream_hub.release(stream)
+
+
+def start_chat_stream(chat: Chat, message_data: ChatMessage, read_db: Session) -> ChatStream:
+    """Load the context for a chat message and start generating the answer into a new ChatStream"""
+    chat_id = chat.id
+    
+    # Get conversation history and document context (replica-tolerant reads)
+    history_service = ChatService(read_db)
+    conversation_history = history_service.get_conversation_history(
+        chat_id, limit=settings.context_history_fetch_limit
+    )
+    document_context = history_service.get_document_context(chat_id, message_data.message)
+    
+    # Older messages are covered by the running summary; send only the tail
+    summary = ChatSummaryService(read_db).get_summary(chat_id)
+    conversation_history = ChatSummaryService.recent_tail(conversation_history, summary)
+    conversation_summary = summary.summary if summary else None
+    
+    stream = stream_hub.create(chat_id)
+    stream.task = asyncio.create_task(_generate_answer(
+        stream,
+        chat.user_id,
+        message_data,
+        conversation_history,
+        document_context,
+        conversation_summary
+    ))
+    return stream
+
+
+def _stream_response(stream: ChatStream, request: Request, last_seq: int = 0) -> StreamingResponse:
+    """SSE response following a chat stream from last_seq"""
+    async def frames():
+        metrics.increment("chat_stream_subscriptions", kind="requester")
+        stream_hub.attach(stream)
+        try:
+            async for frame in until_disconnected(
+                stream.subscribe(last_seq), request.is_disconnected, settings.stream_disconnect_poll_seconds
+            ):
+                yield frame
+        except ClientDisconnected:
+            pass
+        finally:
+            stream_hub.detach(stream)
+    
+    return StreamingResponse(
+        with_heartbeats(frames(), settings.stream_heartbeat_seconds),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+            "X-Stream-Id": stream.stream_id,
+        }
+    )
 
 
 @router.post("/{chat_id}/stream")
 async def stream_ai_response(
     chat_id: str,
     message_data: ChatMessage,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_chat_read_db),
+    idempotency_key: Optional[str] = Header(None),
+    user_id: str = Depends(get_current_user_id)
 ):
-    """Stream AI response for a chat message"""
+    """Stream AI response for a chat message
+
+    Event ids are "<stream_id>:<seq>". Retrying with a Last-Event-ID header
+    re-attaches to the same generation and replays the missed events
+    instead of generating the answer again. A retry with the same
+    Idempotency-Key header does the same from the first event.
+    """
     try:
-        chat_service = ChatService(db)
-        streaming_service = StreamingService()
-        
-        # Get chat and validate ownership
-        chat = chat_service.get_chat(chat_id)
+        # Get chat and validate ownership, for resumes and retries too
+        chat = ChatService(db).get_user_chat(chat_id, user_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
         
-        # Get conversation history and document context
-        conversation_history = chat_service.get_conversation_history(chat_id)
-        document_context = chat_service.get_document_context(chat_id)
+        resume = parse_event_id(request.headers.get("last-event-id"))
+        if resume:
+            stream = stream_hub.get(resume[0])
+            if not stream or stream.chat_id != chat_id:
+                raise HTTPException(status_code=410, detail="Stream expired")
+            return _stream_response(stream, request, resume[1])
         
-        async def generate_stream():
-            full_response = ""
-            
-            try:
-                async for chunk in streaming_service.stream_chat_response(
-                    message_data.message,
-                    conversation_history,
-                    document_context
-                ):
-                    full_response += chunk
-                    data = json.dumps({"content": chunk})
-                    yield f"data: {data}\n\n"
-                
-                # Save complete response to database
-                chat_service.create_message(
-                    chat_id=chat_id,
-                    content=full_response,
-                    role="assistant",
-                    user_id=chat.user_id
-                )
-                
-                # Update chat timestamp
-                from datetime import datetime
-                chat.updated_at = datetime.utcnow()
-                db.commit()
-                
-                yield "data: [DONE]\n\n"
-                
-            except Exception as error:
-                print(f"Stream error: {error}")
-                error_data = json.dumps({"error": "Stream failed"})
-                yield f"data: {error_data}\n\n"
+        async def start() -> ChatStream:
+            return start_chat_stream(chat, message_data, read_db)
         
-        return StreamingResponse(
-            generate_stream(),
-            media_type="text/plain",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-            }
+        stream = await idempotency_store.run(
+            f"stream:{user_id}:{chat_id}",
+            idempotency_key,
+            request_fingerprint(message_data.model_dump()),
+            start,
+            reusable=lambda stream: not stream.failed
         )
+        return _stream_response(stream, request)
         
+    except HTTPException:
+        raise
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/{chat_id}/stream/{stream_id}")
+async def resume_ai_stream(
+    chat_id: str,
+    stream_id: str,
+    request: Request,
+    last_event_id: Optional[int] = None,
+    db: Session = Depends(get_chat_read_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Re-attach to an in-flight or just-finished stream
+
+    Replays events after the Last-Event-ID header (or ?last_event_id=<seq>),
+    then continues live.
+    """
+    if not ChatService(db).get_user_chat(chat_id, user_id):
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    stream = stream_hub.get(stream_id)
+    if not stream or stream.chat_id != chat_id:
+        raise HTTPException(status_code=410, detail="Stream expired")
+    
+    resume = parse_event_id(request.headers.get("last-event-id"))
+    last_seq = resume[1] if resume and resume[0] == stream_id else (last_event_id or 0)
+    return _stream_response(stream, request, last_seq)
+
+
+@router.get("/{chat_id}/live")
+async def follow_chat_streams(
+    chat_id: str,
+    request: Request,
+    db: Session = Depends(get_chat_read_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Follow every AI answer generated in a chat, e.g. for collaborators viewing it
+
+    All followers share the one upstream generation; a follower that falls
+    too far behind is skipped ahead with a snapshot event.
+    """
+    try:
+        chat = ChatService(db).get_user_chat(chat_id, user_id)
+        if not chat:
+            raise HTTPException(status_code=404, detail="Chat not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def frames():
+        try:
+            async for entry in until_disconnected(
+                stream_hub.follow_chat(chat_id), request.is_disconnected, settings.stream_disconnect_poll_seconds
+            ):
+                yield entry.frame
+        except ClientDisconnected:
+            pass
+    
+    return StreamingResponse(
+        with_heartbeats(frames(), settings.stream_heartbeat_seconds),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+@router.post("/messages:bulk")
+async def bulk_create_messages_multi_chat(
+    request: Request,
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Bulk-import messages for several chats from an NDJSON body (one message per line, each with chat_id)"""
+    try:
+        ingest_service = MessageIngestService(db)
+        return await ingest_service.ingest(request.stream(), user_id)
+        
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{chat_id}/messages:bulk")
+async def bulk_create_messages(
+    chat_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Bulk-import messages into one chat from an NDJSON body (one message per line)"""
+    try:
+        chat_service = ChatService(db)
+        
+        chat = chat_service.get_user_chat(chat_id, user_id)
+        if not chat:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        
+        ingest_service = MessageIngestService(db)
+        return await ingest_service.ingest(request.stream(), user_id, default_chat_id=chat_id)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 class CreateChatRequest(BaseModel):
     title: str
 
@@ -144,13 +436,12 @@ class CreateChatRequest(BaseModel):
 @router.post("/create")
 async def create_chat(
     request: CreateChatRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id)
 ):
     """Create a new chat"""
     try:
         chat_service = ChatService(db)
-        # TODO: Get user_id from authentication
-        user_id = "default_user"  # Placeholder
         
         chat = chat_service.create_chat(
             title=request.title,
@@ -173,42 +464,109 @@ async def create_chat(
 @router.get("/list")
 async def list_chats(
     include_archived: bool = False,
-    db: Session = Depends(get_db)
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id)
 ):
-    """List user chats"""
+    """List user chats, newest first, with message counts and last-message previews"""
     try:
-        chat_service = ChatService(db)
-        # TODO: Get user_id from authentication
-        user_id = "default_user"  # Placeholder
+        read_db = open_read_session(f"user:{user_id}")
+        try:
+            chat_service = ChatService(read_db)
+            chats, next_cursor = chat_service.get_user_chats_page(
+                user_id,
+                include_archived=include_archived,
+                limit=limit,
+                cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            read_db.close()
+        
+        return {
+            "chats": chats,
+            "next_cursor": next_cursor
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/search")
+async def search_messages(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    chat_id: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Full-text search over the user's chat messages with highlighted snippets"""
+    try:
+        if not q.strip():
+            raise HTTPException(status_code=400, detail="Search query cannot be empty")
         
-        chats = chat_service.get_user_chats(user_id, include_archived)
+        read_db = open_read_session(f"user:{user_id}")
+        try:
+            results, next_offset = MessageSearchService(read_db).search(
+                user_id, q, limit=limit, offset=offset, chat_id=chat_id
+            )
+        finally:
+            read_db.close()
         
-        return [
-            {
-                "id": chat.id,
-                "title": chat.title,
-                "user_id": chat.user_id,
-                "created_at": chat.created_at.isoformat(),
-                "updated_at": chat.updated_at.isoformat(),
-                "is_archived": chat.is_archived
-            }
-            for chat in chats
-        ]
+        return {
+            "results": results,
+            "next_offset": next_offset
+        }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/export")
+async def export_chats(
+    include_archived: bool = True,
+    gzip: bool = False,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Stream all of the user's chats and messages as NDJSON"""
+    
+    def generate_export():
+        # The session lives as long as the stream, not the request handler
+        read_db = open_read_session(f"user:{user_id}")
+        try:
+            yield from ChatExportService(read_db).iter_chunks(
+                user_id, include_archived=include_archived, compress=gzip
+            )
+        finally:
+            read_db.close()
+    
+    filename = "chats.ndjson.gz" if gzip else "chats.ndjson"
+    return StreamingResponse(
+        generate_export(),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-cache",
+        }
+    )
+
+
 @router.get("/{chat_id}")
 async def get_chat(
     chat_id: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_chat_read_db),
+    user_id: str = Depends(get_current_user_id)
 ):
     """Get chat details with messages"""
     try:
         chat_service = ChatService(db)
         
-        chat = chat_service.get_chat(chat_id)
+        chat = chat_service.get_user_chat(chat_id, user_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
         
@@ -225,6 +583,8 @@ async def get_chat(
             "messages": conversation_history
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -233,11 +593,12 @@ async def get_chat(
 async def update_chat(
     chat_id: str,
     request: CreateChatRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id)
 ):
     """Update chat title"""
     try:
-        chat = db.query(Chat).filter(Chat.id == chat_id).first()
+        chat = ChatService(db).get_user_chat(chat_id, user_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
         
@@ -245,6 +606,7 @@ async def update_chat(
         from datetime import datetime
         chat.updated_at = datetime.utcnow()
         db.commit()
+        mark_written(f"chat:{chat_id}", f"user:{chat.user_id}")
         
         return {
             "id": chat.id,
@@ -252,5 +614,7 @@ async def update_chat(
             "updated_at": chat.updated_at.isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
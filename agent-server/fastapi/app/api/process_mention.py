@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Any, Union, Dict, List
 import json
 import logging
 
-from ..services.ai_service import AIService
+from ..core.security import get_current_user_id
+from ..services.ai_service import AIService, is_mention_error
+from ..services.idempotency import IdempotencyConflict, idempotency_store, request_fingerprint
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -14,17 +17,28 @@ class MentionRequest(BaseModel):
     document_content: Optional[str] = ""
     document_title: Optional[str] = ""
     block_id: Optional[str] = ""
+    mode: Optional[str] = "auto"  # "auto" | "block" | "document"
+    document_id: Optional[str] = None  # 用于合并同一文档上的并发提及
 
 class AIResponse(BaseModel):
-    type: str  # "modify_content", "add_content", "suggest_edit", "no_action"
+    type: str  # "modify_content", "add_content", "suggest_edit", "delete_content", "move_content", "duplicate_content", "no_action"
     content: Optional[Union[str, List[Dict[str, Any]], Dict[str, Any]]] = None
     suggestion: Optional[str] = None
     reasoning: str
+    blockId: Optional[str] = None
+    patch: Optional[Dict[str, Any]] = None
+    patches: Optional[List[Dict[str, Any]]] = None
 
 @router.post("/process-mention", response_model=AIResponse)
-async def process_mention(request: MentionRequest):
+async def process_mention(
+    request: MentionRequest,
+    idempotency_key: Optional[str] = Header(None),
+    user_id: str = Depends(get_current_user_id)
+):
     """
     处理评论中的AI提及请求
+
+    带相同 Idempotency-Key 的重试直接复用原请求的结果（原请求仍在处理时等待其完成）
     """
     try:
         logger.info(f"Processing AI mention: {request.prompt[:100]}...")
@@ -34,16 +48,29 @@ async def process_mention(request: MentionRequest):
 
         # 调用AI服务处理
         ai_service = AIService()
-        result = await ai_service.process_mention_request(
-            instruction=request.prompt,
-            action_type=action,
-            document_content=request.document_content,
-            document_title=request.document_title,
-            block_id=request.block_id
+
+
+        # 处理出错的结果不保存，重试时重新处理
+        result = await idempotency_store.run(
+            f"process-mention:{user_id}",
+            idempotency_key,
+            request_fingerprint(request.model_dump()),
+            lambda: ai_service.process_mention_request(
+                instruction=request.prompt,
+                action_type=action,
+                document_content=request.document_content,
+                document_title=request.document_title,
+                block_id=request.block_id,
+                mode=request.mode or "auto",
+                document_id=request.document_id
+            ),
+            reusable=lambda result: not is_mention_error(result)
         )
 
         return result
 
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing AI mention: {str(e)}")
         return AIResponse(
@@ -51,6 +78,40 @@ async def process_mention(request: MentionRequest):
             reasoning=f"处理AI指令时出错: {str(e)}"
         )
 
+@router.post("/process-mention/stream")
+async def process_mention_stream(request: MentionRequest):
+    """
+    以SSE流式处理评论中的AI提及请求
+
+    事件：field（type/reasoning/blockId 确定后立即发送）、delta（content/suggestion 增量）、
+    result（完整响应，与 /process-mention 的返回格式相同）
+    """
+    logger.info(f"Streaming AI mention: {request.prompt[:100]}...")
+
+    action = parse_ai_instruction(request.prompt)
+    ai_service = AIService()
+
+    async def generate_events():
+        async for event, data in ai_service.stream_mention_request(
+            instruction=request.prompt,
+            action_type=action,
+            document_content=request.document_content,
+            document_title=request.document_title,
+            block_id=request.block_id,
+            mode=request.mode or "auto"
+        ):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        generate_events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
 def parse_ai_instruction(prompt: str) -> str:
     """
     解析AI指令类型
@@ -0,0 +1,258 @@
+from fastapi import APIRouter, WebSocket, status
+from app.core.config import settings
+from app.core.database import SessionLocal, open_read_session
+from app.core.metrics import metrics
+from app.core.security import decode_access_token
+from app.services.ai_service import AIService
+from app.services.chat_service import ChatService
+from app.services.requirement_service import get_user_task, watch_task
+from app.services.stream_hub import ChatStream, StreamEvent, stream_hub
+from app.api.chats import ChatMessage, start_chat_stream
+from app.api.process_mention import parse_ai_instruction
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+import asyncio
+import json
+import uuid
+
+router = APIRouter()
+
+# (event, data, seq) as sent on a channel; seq is set on chat stream channels only
+ChannelEvent = Tuple[str, Any, Optional[int]]
+
+
+class ChannelFlow:
+    """Credit window of one channel
+
+    Each event sent on the channel spends one credit and the client grants
+    more with {"type": "credit"}. A channel out of credit stops reading its
+    source, so one slow consumer never blocks the other channels; chat
+    followers that stop long enough are skipped ahead with a snapshot.
+    """
+
+    def __init__(self, credits: int):
+        self.credits = credits
+        self._available = asyncio.Event()
+        if credits > 0:
+            self._available.set()
+
+    def grant(self, credits: int):
+        self.credits += credits
+        if self.credits > 0:
+            self._available.set()
+
+    async def acquire(self):
+        while self.credits <= 0:
+            self._available.clear()
+            await self._available.wait()
+        self.credits -= 1
+
+
+async def _chat_events(entries: AsyncIterator[StreamEvent], with_seq: bool) -> AsyncIterator[ChannelEvent]:
+    """Chat stream events as channel events; [DONE] becomes a "done" event"""
+    async for entry in entries:
+        seq = entry.seq if with_seq else None
+        if entry.data == "[DONE]":
+            yield "done", None, seq
+        else:
+            yield entry.event or "message", json.loads(entry.data), seq
+
+
+async def _stream_events(stream: ChatStream, last_seq: int) -> AsyncIterator[ChannelEvent]:
+    stream_hub.attach(stream)
+    try:
+        async for event in _chat_events(stream.events(last_seq), with_seq=True):
+            yield event
+    finally:
+        stream_hub.detach(stream)
+
+
+async def _requirement_events(task_id: str) -> AsyncIterator[ChannelEvent]:
+    async for task in watch_task(task_id):
+        yield "progress", task, None
+
+
+async def _mention_events(request: Dict[str, Any]) -> AsyncIterator[ChannelEvent]:
+    prompt = request.get("prompt") or ""
+    ai_service = AIService()
+    async for event, data in ai_service.stream_mention_request(
+        instruction=prompt,
+        action_type=parse_ai_instruction(prompt),
+        document_content=request.get("document_content") or "",
+        document_title=request.get("document_title") or "",
+        block_id=request.get("block_id") or "",
+        mode=request.get("mode") or "auto"
+    ):
+        yield event, data, None
+
+
+class MultiplexConnection:
+    """One client connection carrying any number of named channels
+
+    Every channel is pumped by its own task into a shared outgoing queue,
+    which a single writer drains onto the socket.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.channels: Dict[str, Tuple[asyncio.Task, ChannelFlow]] = {}
+        self.outgoing: asyncio.Queue = asyncio.Queue()
+
+    async def run(self):
+        writer = asyncio.create_task(self._write())
+        try:
+            while True:
+                frame = await self.websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    break
+                text = frame.get("text")
+                if text is None:
+                    # receive_text() would raise on a binary frame and drop the connection
+                    self._send(None, "error", {"detail": "Binary frames are not supported"})
+                    continue
+                try:
+                    message = json.loads(text)
+                    if not isinstance(message, dict):
+                        raise ValueError("Message must be a JSON object")
+                except ValueError as e:
+                    self._send(None, "error", {"detail": str(e)})
+                    continue
+                try:
+                    self._handle(message)
+                except (ValueError, KeyError, TypeError) as e:
+                    self._send(message.get("channel"), "error", {"detail": str(e)}, ref=message.get("ref"))
+                except Exception as e:
+                    # e.g. a database error: fail this request, keep the connection
+                    print(f"WebSocket request error: {e}")
+                    self._send(message.get("channel"), "error", {"detail": str(e)}, ref=message.get("ref"))
+        finally:
+            for task, _ in list(self.channels.values()):
+                task.cancel()
+            writer.cancel()
+
+    async def _write(self):
+        while True:
+            message = await self.outgoing.get()
+            await self.websocket.send_text(json.dumps(message, ensure_ascii=False))
+
+    def _send(self, channel: Optional[str], event: str, data: Any = None, seq: Optional[int] = None, ref: Any = None):
+        message = {"channel": channel, "event": event, "data": data}
+        if seq is not None:
+            message["seq"] = seq
+        if ref is not None:
+            message["ref"] = ref
+        self.outgoing.put_nowait(message)
+
+    def _handle(self, message: Dict[str, Any]):
+        kind = message["type"]
+        ref = message.get("ref")
+
+        if kind == "credit":
+            entry = self.channels.get(message["channel"])
+            if entry:
+                entry[1].grant(int(message.get("credits", settings.ws_channel_window)))
+        elif kind == "unsubscribe":
+            entry = self.channels.pop(message["channel"], None)
+            if entry:
+                entry[0].cancel()
+                self._send(message["channel"], "closed", ref=ref)
+        elif kind == "subscribe":
+            channel = message["channel"]
+            self._open(channel, self._subscription(channel, message), ref)
+        elif kind == "chat":
+            stream = self._start_chat(message)
+            self._open(f"stream:{stream.stream_id}", _stream_events(stream, 0), ref)
+        elif kind == "mention":
+            channel = f"mention:{ref or uuid.uuid4()}"
+            self._open(channel, _mention_events(message), ref)
+        else:
+            raise ValueError(f"Unknown message type: {kind}")
+
+    def _subscription(self, channel: str, message: Dict[str, Any]) -> AsyncIterator[ChannelEvent]:
+        """Source for a "chat:<id>", "stream:<id>" or "requirement:<task_id>" channel"""
+        kind, _, key = channel.partition(":")
+        if kind == "chat":
+            if not self._owns_chat(key):
+                raise ValueError("Chat not found")
+            return _chat_events(stream_hub.follow_chat(key), with_seq=False)
+        if kind == "stream":
+            stream = stream_hub.get(key)
+            if not stream or not self._owns_chat(stream.chat_id):
+                raise ValueError("Stream expired")
+            return _stream_events(stream, int(message.get("last_seq") or 0))
+        if kind == "requirement":
+            if not get_user_task(key, self.user_id):
+                raise ValueError("Task not found")
+            return _requirement_events(key)
+        raise ValueError(f"Unknown channel: {channel}")
+
+    def _owns_chat(self, chat_id: str) -> bool:
+        read_db = open_read_session(f"chat:{chat_id}")
+        try:
+            return ChatService(read_db).get_user_chat(chat_id, self.user_id) is not None
+        finally:
+            read_db.close()
+
+    def _start_chat(self, message: Dict[str, Any]) -> ChatStream:
+        chat_id = message["chat_id"]
+        db = SessionLocal()
+        try:
+            chat = ChatService(db).get_user_chat(chat_id, self.user_id)
+            if not chat:
+                raise ValueError("Chat not found")
+            read_db = open_read_session(f"chat:{chat_id}")
+            try:
+                message_data = ChatMessage(message=message["message"], first_turn=bool(message.get("first_turn")))
+                return start_chat_stream(chat, message_data, read_db)
+            finally:
+                read_db.close()
+        finally:
+            db.close()
+
+    def _open(self, channel: str, source: AsyncIterator[ChannelEvent], ref: Any):
+        if channel in self.channels:
+            raise ValueError(f"Already subscribed: {channel}")
+        if len(self.channels) >= settings.ws_max_channels:
+            raise ValueError("Too many channels")
+        flow = ChannelFlow(settings.ws_channel_window)
+        task = asyncio.create_task(self._pump(channel, source, flow))
+        self.channels[channel] = (task, flow)
+        metrics.increment("ws_channels_opened", kind=channel.partition(":")[0])
+        self._send(channel, "opened", {"credits": flow.credits}, ref=ref)
+
+    async def _pump(self, channel: str, source: AsyncIterator[ChannelEvent], flow: ChannelFlow):
+        try:
+            async for event, data, seq in source:
+                await flow.acquire()
+                self._send(channel, event, data, seq)
+            self._send(channel, "closed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WebSocket channel {channel} error: {e}")
+            self._send(channel, "error", {"detail": str(e)})
+        finally:
+            await source.aclose()
+            if self.channels.get(channel, (None,))[0] is asyncio.current_task():
+                del self.channels[channel]
+
+
+@router.websocket("/ws")
+async def multiplex(websocket: WebSocket, token: Optional[str] = None):
+    """One authenticated connection for chat streams, mention results and requirement progress
+
+    Connect with ?token=<access token>. Client messages are JSON objects:
+    {"type": "subscribe", "channel": "chat:<id>" | "stream:<id>" | "requirement:<task_id>"},
+    {"type": "chat", "chat_id", "message", "first_turn"}, {"type": "mention", "ref", "prompt", ...},
+    {"type": "credit", "channel", "credits"} and {"type": "unsubscribe", "channel"}.
+    Server messages are {"channel", "event", "data"} (plus "seq" on stream channels
+    and "ref" echoing the request that opened the channel).
+    """
+    user_id = decode_access_token(token) if token else None
+    if not user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    metrics.increment("ws_connections")
+    await MultiplexConnection(websocket, user_id).run()
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from sqlalchemy.orm import Session
 from app.core.database import get_db
+from app.core.security import get_current_user_id
 from app.services.requirement_service import RequirementService
+from app.services.idempotency import IdempotencyConflict, idempotency_store, request_fingerprint
 from pydantic import BaseModel
+from typing import Optional
 
 router = APIRouter()
 
@@ -20,21 +23,38 @@ class RequirementResponse(BaseModel):
 @router.post("/generate")
 async def generate_requirements(
     request: RequirementRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
+    user_id: str = Depends(get_current_user_id)
 ):
-    """Trigger requirement generation process"""
+    """Trigger requirement generation process
+
+    A retry with the same Idempotency-Key header gets the original task id
+    instead of starting another generation.
+    """
     try:
         requirement_service = RequirementService(db)
-        task_id = await requirement_service.start_requirement_generation(
-            request.initial_requirements
-        )
 
-        return RequirementResponse(
-            task_id=task_id,
-            status="started",
-            message="Requirement generation process has been initiated"
+
+        async def start() -> RequirementResponse:
+            task_id = await requirement_service.start_requirement_generation(
+                request.initial_requirements, user_id
+            )
+            return RequirementResponse(
+                task_id=task_id,
+                status="started",
+                message="Requirement generation process has been initiated"
+            )
+
+        return await idempotency_store.run(
+            f"requirements:{user_id}",
+            idempotency_key,
+            request_fingerprint(request.model_dump()),
+            start
         )
 
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -42,18 +62,23 @@ async def generate_requirements(
 @router.get("/status/{task_id}")
 async def get_requirement_status(
     task_id: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id)
 ):
     """Get status of requirement generation task"""
     try:
         requirement_service = RequirementService(db)
-        status = requirement_service.get_task_status(task_id)
+
+
+        status = requirement_service.get_task_status(task_id, user_id)
 
         if not status:
             raise HTTPException(status_code=404, detail="Task not found")
 
         return status
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -62,15 +87,18 @@ async def get_requirement_status(
 async def get_requirement_result(
     task_id: str,
     formatted: bool = True,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id)
 ):
     """Get results of completed requirement generation task"""
     try:
         requirement_service = RequirementService(db)
-        results = requirement_service.get_task_results(task_id)
+
+
+        results = requirement_service.get_task_results(task_id, user_id)
 
         if not results:
-            task_status = requirement_service.get_task_status(task_id)
+            task_status = requirement_service.get_task_status(task_id, user_id)
             if not task_status:
                 raise HTTPException(status_code=404, detail="Task not found")
             elif task_status["status"] != "completed":
@@ -87,6 +115,8 @@ async def get_requirement_result(
         else:
             return results
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -94,16 +124,18 @@ async def get_requirement_result(
 @router.post("/generate-from-chat")
 async def generate_requirements_from_chat(
     request: RequirementRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id)
 ):
     """Generate requirements from a chat-like conversation"""
     try:
         requirement_service = RequirementService(db)
 
+
         # This endpoint is designed to work with chat interfaces
         # The initial_requirements can be a conversational input
         task_id = await requirement_service.start_requirement_generation(
-            request.initial_requirements
+            request.initial_requirements, user_id
         )
 
         return RequirementResponse(
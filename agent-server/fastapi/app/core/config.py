@@ -15,11 +15,62 @@ load_dotenv(dotenv_path=env_path)
 class Settings(BaseSettings):
     # Database Configuration
     database_url: Optional[str] = "sqlite:///./test.db"
+    # Optional read replica for list/detail/history reads
+    database_replica_url: Optional[str] = None
+    # Seconds reads stay on the primary after a chat's own writes
+    replica_sticky_seconds: float = 5.0
+    # Move messages of chats archived longer than this to cold storage
+    cold_storage_after_days: int = 30
+    cold_storage_interval_seconds: int = 3600
 
     # OpenAI Configuration
     openai_api_key: Optional[str] = None
     openai_base_url: str = "https://api.openai.com/v1"
 
+    # Prompt context budget (estimated tokens)
+    context_max_tokens: int = 16000
+    context_response_reserve_tokens: int = 2000
+    # Messages fetched for AI context; the budget decides how many are sent
+    context_history_fetch_limit: int = 50
+    # Linked-document retrieval: budget and number of chunks per turn
+    document_context_max_tokens: int = 3000
+    document_context_top_k: int = 8
+    # Blocks sent on each side of the target block in block-scoped mention edits
+    mention_neighbor_blocks: int = 3
+    # Window for merging concurrent block mentions on one document (0 disables)
+    mention_batch_window_ms: int = 150
+    mention_batch_max_size: int = 8
+    # Whole-document mentions above this size are split into block-aligned
+    # chunks and processed in parallel, at most mention_map_concurrency at once
+    mention_map_threshold_tokens: int = 6000
+    mention_chunk_tokens: int = 1500
+    mention_map_concurrency: int = 4
+    # Chat SSE streams: token chunks are merged until either threshold is hit,
+    # and an idle stream sends a heartbeat comment
+    stream_coalesce_ms: int = 20
+    stream_coalesce_bytes: int = 256
+    stream_heartbeat_seconds: float = 15.0
+    stream_disconnect_poll_seconds: float = 0.5
+    # Resumable streams: events kept per stream for Last-Event-ID replay, how long
+    # an unwatched generation waits for a reconnect before it is cancelled, and
+    # how long a finished stream stays replayable
+    stream_replay_buffer_events: int = 2048
+    stream_resume_grace_seconds: float = 10.0
+    stream_replay_ttl_seconds: float = 30.0
+    # Events a chat follower may fall behind before it is skipped ahead to a snapshot
+    stream_subscriber_max_lag: int = 64
+    # WebSocket multiplexing: events a channel may send before the client grants
+    # more credit, and channels open per connection
+    ws_channel_window: int = 32
+    ws_max_channels: int = 16
+    # Completed responses kept for Idempotency-Key retries
+    idempotency_ttl_seconds: float = 3600.0
+    idempotency_max_entries: int = 2048
+    # Rolling chat summaries: recent messages kept verbatim, and how many
+    # older messages must pile up before they are folded into the summary
+    summary_tail_messages: int = 6
+    summary_min_new_messages: int = 4
+
     # CORS Configuration
     cors_origins: str = "http://localhost:3001"
 
@@ -51,6 +102,7 @@ class Settings(BaseSettings):
         print(f"   - .env file path: {env_path}")
         print(f"   - .env file exists: {'✅' if env_path.exists() else '❌'}")
         print(f"   - Database URL: {'✅ PostgreSQL' if self.database_url and 'postgresql' in self.database_url else '⚠ SQLite default'}")
+        print(f"   - Read replica: {'✅ Configured' if self.database_replica_url else '❌ Not configured'}")
         print(f"   - OpenAI API Key: {'✅ Set' if self.openai_api_key else '❌ Missing'}")
         print(f"   - OpenAI Base URL: {self.openai_base_url}")
         print(f"   - CORS Origins: {self.cors_origins_list}")
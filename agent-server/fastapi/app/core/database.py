@@ -1,17 +1,81 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from typing import Dict, Optional
+from threading import Lock
+import time
 from .config import settings
+from .metrics import metrics
 
 engine = create_engine(settings.database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replica for read-heavy endpoints
+read_engine = (
+    create_engine(settings.database_replica_url)
+    if settings.database_replica_url else None
+)
+ReadSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    if read_engine is not None else None
+)
+
 Base = declarative_base()
 
+# Last write time per sticky key ("chat:<id>", "user:<id>"), used for read-your-writes
+_recent_writes: Dict[str, float] = {}
+_recent_writes_lock = Lock()
+
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def mark_written(*keys: str):
+    """Record a write so reads for these keys stay on the primary for a while"""
+    now = time.monotonic()
+    with _recent_writes_lock:
+        for key in keys:
+            _recent_writes[key] = now
+        # Drop expired entries opportunistically so the map stays small
+        if len(_recent_writes) > 10000:
+            cutoff = now - settings.replica_sticky_seconds
+            for key in [k for k, t in _recent_writes.items() if t < cutoff]:
+                del _recent_writes[key]
+
+
+def _recently_written(key: str) -> bool:
+    with _recent_writes_lock:
+        written_at = _recent_writes.get(key)
+    return written_at is not None and time.monotonic() - written_at < settings.replica_sticky_seconds
+
+
+def open_read_session(sticky_key: Optional[str] = None) -> Session:
+    """Open a session for a replica-tolerant read
+
+    Falls back to the primary when no replica is configured, or when the
+    sticky key was written recently so the caller sees its own writes.
+    """
+    if ReadSessionLocal is None:
+        metrics.increment("db_read_route", route="primary_no_replica")
+        return SessionLocal()
+
+    if sticky_key and _recently_written(sticky_key):
+        metrics.increment("db_read_route", route="primary_sticky")
+        return SessionLocal()
+
+    metrics.increment("db_read_route", route="replica")
+    return ReadSessionLocal()
+
+
+def get_chat_read_db(chat_id: str):
+    """Dependency: replica-tolerant session for reads scoped to one chat"""
+    db = open_read_session(f"chat:{chat_id}")
+    try:
+        yield db
+    finally:
+        db.close()
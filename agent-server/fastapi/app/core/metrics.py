@@ -0,0 +1,37 @@
+from collections import defaultdict
+from threading import Lock
+from typing import Dict
+
+
+class Metrics:
+    """Minimal in-process counters exposed through the /metrics endpoint"""
+
+    def __init__(self):
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> str:
+        if not labels:
+            return name
+        label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+        return f"{name}{{{label_str}}}"
+
+    def increment(self, name: str, value: int = 1, **labels: str):
+        """Increment a counter, optionally split by labels"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def get(self, name: str, **labels: str) -> int:
+        """Read the current value of a counter"""
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return a copy of all counters"""
+        with self._lock:
+            return dict(self._counters)
+
+
+metrics = Metrics()
@@ -0,0 +1,50 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from app.models.chat import Base
+
+# Columns added to tables that already exist in deployed databases:
+# (table, column, DDL type, value for existing rows)
+ADDED_COLUMNS = [
+    ("chats", "archived_at", "TIMESTAMP", None),
+    ("chats", "messages_tiered", "VARCHAR DEFAULT 'false'", "'false'"),
+    ("messages", "truncated", "VARCHAR DEFAULT 'false'", "'false'"),
+]
+
+# Indexes added to tables that already exist (create_all only indexes new tables):
+# (index, table, columns)
+ADDED_INDEXES = [
+    # Keyset pagination of the chat list
+    ("ix_chats_user_archived_updated", "chats", "user_id, is_archived, updated_at"),
+    ("ix_messages_chat_created", "messages", "chat_id, created_at"),
+]
+
+# Data fixes run after the columns exist; each must be safe to re-run
+BACKFILLS = [
+    # Chats archived before archived_at existed would otherwise never be tiered
+    "UPDATE chats SET archived_at = updated_at WHERE is_archived = 'true' AND archived_at IS NULL",
+]
+
+
+def upgrade_schema(engine: Engine):
+    """Bring the database up to the current models; runs on every start
+
+    Missing tables (e.g. cold_message_batches) are created, missing columns
+    and indexes are added to existing tables, and columns are backfilled.
+    """
+    Base.metadata.create_all(engine)
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, column, ddl_type, backfill in ADDED_COLUMNS:
+            if column in {c["name"] for c in inspector.get_columns(table)}:
+                continue
+            print(f"[SCHEMA] Adding column {table}.{column}")
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+            if backfill is not None:
+                conn.execute(text(f"UPDATE {table} SET {column} = {backfill} WHERE {column} IS NULL"))
+
+        for index, table, columns in ADDED_INDEXES:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns})"))
+
+        for statement in BACKFILLS:
+            conn.execute(text(statement))
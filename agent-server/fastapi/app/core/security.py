@@ -0,0 +1,37 @@
+from app.core.config import settings
+from fastapi import Header, HTTPException, status
+from jose import JWTError, jwt
+from typing import Optional
+
+# Owner of HTTP requests sent without an access token, until every client sends one
+DEFAULT_USER_ID = "default_user"
+
+
+def decode_access_token(token: str) -> Optional[str]:
+    """Return the user id ("sub") of a valid access token, or None"""
+    try:
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    except JWTError:
+        return None
+    user_id = payload.get("sub")
+    return str(user_id) if user_id else None
+
+
+def get_current_user_id(authorization: Optional[str] = Header(None)) -> str:
+    """Dependency resolving the request's user from "Authorization: Bearer <token>"
+
+    Uses the same token and decoding as the WebSocket endpoint, so chats
+    and tasks created over HTTP belong to the user the socket sees. Requests
+    without a token act as DEFAULT_USER_ID; an invalid token is rejected.
+    """
+    if not authorization:
+        return DEFAULT_USER_ID
+    scheme, _, token = authorization.partition(" ")
+    user_id = decode_access_token(token.strip()) if scheme.lower() == "bearer" else None
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid access token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user_id
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Index, Integer, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -15,9 +15,17 @@ class Chat(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_archived = Column(String, default="false")
+    archived_at = Column(DateTime, nullable=True)
+    # "true" when the chat's messages live in cold_message_batches
+    messages_tiered = Column(String, default="false")
     
     messages = relationship("Message", back_populates="chat")
 
+    __table_args__ = (
+        # Serves the paginated chat list: filter by owner/archive flag, walk by recency
+        Index("ix_chats_user_archived_updated", "user_id", "is_archived", "updated_at"),
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -28,5 +36,37 @@ class Message(Base):
     chat_id = Column(String, ForeignKey("chats.id"), nullable=False)
     user_id = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # "true" when the client disconnected and only a partial answer was saved
+    truncated = Column(String, default="false")
     
-    chat = relationship("Chat", back_populates="messages")
\ No newline at end of file
+    chat = relationship("Chat", back_populates="messages")
+
+    __table_args__ = (
+        Index("ix_messages_chat_created", "chat_id", "created_at"),
+    )
+
+
+class ColdMessageBatch(Base):
+    """Compressed messages of a long-archived chat, moved out of the hot messages table"""
+    __tablename__ = "cold_message_batches"
+
+    id = Column(String, primary_key=True)
+    chat_id = Column(String, ForeignKey("chats.id"), nullable=False, index=True)
+    payload = Column(LargeBinary, nullable=False)  # zlib-compressed JSON list of messages
+    message_count = Column(Integer, nullable=False)
+    last_role = Column(String, nullable=True)
+    last_snippet = Column(Text, nullable=True)
+    last_created_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+
+class ChatSummary(Base):
+    """Running summary of a chat's older messages, maintained in the background"""
+    __tablename__ = "chat_summaries"
+
+    chat_id = Column(String, ForeignKey("chats.id"), primary_key=True)
+    summary = Column(Text, nullable=False)
+    # created_at of the newest message folded into the summary
+    summarized_until = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime, Text, Boolean
+from sqlalchemy.ext.declarative import declarative_base
+
+# Owned by the Next.js app's Prisma schema: kept out of the agent's own
+# metadata so create_all never creates an empty Document table here
+PrismaBase = declarative_base()
+
+
+class Document(PrismaBase):
+    """Read-only mapping of the Next.js app's Prisma `Document` table"""
+    __tablename__ = "Document"
+
+    id = Column(String, primary_key=True)
+    title = Column(String, nullable=False)
+    content = Column(Text, nullable=True)  # BlockNote block JSON
+    chat_id = Column("chatId", String, nullable=True)
+    is_archived = Column("isArchived", Boolean, default=False)
+    updated_at = Column("updatedAt", DateTime)
@@ -1,15 +1,107 @@
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.context_budget import ContextBudgeter, estimate_tokens
+from app.services.document_summary_service import DocumentSummarizer
+from app.services.blocknote_service import ExtractedDocument, apply_block_patches, get_extracted_document
+from app.services.json_stream import IncrementalJSONParser
+from app.services.mention_batcher import mention_batcher
+from app.services.mention_fast_path import match_local_edit
+import asyncio
+import hashlib
 import json
-from typing import List, Dict, Optional, Any, Union
+from typing import List, Dict, Optional, Any, Union, AsyncGenerator, Tuple
 from pydantic import BaseModel
 
+# Keyword rules for the local query classifier, checked in order
+QUERY_TASK_KEYWORDS = [
+    ("writing_assistance", [
+        "write", "rewrite", "draft", "edit", "polish", "proofread", "rephrase",
+        "写", "改写", "润色", "修改", "起草", "编辑", "扩写", "缩写",
+    ]),
+    ("document_analysis", [
+        "document", "this doc", "the doc", "summarize", "summary", "outline", "key points",
+        "文档", "总结", "摘要", "概括", "要点", "大纲",
+    ]),
+    ("qa", [
+        "?", "？", "what", "how", "why", "when", "where", "who", "which", "explain",
+        "什么", "怎么", "为什么", "如何", "哪", "谁", "吗", "解释",
+    ]),
+]
+
+# Phrases that mean the answer depends on understanding the linked documents as a whole
+DOCUMENT_ANALYSIS_KEYWORDS = [
+    "document", "this doc", "summarize", "summary", "overview", "key points", "according to",
+    "文档", "总结", "摘要", "概括", "要点", "根据",
+]
+
+
+def classify_query(user_query: str) -> Dict[str, Any]:
+    """Classify a query into a task type and whether it needs document analysis"""
+    content = user_query.lower()
+
+    task_type = "chat"
+    for candidate, keywords in QUERY_TASK_KEYWORDS:
+        if any(keyword in content for keyword in keywords):
+            task_type = candidate
+            break
+
+    needs_document_analysis = task_type == "document_analysis" or any(
+        keyword in content for keyword in DOCUMENT_ANALYSIS_KEYWORDS
+    )
+    return {"taskType": task_type, "needsDocumentAnalysis": needs_document_analysis}
+
+# Returned in place of an answer when the model call fails
+ANSWER_ERROR_MESSAGE = "Sorry, I encountered an error while processing your request. Please try again."
+MENTION_ERROR_PREFIX = "AI处理时出错"
+
+
+def is_mention_error(result: "AIResponse") -> bool:
+    """提及处理失败时返回的结果（而不是模型给出的 no_action）"""
+    return result.type == "no_action" and (result.reasoning or "").startswith(MENTION_ERROR_PREFIX)
+
+# Phrases that make a mention apply to the whole document rather than one block
+DOCUMENT_SCOPE_KEYWORDS = [
+    "整个文档", "整篇", "全文", "全部内容", "所有段落", "通篇",
+    "whole document", "entire document", "whole doc", "entire doc", "everywhere", "all paragraphs",
+]
+
+PATCH_OPERATIONS = {
+    "replace": "modify_content",
+    "insert_after": "add_content",
+    "delete": "delete_content",
+}
+
+
+# Blocks whose content is not inline text are left out of map-reduce chunks
+MAP_SKIP_BLOCK_TYPES = {"table", "image"}
+
+_map_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_map_semaphore() -> asyncio.Semaphore:
+    """Process-wide limit on concurrent chunk calls for whole-document mentions"""
+    global _map_semaphore
+    if _map_semaphore is None:
+        _map_semaphore = asyncio.Semaphore(settings.mention_map_concurrency)
+    return _map_semaphore
+
+
+def is_document_scope(instruction: str) -> bool:
+    """Whether a mention instruction targets the whole document"""
+    content = instruction.lower()
+    return any(keyword in content for keyword in DOCUMENT_SCOPE_KEYWORDS)
+
+
 class AIResponse(BaseModel):
-    type: str  # "modify_content", "add_content", "suggest_edit", "no_action"
+    type: str  # "modify_content", "add_content", "suggest_edit", "delete_content", "move_content", "duplicate_content", "no_action"
     content: Optional[Union[str, List[Dict[str, Any]], Dict[str, Any]]] = None
     suggestion: Optional[str] = None
     reasoning: str
+    blockId: Optional[str] = None  # 块级补丁的目标块
+    patch: Optional[Dict[str, Any]] = None  # {"block_id", "operation", "content"}，移动时为 "after_block_id"
+    patches: Optional[List[Dict[str, Any]]] = None  # 分段处理整篇文档时的全部块级补丁
 
 
 class DocumentChatAgent:
@@ -21,70 +113,42 @@ class DocumentChatAgent:
             base_url=settings.openai_base_url,
         )
 
-    async def analyze_query(self, user_query: str) -> Dict[str, any]:
-        """Analyze user query to determine task type and document analysis needs"""
-        if not settings.openai_api_key:
-            return {"taskType": "chat", "needsDocumentAnalysis": False}
-
-        try:
-            analysis_prompt = f"""Analyze this user query and determine the task type:
-Query: "{user_query}"
-
-Possible types:
-- chat: General conversation
-- document_analysis: Questions about specific documents
-- writing_assistance: Help with writing or editing
-- qa: Question answering about content
-
-Also determine if document analysis is needed (true/false).
-
-Respond in JSON format: {{"taskType": "...", "needsDocumentAnalysis": true/false}}"""
-
-            response = await self.llm.ainvoke([
-                {"role": "system", "content": analysis_prompt}
-            ])
+    async def analyze_documents(self, document_text: str, version: Optional[str] = None) -> str:
+        """Analyze documents and create a concise summary
 
-            analysis = json.loads(response.content)
-            return {
-                "taskType": analysis.get("taskType", "chat"),
-                "needsDocumentAnalysis": analysis.get("needsDocumentAnalysis", False)
-            }
-        except Exception as e:
-            print(f"Failed to analyze query: {e}")
-            return {"taskType": "chat", "needsDocumentAnalysis": False}
-
-    async def analyze_documents(self, document_context: str) -> str:
-        """Analyze documents and create a concise summary"""
-        if not settings.openai_api_key or not document_context:
+        Summaries are cached by version (the linked documents' updatedAt)
+        and chunk summaries by content hash, so unchanged documents are not
+        summarized again.
+        """
+        if not settings.openai_api_key or not document_text:
             return ""
 
         try:
-            analysis_prompt = f"""Analyze the following documents and create a concise summary:
-
-{document_context}
-
-Provide a structured summary that includes:
-1. Key topics and themes
-2. Important facts or data
-3. Main conclusions or insights
-4. Relevant context for answering questions
-
-Keep the summary concise but comprehensive."""
-
-            response = await self.llm.ainvoke([
-                {"role": "system", "content": analysis_prompt}
-            ])
-
-            return response.content
+            return await DocumentSummarizer(self.llm).summarize(document_text, version)
         except Exception as e:
             print(f"Failed to analyze documents: {e}")
             return ""
 
+    def get_document_summary(self, document_text: str, version: Optional[str] = None) -> str:
+        """Return the cached document summary, or "" after starting it in the background
+
+        Never waits for the LLM: the summary is computed alongside the
+        answer and used by the first request after it is ready.
+        """
+        summarizer = DocumentSummarizer(self.llm)
+        cached = summarizer.get_cached(document_text, version)
+        if cached is not None:
+            return cached
+
+        summarizer.summarize_in_background(document_text, version)
+        return ""
+
     def build_system_prompt(
         self,
         task_type: Optional[str] = None,
         document_context: Optional[str] = None,
-        document_summary: Optional[str] = None
+        document_summary: Optional[str] = None,
+        conversation_summary: Optional[str] = None
     ) -> str:
         """Build system prompt for the AI assistant"""
         prompt = f"""You are an AI assistant integrated into Jotlin, a Notion-like document editor.
@@ -105,6 +169,9 @@ Guidelines:
 - For writing assistance, provide constructive suggestions
 - Always consider the document context when available"""
 
+        if conversation_summary:
+            prompt += f"\n\nSummary of the earlier conversation:\n{conversation_summary}"
+
         if document_summary:
             prompt += f"\n\nDocument Analysis Summary:\n{document_summary}"
         elif document_context:
@@ -116,33 +183,54 @@ Guidelines:
         self,
         user_message: str,
         conversation_history: List[Dict],
-        document_context: Optional[str] = None
+        document_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None,
+        linked_documents: Optional[Tuple[str, str]] = None
     ) -> str:
-        """Process user message and generate AI response"""
+        """Process user message and generate AI response
+
+        document_context holds the retrieved chunks for this query;
+        linked_documents is (version, full text) of the linked documents
+        and is what document summaries are built from.
+        """
         try:
             if not settings.openai_api_key:
                 return "AI functionality is not configured. Please add your OpenAI API key to the environment variables."
 
-            # Analyze query
-            query_analysis = await self.analyze_query(user_message)
+            # Classify locally instead of spending an LLM round trip on it
+            query_analysis = classify_query(user_message)
 
-            # Analyze documents if needed
+            # Document-level questions use a summary of the whole documents, keyed
+            # on their version. Until it is ready, answer from the retrieved chunks
+            # while the summary is computed in the background.
             document_summary = ""
-            if query_analysis["needsDocumentAnalysis"] and document_context:
-                document_summary = await self.analyze_documents(document_context)
+            if query_analysis["needsDocumentAnalysis"] and linked_documents:
+                version, full_text = linked_documents
+                document_summary = self.get_document_summary(full_text, version)
+
+            # Fit document context and history into the token budget
+            base_prompt = self.build_system_prompt(
+                query_analysis["taskType"], None, document_summary, conversation_summary
+            )
+            fitted_context, fitted_history = ContextBudgeter().fit(
+                base_prompt,
+                user_message,
+                None if document_summary else document_context,
+                conversation_history
+            )
 
             # Build system prompt
             system_prompt = self.build_system_prompt(
                 query_analysis["taskType"],
-                document_context,
-                document_summary
+                fitted_context,
+                document_summary,
+                conversation_summary
             )
 
             # Build message history
             messages = [{"role": "system", "content": system_prompt}]
 
-            # Add last 8 messages from conversation history
-            for msg in conversation_history[-8:]:
+            for msg in fitted_history:
                 role = "user" if msg["role"] == "user" else "assistant"
                 messages.append({"role": role, "content": msg["content"]})
 
@@ -155,7 +243,7 @@ Guidelines:
 
         except Exception as error:
             print(f"AI processing error: {error}")
-            return "Sorry, I encountered an error while processing your request. Please try again."
+            return ANSWER_ERROR_MESSAGE
 
 
 class AIService:
@@ -166,11 +254,13 @@ class AIService:
         self,
         user_message: str,
         conversation_history: List[Dict],
-        document_context: Optional[str] = None
+        document_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None,
+        linked_documents: Optional[Tuple[str, str]] = None
     ) -> str:
         """Process a chat message through the document chat agent"""
         return await self.chat_agent.process_message(
-            user_message, conversation_history, document_context
+            user_message, conversation_history, document_context, conversation_summary, linked_documents
         )
 
     async def process_mention_request(
@@ -179,24 +269,58 @@ class AIService:
         action_type: str,
         document_content: str = "",
         document_title: str = "",
-        block_id: str = ""
+        block_id: str = "",
+        mode: str = "auto",
+        document_id: Optional[str] = None
     ) -> AIResponse:
         """
         处理评论中的AI提及请求
+
+        mode: "block" 只发送目标块及其邻近块并返回块级补丁；"document" 发送整篇文档；
+        "auto" 在能定位到目标块且指令不针对全文时使用块级模式
         """
+        # 删除、移动、复制、引号内的查找替换等确定性指令在本地直接执行
+        local_result = self._local_mention(instruction, document_content, block_id, mode)
+        if local_result is not None:
+            return local_result
+
         if not settings.openai_api_key:
             return AIResponse(
                 type="no_action",
                 reasoning="AI服务未配置，无法处理请求"
             )
 
+        metrics.increment("mention_requests", path="llm")
         try:
+            extracted = self._block_scope(instruction, document_content, block_id, mode)
+            if extracted is not None:
+                mention = {
+                    "instruction": instruction,
+                    "action_type": action_type,
+                    "extracted": extracted,
+                    "document_title": document_title,
+                    "block_id": block_id,
+                }
+                if settings.mention_batch_window_ms > 0:
+                    # 同一文档上短时间内的多个提及合并为一次模型调用
+                    batch_key = document_id or hashlib.sha256(document_content.encode("utf-8")).hexdigest()
+                    return await mention_batcher.submit(batch_key, mention, self.process_block_mention_batch)
+                return (await self.process_block_mention_batch([mention]))[0]
+
+            # 超长文档按块边界分段并行处理
+            chunks = self._document_chunks(document_content)
+            if chunks is not None:
+                return await self._process_document_map_reduce(
+                    instruction, action_type, document_content, document_title, chunks
+                )
+
             # 构造处理提示词
             prompt = self._build_mention_prompt(
                 instruction, action_type, document_content, document_title, block_id
             )
 
             # 调用AI模型
+            metrics.increment("mention_llm_calls", mode="document")
             response = await self.chat_agent.llm.ainvoke([HumanMessage(content=prompt)])
 
             # 解析AI响应
@@ -207,9 +331,569 @@ class AIService:
         except Exception as e:
             return AIResponse(
                 type="no_action",
-                reasoning=f"AI处理时出错: {str(e)}"
+                reasoning=f"{MENTION_ERROR_PREFIX}: {str(e)}"
+            )
+
+    async def stream_mention_request(
+        self,
+        instruction: str,
+        action_type: str,
+        document_content: str = "",
+        document_title: str = "",
+        block_id: str = "",
+        mode: str = "auto"
+    ) -> AsyncGenerator[Tuple[str, Dict[str, Any]], None]:
+        """
+        流式处理AI提及请求，产出 (事件类型, 数据)
+
+        - ("field", {"field", "value"})：type、reasoning、blockId 一旦确定立即发送
+        - ("delta", {"field", "delta"})：content、suggestion 逐段发送
+        - ("result", AIResponse)：完整响应，经过与非流式接口相同的解析和校验
+        """
+        local_result = self._local_mention(instruction, document_content, block_id, mode)
+        if local_result is not None:
+            yield "result", local_result.model_dump()
+            return
+
+        if not settings.openai_api_key:
+            yield "result", AIResponse(type="no_action", reasoning="AI服务未配置，无法处理请求").model_dump()
+            return
+
+        metrics.increment("mention_requests", path="llm")
+        try:
+            extracted = self._block_scope(instruction, document_content, block_id, mode)
+            if extracted is not None:
+                neighborhood = self._block_neighborhood(extracted, block_id)
+                prompt = self._build_block_mention_prompt(
+                    instruction, action_type, neighborhood, document_title, block_id
+                )
+            else:
+                chunks = self._document_chunks(document_content)
+                if chunks is not None:
+                    result = await self._process_document_map_reduce(
+                        instruction, action_type, document_content, document_title, chunks
+                    )
+                    yield "result", result.model_dump()
+                    return
+                prompt = self._build_mention_prompt(
+                    instruction, action_type, document_content, document_title, block_id
+                )
+
+            parser = IncrementalJSONParser()
+            chunks = []
+            async for chunk in self.chat_agent.llm.astream([HumanMessage(content=prompt)]):
+                if not chunk.content:
+                    continue
+                chunks.append(chunk.content)
+                for event, path, value in parser.feed(chunk.content):
+                    streamed = self._mention_stream_event(event, path, value, extracted is not None)
+                    if streamed:
+                        yield streamed
+
+            full_response = "".join(chunks)
+            if extracted is not None:
+                result = self._parse_block_patch(
+                    full_response, instruction, {span_id for span_id, _ in neighborhood}
+                )
+            else:
+                result = self._parse_ai_response(full_response, instruction)
+            yield "result", result.model_dump()
+
+        except Exception as e:
+            yield "result", AIResponse(type="no_action", reasoning=f"{MENTION_ERROR_PREFIX}: {str(e)}").model_dump()
+
+    @staticmethod
+    def _mention_stream_event(
+        event: str, path: str, value: str, block_mode: bool
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """把增量JSON解析事件转换为对外的流式事件"""
+        if block_mode:
+            if path == "patch.content" and event == "delta":
+                return "delta", {"field": "content", "delta": value}
+            if path == "patch.operation" and event == "end" and value in PATCH_OPERATIONS:
+                return "field", {"field": "type", "value": PATCH_OPERATIONS[value]}
+            if path == "patch.block_id" and event == "end":
+                return "field", {"field": "blockId", "value": value}
+            if path == "type" and event == "end" and value != "patch":
+                return "field", {"field": "type", "value": value}
+        else:
+            if path in ("content", "suggestion") and event == "delta":
+                return "delta", {"field": path, "delta": value}
+            if path == "type" and event == "end":
+                return "field", {"field": "type", "value": value}
+
+        if path == "suggestion" and event == "delta":
+            return "delta", {"field": "suggestion", "delta": value}
+        if path == "reasoning" and event == "end":
+            return "field", {"field": "reasoning", "value": value}
+        return None
+
+    def _local_mention(
+        self,
+        instruction: str,
+        document_content: str,
+        block_id: str,
+        mode: str
+    ) -> Optional[AIResponse]:
+        """不需要生成内容的指令直接在本地执行，无法确定时返回None交给模型处理"""
+        if mode == "document" or not block_id or is_document_scope(instruction):
+            return None
+
+        edit = match_local_edit(instruction, get_extracted_document(document_content), block_id)
+        if edit is None:
+            return None
+
+        metrics.increment("mention_requests", path="local")
+        operation = edit["operation"]
+        if operation == "noop":
+            return AIResponse(type="no_action", blockId=edit["block_id"], reasoning=edit["reasoning"])
+        if operation == "duplicate":
+            return AIResponse(
+                type="duplicate_content",
+                blockId=edit["block_id"],
+                patch={"block_id": edit["block_id"], "operation": "duplicate"},
+                reasoning=edit["reasoning"]
+            )
+        if operation == "move":
+            return AIResponse(
+                type="move_content",
+                blockId=edit["block_id"],
+                patch={
+                    "block_id": edit["block_id"],
+                    "operation": "move",
+                    "after_block_id": edit["after_block_id"],
+                },
+                reasoning=edit["reasoning"]
+            )
+        return AIResponse(
+            type=PATCH_OPERATIONS[operation],
+            content=edit["content"],
+            blockId=edit["block_id"],
+            patch={"block_id": edit["block_id"], "operation": operation, "content": edit["content"]},
+            reasoning=edit["reasoning"]
+        )
+
+    def _block_scope(
+        self,
+        instruction: str,
+        document_content: str,
+        block_id: str,
+        mode: str
+    ) -> Optional[ExtractedDocument]:
+        """块级模式适用时返回解析后的文档，否则返回None（使用整篇文档模式）"""
+        if mode == "document" or not block_id:
+            return None
+        # 纯文本：补丁内容会被前端原样插入块中，Markdown 语法会变成字面文本
+        extracted = get_extracted_document(document_content)
+        if extracted.block_index(block_id) is None:
+            return None
+        if mode == "block" or not is_document_scope(instruction):
+            return extracted
+        return None
+
+    async def _process_block_mention(
+        self,
+        instruction: str,
+        action_type: str,
+        extracted: ExtractedDocument,
+        document_title: str,
+        block_id: str
+    ) -> AIResponse:
+        """块级模式：只发送目标块附近的内容，返回经过本地校验的补丁"""
+        metrics.increment("mention_llm_calls", mode="block")
+        neighborhood = self._block_neighborhood(extracted, block_id)
+        prompt = self._build_block_mention_prompt(
+            instruction, action_type, neighborhood, document_title, block_id
+        )
+        response = await self.chat_agent.llm.ainvoke([HumanMessage(content=prompt)])
+        return self._parse_block_patch(
+            response.content, instruction, {span_id for span_id, _ in neighborhood}
+        )
+
+    def _block_neighborhood(self, extracted: ExtractedDocument, block_id: str) -> List[tuple]:
+        """目标块及其前后各 mention_neighbor_blocks 个块的 (block_id, text)"""
+        index = extracted.block_index(block_id)
+        radius = settings.mention_neighbor_blocks
+        spans = extracted.blocks[max(0, index - radius):index + radius + 1]
+        return [(span.block_id, extracted.text[span.start:span.end]) for span in spans]
+
+    def _build_block_mention_prompt(
+        self,
+        instruction: str,
+        action_type: str,
+        neighborhood: List[tuple],
+        document_title: str,
+        block_id: str
+    ) -> str:
+        """构造块级补丁提示词"""
+        blocks = "\n".join(f"[{span_id}] {text}" for span_id, text in neighborhood)
+
+        return f"""你是一个文档编辑助手。用户在文档《{document_title}》的评论中@了你，需要你根据指令修改评论所在的块。
+
+以下是评论所在块及其上下文（每行以 [块ID] 开头，纯文本）：
+```
+{blocks}
+```
+
+评论所在的块ID：{block_id}
+用户指令类型：{action_type}
+用户具体指令：{instruction}
+
+请只返回以下格式的JSON响应：
+
+```json
+{{
+  "type": "patch" | "suggest_edit" | "no_action",
+  "reasoning": "执行此操作的原因说明",
+  "patch": {{
+    "block_id": "要操作的块ID（必须是上面列出的块之一）",
+    "operation": "replace" | "insert_after" | "delete",
+    "content": "新的块内容（replace 和 insert_after 时必填，纯文本，不要使用Markdown语法，不含块ID前缀）"
+  }},
+  "suggestion": "修改建议（如果type是suggest_edit）"
+}}
+```
+
+注意事项：
+1. 默认操作评论所在的块，除非指令明确指向上下文中的其他块
+2. 只返回被修改的那一个块的内容，不要返回整篇文档
+3. 如果用户指令不够明确，返回type为"suggest_edit"并提供建议
+4. 如果指令无法执行，返回type为"no_action"并说明原因
+5. 只返回JSON，不要包含其他文字
+"""
+
+    def _parse_block_patch(
+        self,
+        ai_response: str,
+        original_instruction: str,
+        allowed_block_ids: set
+    ) -> AIResponse:
+        """解析并校验块级补丁，校验失败时降级为修改建议"""
+        try:
+            parsed = json.loads(self._extract_json(ai_response))
+        except Exception as e:
+            return AIResponse(
+                type="suggest_edit",
+                suggestion=f"AI响应解析失败，原始指令：{original_instruction}",
+                reasoning=f"响应格式有误：{str(e)}"
             )
 
+        return self._validate_block_patch(parsed, original_instruction, allowed_block_ids)
+
+    def _validate_block_patch(
+        self,
+        parsed: Dict[str, Any],
+        original_instruction: str,
+        allowed_block_ids: set
+    ) -> AIResponse:
+        """校验一个已解析的块级补丁结果"""
+        reasoning = parsed.get("reasoning", "已根据指令处理")
+        response_type = parsed.get("type")
+        if response_type != "patch":
+            return AIResponse(
+                type=response_type if response_type in ("suggest_edit", "no_action") else "no_action",
+                suggestion=parsed.get("suggestion"),
+                reasoning=reasoning
+            )
+
+        patch = parsed.get("patch") or {}
+        target = patch.get("block_id")
+        operation = patch.get("operation")
+        content = patch.get("content")
+
+        error = None
+        if target not in allowed_block_ids:
+            error = f"补丁目标块不在上下文中：{target}"
+        elif operation not in PATCH_OPERATIONS:
+            error = f"不支持的补丁操作：{operation}"
+        elif operation != "delete" and (not isinstance(content, str) or not content.strip()):
+            error = "补丁缺少新的块内容"
+
+        if error:
+            return AIResponse(
+                type="suggest_edit",
+                suggestion=parsed.get("suggestion") or f"无法自动应用修改，原始指令：{original_instruction}",
+                reasoning=error
+            )
+
+        return AIResponse(
+            type=PATCH_OPERATIONS[operation],
+            content=content if operation != "delete" else None,
+            blockId=target,
+            patch={"block_id": target, "operation": operation, "content": content if operation != "delete" else None},
+            reasoning=reasoning
+        )
+
+    async def process_block_mention_batch(self, mentions: List[Dict[str, Any]]) -> List[AIResponse]:
+        """
+        用一次模型调用处理同一文档上的多个块级AI提及
+
+        mentions 中每项包含 instruction、action_type、extracted、document_title、block_id，
+        返回与 mentions 顺序一致的结果
+        """
+        if len(mentions) == 1:
+            mention = mentions[0]
+            return [await self._process_block_mention(
+                mention["instruction"], mention["action_type"], mention["extracted"],
+                mention["document_title"], mention["block_id"]
+            )]
+
+        neighborhoods = [
+            self._block_neighborhood(mention["extracted"], mention["block_id"])
+            for mention in mentions
+        ]
+        prompt = self._build_batch_mention_prompt(mentions, neighborhoods)
+        metrics.increment("mention_llm_calls", mode="batch")
+        response = await self.chat_agent.llm.ainvoke([HumanMessage(content=prompt)])
+
+        try:
+            parsed = json.loads(self._extract_json(response.content))
+            results_by_request = {}
+            for item in parsed.get("results", []):
+                if not isinstance(item, dict):
+                    continue
+                # 模型可能把序号写成字符串（"1"）
+                try:
+                    results_by_request[int(item.get("request"))] = item
+                except (TypeError, ValueError):
+                    continue
+        except Exception as e:
+            results_by_request = {}
+            print(f"Failed to parse batched mention response: {e}")
+
+        results = []
+        for index, (mention, neighborhood) in enumerate(zip(mentions, neighborhoods), start=1):
+            item = results_by_request.get(index)
+            if item is None:
+                results.append(AIResponse(
+                    type="suggest_edit",
+                    suggestion=f"AI响应中缺少此请求的结果，原始指令：{mention['instruction']}",
+                    reasoning="批量响应格式有误"
+                ))
+                continue
+            results.append(self._validate_block_patch(
+                item, mention["instruction"], {span_id for span_id, _ in neighborhood}
+            ))
+        return results
+
+    def _build_batch_mention_prompt(
+        self,
+        mentions: List[Dict[str, Any]],
+        neighborhoods: List[List[tuple]]
+    ) -> str:
+        """构造多个块级请求合并后的提示词"""
+        sections = []
+        for index, (mention, neighborhood) in enumerate(zip(mentions, neighborhoods), start=1):
+            blocks = "\n".join(f"[{span_id}] {text}" for span_id, text in neighborhood)
+            sections.append(f"""### 请求 {index}
+评论所在的块ID：{mention["block_id"]}
+用户指令类型：{mention["action_type"]}
+用户具体指令：{mention["instruction"]}
+上下文：
+```
+{blocks}
+```""")
+        requests = "\n\n".join(sections)
+
+        return f"""你是一个文档编辑助手。多位用户在文档《{mentions[0]["document_title"]}》的不同评论中@了你，请分别处理每个请求。
+每个请求给出了评论所在块及其上下文（每行以 [块ID] 开头，纯文本）。
+
+{requests}
+
+请只返回以下格式的JSON响应，results 中每个请求对应一项：
+
+```json
+{{
+  "results": [
+    {{
+      "request": 1,
+      "type": "patch" | "suggest_edit" | "no_action",
+      "reasoning": "执行此操作的原因说明",
+      "patch": {{
+        "block_id": "要操作的块ID（必须是该请求上下文中的块之一）",
+        "operation": "replace" | "insert_after" | "delete",
+        "content": "新的块内容（replace 和 insert_after 时必填，纯文本，不要使用Markdown语法）"
+      }},
+      "suggestion": "修改建议（如果type是suggest_edit）"
+    }}
+  ]
+}}
+```
+
+注意事项：
+1. 各请求相互独立，默认操作各自评论所在的块
+2. 只返回被修改的块的内容，不要返回整篇文档
+3. 如果某个指令不够明确，该项返回"suggest_edit"；无法执行则返回"no_action"
+4. 只返回JSON，不要包含其他文字
+"""
+
+    def _document_chunks(self, document_content: str) -> Optional[List[List[tuple]]]:
+        """超过 mention_map_threshold_tokens 的BlockNote文档按块边界分段，否则返回None"""
+        extracted = get_extracted_document(document_content)
+        if not extracted.blocks or estimate_tokens(extracted.text) <= settings.mention_map_threshold_tokens:
+            return None
+
+        chunks: List[List[tuple]] = []
+        current: List[tuple] = []
+        current_tokens = 0
+        for span in extracted.blocks:
+            if span.type in MAP_SKIP_BLOCK_TYPES:
+                continue
+            text = extracted.text[span.start:span.end]
+            if not text:
+                continue
+            tokens = estimate_tokens(text)
+            if current and current_tokens + tokens > settings.mention_chunk_tokens:
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append((span.block_id, span.type, text))
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def _process_document_map_reduce(
+        self,
+        instruction: str,
+        action_type: str,
+        document_content: str,
+        document_title: str,
+        chunks: List[List[tuple]]
+    ) -> AIResponse:
+        """
+        整篇文档指令的分段处理：各分段并行生成块级补丁，再按块ID合并回原文档
+
+        延迟取决于分段大小而不是文档大小；所有请求共享 mention_map_concurrency 的并发上限
+        """
+        semaphore = get_map_semaphore()
+
+        async def process_chunk(index: int, chunk: List[tuple]) -> Dict[str, Any]:
+            prompt = self._build_chunk_mention_prompt(
+                instruction, action_type, document_title, chunk, index, len(chunks)
+            )
+            async with semaphore:
+                metrics.increment("mention_llm_calls", mode="map")
+                response = await self.chat_agent.llm.ainvoke([HumanMessage(content=prompt)])
+            return json.loads(self._extract_json(response.content))
+
+        outcomes = await asyncio.gather(
+            *(process_chunk(index, chunk) for index, chunk in enumerate(chunks, start=1)),
+            return_exceptions=True
+        )
+
+        patches: List[Dict[str, Any]] = []
+        reasonings: List[str] = []
+        suggestions: List[str] = []
+        failed = 0
+        for chunk, outcome in zip(chunks, outcomes):
+            if isinstance(outcome, Exception) or not isinstance(outcome, dict):
+                failed += 1
+                print(f"Mention chunk failed: {outcome}")
+                continue
+            allowed_block_ids = {block_id for block_id, _, _ in chunk}
+            for patch in outcome.get("patches") or []:
+                validated = self._validate_chunk_patch(patch, allowed_block_ids)
+                if validated:
+                    patches.append(validated)
+            if outcome.get("suggestion"):
+                suggestions.append(outcome["suggestion"])
+            if outcome.get("reasoning") and outcome.get("patches"):
+                reasonings.append(outcome["reasoning"])
+
+        if failed == len(chunks):
+            return AIResponse(type="no_action", reasoning="文档分段处理全部失败")
+
+        failed_note = f"，{failed}个分段处理失败" if failed else ""
+        if patches:
+            detail = "；".join(dict.fromkeys(reasonings))[:500]
+            return AIResponse(
+                type="modify_content",
+                content=json.dumps(apply_block_patches(document_content, patches), ensure_ascii=False),
+                patches=patches,
+                reasoning=f"文档分为{len(chunks)}段处理，共修改{len(patches)}个块{failed_note}。{detail}"
+            )
+        if suggestions:
+            return AIResponse(
+                type="suggest_edit",
+                suggestion="\n".join(dict.fromkeys(suggestions)),
+                reasoning=f"文档分为{len(chunks)}段处理，未生成可直接应用的修改{failed_note}"
+            )
+        return AIResponse(
+            type="no_action",
+            reasoning=f"文档分为{len(chunks)}段处理，没有需要修改的内容{failed_note}"
+        )
+
+    @staticmethod
+    def _validate_chunk_patch(patch: Any, allowed_block_ids: set) -> Optional[Dict[str, Any]]:
+        """分段补丁只能操作本分段内的块，不合法的补丁直接丢弃"""
+        if not isinstance(patch, dict):
+            return None
+        target = patch.get("block_id")
+        operation = patch.get("operation")
+        content = patch.get("content")
+        if target not in allowed_block_ids or operation not in PATCH_OPERATIONS:
+            return None
+        if operation == "delete":
+            return {"block_id": target, "operation": operation, "content": None}
+        if not isinstance(content, str) or not content.strip():
+            return None
+        return {"block_id": target, "operation": operation, "content": content}
+
+    def _build_chunk_mention_prompt(
+        self,
+        instruction: str,
+        action_type: str,
+        document_title: str,
+        chunk: List[tuple],
+        index: int,
+        total: int
+    ) -> str:
+        """构造整篇文档指令中单个分段的提示词"""
+        blocks = "\n".join(
+            f"[{block_id}] {text}" if block_type == "paragraph" else f"[{block_id}]({block_type}) {text}"
+            for block_id, block_type, text in chunk
+        )
+
+        return f"""你是一个文档编辑助手。用户在文档《{document_title}》的评论中@了你，要求对整篇文档执行一条指令。
+文档较长，已按块拆分为{total}段分别处理，下面是第{index}段（每行以 [块ID] 开头，非段落块标注了块类型）：
+```
+{blocks}
+```
+
+用户指令类型：{action_type}
+用户具体指令：{instruction}
+
+请只对本段执行该指令，返回以下格式的JSON响应：
+
+```json
+{{
+  "reasoning": "本段所做修改的简要说明",
+  "patches": [
+    {{
+      "block_id": "要操作的块ID（必须是本段中的块）",
+      "operation": "replace" | "insert_after" | "delete",
+      "content": "新的块内容（replace 和 insert_after 时必填，纯文本，不含块ID前缀和块类型）"
+    }}
+  ],
+  "suggestion": "无法直接修改时的建议（可选）"
+}}
+```
+
+注意事项：
+1. 只为需要修改的块返回补丁，不需要修改的块不要出现在 patches 中
+2. 本段没有需要修改的内容时返回空的 patches
+3. 只返回JSON，不要包含其他文字
+"""
+
+    @staticmethod
+    def _extract_json(ai_response: str) -> str:
+        """去掉可能存在的 ```json 代码块包装"""
+        if ai_response.strip().startswith('```'):
+            json_start = ai_response.find('{')
+            json_end = ai_response.rfind('}') + 1
+            return ai_response[json_start:json_end]
+        return ai_response.strip()
+
     def _build_mention_prompt(
         self,
         instruction: str,
@@ -236,9 +920,9 @@ class AIService:
 ```json
 {{
   "type": "modify_content" | "add_content" | "suggest_edit" | "no_action",
+  "reasoning": "执行此操作的原因说明",
   "content": "修改后的完整文档内容（如果type是modify_content）",
-  "suggestion": "修改建议（如果type是suggest_edit）",
-  "reasoning": "执行此操作的原因说明"
+  "suggestion": "修改建议（如果type是suggest_edit）"
 }}
 ```
 
@@ -257,15 +941,7 @@ class AIService:
         """解析AI响应"""
         try:
             # 尝试解析JSON
-            if ai_response.strip().startswith('```json'):
-                # 提取JSON内容
-                json_start = ai_response.find('{')
-                json_end = ai_response.rfind('}') + 1
-                json_content = ai_response[json_start:json_end]
-            else:
-                json_content = ai_response.strip()
-
-            parsed = json.loads(json_content)
+            parsed = json.loads(self._extract_json(ai_response))
 
             return AIResponse(
                 type=parsed.get('type', 'no_action'),
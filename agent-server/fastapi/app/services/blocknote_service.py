@@ -0,0 +1,367 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import copy
+import hashlib
+import json
+import uuid
+
+EXTRACTION_CACHE_SIZE = 512
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class BlockSpan:
+    """Where a block's text lives in the extracted document"""
+    __slots__ = ("block_id", "type", "depth", "start", "end", "styled")
+
+    def __init__(self, block_id: str, type: str, depth: int, start: int, end: int, styled: bool = False):
+        self.block_id = block_id
+        self.type = type
+        self.depth = depth
+        self.start = start
+        self.end = end
+        # Inline content is more than unstyled text runs (styles, links, tables...)
+        self.styled = styled
+
+    def to_dict(self) -> Dict:
+        return {
+            "block_id": self.block_id,
+            "type": self.type,
+            "depth": self.depth,
+            "start": self.start,
+            "end": self.end,
+            "styled": self.styled,
+        }
+
+
+class ExtractedDocument:
+    """Flattened document text plus the offsets of every block in it"""
+
+    def __init__(self, text: str, blocks: List[BlockSpan]):
+        self.text = text
+        self.blocks = blocks
+        self._positions = {block.block_id: i for i, block in enumerate(blocks)}
+
+    def block_text(self, block_id: str) -> Optional[str]:
+        position = self._positions.get(block_id)
+        if position is None:
+            return None
+        span = self.blocks[position]
+        return self.text[span.start:span.end]
+
+    def block_index(self, block_id: str) -> Optional[int]:
+        return self._positions.get(block_id)
+
+    def block_span(self, block_id: str) -> Optional[BlockSpan]:
+        position = self._positions.get(block_id)
+        return None if position is None else self.blocks[position]
+
+
+def iter_top_level_blocks(content: str) -> Iterator[Dict]:
+    """Decode a BlockNote document one top-level block at a time
+
+    Only one top-level block (with its children) is materialized at once,
+    instead of the whole block tree.
+    """
+    length = len(content)
+    index = 0
+    while index < length and content[index] in _WHITESPACE:
+        index += 1
+    if index >= length or content[index] != "[":
+        raise ValueError("BlockNote content must be a JSON array")
+    index += 1
+
+    while True:
+        while index < length and content[index] in _WHITESPACE + ",":
+            index += 1
+        if index >= length:
+            raise ValueError("Unterminated BlockNote content")
+        if content[index] == "]":
+            return
+        block, index = _decoder.raw_decode(content, index)
+        if isinstance(block, dict):
+            yield block
+
+
+def _inline_text(inline: Union[str, List, None], markdown: bool) -> str:
+    if isinstance(inline, str):
+        return inline
+    if not isinstance(inline, list):
+        return ""
+
+    parts = []
+    for item in inline:
+        if not isinstance(item, dict):
+            continue
+        if item.get("type") == "text":
+            text = item.get("text", "")
+            styles = item.get("styles") or {}
+            if markdown and text.strip():
+                if styles.get("code"):
+                    text = f"`{text}`"
+                if styles.get("bold"):
+                    text = f"**{text}**"
+                if styles.get("italic"):
+                    text = f"*{text}*"
+                if styles.get("strike"):
+                    text = f"~~{text}~~"
+            parts.append(text)
+        elif item.get("type") == "link":
+            text = _inline_text(item.get("content"), markdown)
+            parts.append(f"[{text}]({item.get('href', '')})" if markdown else text)
+    return "".join(parts)
+
+
+def _has_styled_runs(inline: Union[str, List, Dict, None]) -> bool:
+    if inline is None or isinstance(inline, str):
+        return False
+    if not isinstance(inline, list):
+        return True
+    return any(
+        not isinstance(item, dict) or item.get("type") != "text" or any((item.get("styles") or {}).values())
+        for item in inline
+    )
+
+
+def _table_text(content: Dict, markdown: bool) -> str:
+    rows = []
+    for row in content.get("rows", []):
+        cells = []
+        for cell in row.get("cells", []):
+            # Newer BlockNote versions wrap cells as {"type": "tableCell", "content": [...]}
+            inline = cell.get("content") if isinstance(cell, dict) else cell
+            cells.append(_inline_text(inline, markdown).replace("\n", " "))
+        rows.append(cells)
+    if not rows:
+        return ""
+    if not markdown:
+        return "\n".join("\t".join(cells) for cells in rows)
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + "---|" * len(rows[0])]
+    lines.extend("| " + " | ".join(cells) + " |" for cells in rows[1:])
+    return "\n".join(lines)
+
+
+def _block_line(block: Dict, markdown: bool, depth: int) -> str:
+    block_type = block.get("type", "paragraph")
+    props = block.get("props") or {}
+    content = block.get("content")
+
+    if block_type == "table" and isinstance(content, dict):
+        text = _table_text(content, markdown)
+    else:
+        text = _inline_text(content, markdown)
+
+    if not markdown:
+        return text
+
+    indent = "  " * depth
+    if block_type == "heading":
+        level = int(props.get("level", 1) or 1)
+        return f"{'#' * level} {text}"
+    if block_type == "bulletListItem":
+        return f"{indent}- {text}"
+    if block_type == "numberedListItem":
+        return f"{indent}1. {text}"
+    if block_type == "checkListItem":
+        return f"{indent}- [{'x' if props.get('checked') else ' '}] {text}"
+    if block_type == "codeBlock":
+        return f"```{props.get('language', '')}\n{text}\n```"
+    if block_type == "quote":
+        return f"> {text}"
+    if block_type == "image":
+        return f"![{props.get('caption', '')}]({props.get('url', '')})"
+    return f"{indent}{text}" if text else ""
+
+
+def extract_blocks(content: Optional[str], markdown: bool = False) -> ExtractedDocument:
+    """Flatten BlockNote JSON into text (or markdown), one block per line
+
+    Non-JSON content is treated as plain text with no block offsets.
+    """
+    if not content:
+        return ExtractedDocument("", [])
+
+    try:
+        top_level = iter_top_level_blocks(content)
+        first = next(top_level, None)
+    except ValueError:
+        return ExtractedDocument(content, [])
+
+    lines: List[str] = []
+    spans: List[BlockSpan] = []
+    offset = 0
+
+    def visit(block: Dict, depth: int):
+        nonlocal offset
+        line = _block_line(block, markdown, depth)
+        # Empty blocks get an empty line too, so comments on them can be targeted
+        spans.append(BlockSpan(
+            str(block.get("id", "")), block.get("type", "paragraph"),
+            depth, offset, offset + len(line), _has_styled_runs(block.get("content"))
+        ))
+        lines.append(line)
+        offset += len(line) + 1  # newline separator
+        for child in block.get("children") or []:
+            if isinstance(child, dict):
+                visit(child, depth + 1)
+
+    try:
+        if first is not None:
+            visit(first, 0)
+        for block in top_level:
+            visit(block, 0)
+    except ValueError:
+        # Truncated or malformed JSON: keep what was parsed so far
+        pass
+
+    return ExtractedDocument("\n".join(lines), spans)
+
+
+_extraction_cache: "OrderedDict[Tuple, ExtractedDocument]" = OrderedDict()
+
+
+def get_extracted_document(
+    content: Optional[str],
+    document_id: Optional[str] = None,
+    updated_at: Optional[datetime] = None,
+    markdown: bool = False
+) -> ExtractedDocument:
+    """Extract a document, cached by (document id, updatedAt) or by content hash"""
+    if document_id and updated_at is not None:
+        key = (document_id, updated_at.isoformat(), markdown)
+    else:
+        digest = hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+        key = ("sha256", digest, markdown)
+
+    cached = _extraction_cache.get(key)
+    if cached is not None:
+        _extraction_cache.move_to_end(key)
+        return cached
+
+    extracted = extract_blocks(content, markdown)
+    _extraction_cache[key] = extracted
+    while len(_extraction_cache) > EXTRACTION_CACHE_SIZE:
+        _extraction_cache.popitem(last=False)
+    return extracted
+
+
+def _text_runs(inline: List) -> List[Dict]:
+    """Text items in reading order, including those inside links"""
+    runs = []
+    for item in inline:
+        if not isinstance(item, dict):
+            continue
+        if item.get("type") == "text":
+            runs.append(item)
+        elif item.get("type") == "link" and isinstance(item.get("content"), list):
+            runs.extend(_text_runs(item["content"]))
+    return runs
+
+
+def _drop_empty_runs(inline: List) -> List:
+    result = []
+    for item in inline:
+        if isinstance(item, dict) and item.get("type") == "text" and not item.get("text"):
+            continue
+        if isinstance(item, dict) and item.get("type") == "link" and isinstance(item.get("content"), list):
+            item["content"] = _drop_empty_runs(item["content"])
+            if not item["content"]:
+                continue
+        result.append(item)
+    return result
+
+
+def replace_inline_text(inline: Union[str, List, None], text: str) -> List:
+    """Replace the plain text of inline content, keeping styles outside the edit
+
+    Only the span between the common prefix and suffix of the old and new
+    text changes. Runs, links and mentions outside it are kept as they are,
+    and the new text takes the style of the run where the edit starts.
+    """
+    plain = [{"type": "text", "text": text, "styles": {}}] if text else []
+    if not isinstance(inline, list):
+        return plain
+
+    inline = copy.deepcopy(inline)
+    runs = _text_runs(inline)
+    if not runs:
+        return inline + plain
+
+    old = "".join(run.get("text", "") for run in runs)
+    prefix = 0
+    limit = min(len(old), len(text))
+    while prefix < limit and old[prefix] == text[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == text[-1 - suffix]:
+        suffix += 1
+    end = len(old) - suffix
+    inserted = text[prefix:len(text) - suffix]
+
+    # Replaced text goes into the run holding its first character; a pure
+    # insertion extends the run before it
+    offset = 0
+    target = runs[0]
+    for run in runs:
+        length = len(run.get("text", ""))
+        if end > prefix:
+            holds_edit = offset <= prefix < offset + length
+        else:
+            holds_edit = offset < prefix <= offset + length
+        if holds_edit:
+            target = run
+            break
+        offset += length
+
+    offset = 0
+    for run in runs:
+        value = run.get("text", "")
+        start = offset
+        offset += len(value)
+        left = value[:max(0, prefix - start)]
+        right = value[max(0, end - start):] if offset > end else ""
+        run["text"] = left + (inserted if run is target else "") + right
+
+    return _drop_empty_runs(inline)
+
+
+def apply_block_patches(content: str, patches: List[Dict]) -> List[Dict]:
+    """Apply {"block_id", "operation", "content"} patches to a BlockNote document
+
+    Replaced blocks keep their id, type, props and children, and their inline
+    content keeps its styles, links and mentions outside the edited text.
+    Inserted blocks are new paragraphs. Returns the patched block list.
+    """
+    by_id = {patch["block_id"]: patch for patch in patches}
+
+    def patch_blocks(blocks: List) -> List:
+        result = []
+        for block in blocks:
+            if not isinstance(block, dict):
+                result.append(block)
+                continue
+            patch = by_id.get(str(block.get("id", "")))
+            operation = patch["operation"] if patch else None
+            if operation == "delete":
+                continue
+
+            block = dict(block)
+            if operation == "replace":
+                block["content"] = replace_inline_text(block.get("content"), patch["content"])
+            if block.get("children"):
+                block["children"] = patch_blocks(block["children"])
+            result.append(block)
+
+            if operation == "insert_after":
+                result.append({
+                    "id": str(uuid.uuid4()),
+                    "type": "paragraph",
+                    "props": {},
+                    "content": [{"type": "text", "text": patch["content"], "styles": {}}],
+                    "children": [],
+                })
+        return result
+
+    return patch_blocks(json.loads(content))
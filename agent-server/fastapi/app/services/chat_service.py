@@ -1,9 +1,38 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from app.models.chat import Chat, Message
-from typing import List, Dict, Optional
+from sqlalchemy import desc, func, and_, or_
+from app.models.chat import Chat, Message, ColdMessageBatch
+from app.models.document import Document
+from app.core.config import settings
+from app.core.database import mark_written
+from app.services.search_service import MessageSearchService
+from app.services.tiering_service import MessageTieringService
+from app.services.retrieval_service import get_chat_index
+from app.services.blocknote_service import get_extracted_document
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime
+import base64
 import uuid
 
+# Length of the last-message preview returned by the chat list
+SNIPPET_LENGTH = 120
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(updated_at: datetime, chat_id: str) -> str:
+    """Encode a (updated_at, id) keyset position as an opaque cursor"""
+    raw = f"{updated_at.isoformat()}|{chat_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        updated_at, chat_id = raw.split("|", 1)
+        return datetime.fromisoformat(updated_at), chat_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
 
 class ChatService:
     def __init__(self, db: Session):
@@ -13,6 +42,10 @@ class ChatService:
         """Get chat by ID"""
         return self.db.query(Chat).filter(Chat.id == chat_id).first()
 
+    def get_user_chat(self, chat_id: str, user_id: str) -> Optional[Chat]:
+        """Get chat by ID if it belongs to the user"""
+        return self.db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == user_id).first()
+
     def get_conversation_history(self, chat_id: str, limit: int = 10) -> List[Dict]:
         """Get conversation history for a chat"""
         messages = (
@@ -27,47 +60,130 @@ class ChatService:
         history = []
         for msg in reversed(messages):  # Reverse to get chronological order
             history.append({
+                "id": msg.id,
                 "role": msg.role,
                 "content": msg.content,
-                "created_at": msg.created_at.isoformat()
+                "created_at": msg.created_at.isoformat(),
+                "truncated": msg.truncated == "true"
             })
         
+        # A short hot history may mean older messages were tiered to cold storage
+        if len(history) < limit:
+            tiered = self.db.query(Chat.messages_tiered).filter(Chat.id == chat_id).scalar()
+            if tiered == "true":
+                cold = MessageTieringService(self.db).load_cold_messages(chat_id)
+                cold_history = [
+                    {
+                        "id": msg["id"],
+                        "role": msg["role"],
+                        "content": msg["content"],
+                        "created_at": msg["created_at"],
+                        "truncated": msg.get("truncated") == "true"
+                    }
+                    for msg in cold[-(limit - len(history)):]
+                ]
+                history = cold_history + history
+        
         return history
 
-    def get_document_context(self, chat_id: str) -> Optional[str]:
-        """Get linked document context for a chat"""
-        # This would need to be implemented based on how documents are linked to chats
-        # For now, returning None as we haven't implemented the document linking yet
-        # TODO: Implement document context retrieval based on chat-document relationships
-        return None
+    def get_document_context(self, chat_id: str, query: Optional[str] = None) -> Optional[str]:
+        """Get the linked-document chunks most relevant to the query
+
+        Documents linked through Document.chatId are chunked into an
+        in-process BM25 index. Only documents whose updatedAt changed since
+        the last call are re-read and re-indexed.
+        """
+        try:
+            versions = (
+                self.db.query(Document.id, Document.updated_at)
+                .filter(Document.chat_id == chat_id, Document.is_archived.is_(False))
+                .all()
+            )
+        except Exception as e:
+            print(f"Failed to load linked documents for chat {chat_id}: {e}")
+            self.db.rollback()
+            return None
+
+        index = get_chat_index(chat_id)
+        current_ids = {doc_id for doc_id, _ in versions}
+        for doc_id in index.document_ids():
+            if doc_id not in current_ids:
+                index.remove_document(doc_id)
+
+        stale_ids = [doc_id for doc_id, updated_at in versions if index.needs_update(doc_id, updated_at)]
+        if stale_ids:
+            documents = self.db.query(Document).filter(Document.id.in_(stale_ids)).all()
+            for document in documents:
+                extracted = get_extracted_document(
+                    document.content, document.id, document.updated_at, markdown=True
+                )
+                index.add_document(
+                    document.id,
+                    document.title,
+                    extracted.text,
+                    document.updated_at
+                )
+
+        return index.build_context(
+            query,
+            max_tokens=settings.document_context_max_tokens,
+            top_k=settings.document_context_top_k
+        )
+
+    def get_linked_documents(self, chat_id: str) -> Optional[Tuple[str, str]]:
+        """(version key, full text) of the chat's linked documents, for document summaries
+
+        Reads the index refreshed by get_document_context, so call that first.
+        The version key only changes when a document's updatedAt does.
+        """
+        index = get_chat_index(chat_id)
+        version = index.version_key()
+        if version is None:
+            return None
+        return version, index.full_text()
 
     def create_message(
         self,
         chat_id: str,
         content: str,
         role: str,
-        user_id: str
+        user_id: str,
+        truncated: bool = False
     ) -> Message:
-        """Create a new message in the chat"""
+        """Create a new message in the chat
+
+        truncated marks an assistant answer cut short by a client disconnect.
+        """
+        chat = self.get_chat(chat_id)
+        
+        # First write after a restore brings cold messages back to the hot table
+        if chat and chat.messages_tiered == "true":
+            MessageTieringService(self.db).rehydrate_chat(chat)
+        
         message = Message(
             id=str(uuid.uuid4()),
             content=content,
             role=role,
             chat_id=chat_id,
-            user_id=user_id
+            user_id=user_id,
+            truncated="true" if truncated else "false"
         )
         
         self.db.add(message)
-        self.db.commit()
-        self.db.refresh(message)
+        try:
+            MessageSearchService(self.db).index_message(message)
+        except Exception as e:
+            # Search indexing must never block saving the message
+            print(f"Failed to index message {message.id}: {e}")
         
-        # Update chat's updated_at timestamp
-        chat = self.get_chat(chat_id)
+        # Update chat's updated_at timestamp in the same transaction
         if chat:
-            from datetime import datetime
             chat.updated_at = datetime.utcnow()
-            self.db.commit()
         
+        self.db.commit()
+        self.db.refresh(message)
+        
+        mark_written(f"chat:{chat_id}", f"user:{user_id}")
         return message
 
     def create_chat(self, title: str, user_id: str) -> Chat:
@@ -82,31 +198,154 @@ class ChatService:
         self.db.commit()
         self.db.refresh(chat)
         
+        mark_written(f"chat:{chat.id}", f"user:{user_id}")
         return chat
 
-    def get_user_chats(self, user_id: str, include_archived: bool = False) -> List[Chat]:
-        """Get all chats for a user"""
-        query = self.db.query(Chat).filter(Chat.user_id == user_id)
-        
+    def get_user_chats_page(
+        self,
+        user_id: str,
+        include_archived: bool = False,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Get one page of a user's chats with message count and last-message preview
+
+        Pages are keyed on (updated_at, id) so the list stays stable while new
+        chats are created. Counts and previews come from a window function over
+        the page's messages in the same query; chats tiered to cold storage add
+        one more query for their batch rows.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        page_query = self.db.query(Chat).filter(Chat.user_id == user_id)
         if not include_archived:
-            query = query.filter(Chat.is_archived == "false")
-            
-        return query.order_by(desc(Chat.updated_at)).all()
+            page_query = page_query.filter(Chat.is_archived == "false")
+        if cursor:
+            cursor_updated_at, cursor_id = decode_cursor(cursor)
+            page_query = page_query.filter(
+                or_(
+                    Chat.updated_at < cursor_updated_at,
+                    and_(Chat.updated_at == cursor_updated_at, Chat.id < cursor_id)
+                )
+            )
+        # Fetch one extra row to know whether another page exists
+        page = (
+            page_query
+            .order_by(desc(Chat.updated_at), desc(Chat.id))
+            .limit(limit + 1)
+            .subquery()
+        )
+
+        ranked = (
+            self.db.query(
+                Message.chat_id.label("chat_id"),
+                func.substr(Message.content, 1, SNIPPET_LENGTH).label("snippet"),
+                Message.role.label("role"),
+                Message.created_at.label("created_at"),
+                func.row_number().over(
+                    partition_by=Message.chat_id,
+                    order_by=(desc(Message.created_at), desc(Message.id))
+                ).label("rn"),
+                func.count().over(partition_by=Message.chat_id).label("message_count"),
+            )
+            .filter(Message.chat_id.in_(self.db.query(page.c.id)))
+            .subquery()
+        )
+
+        rows = (
+            self.db.query(
+                page.c.id,
+                page.c.title,
+                page.c.user_id,
+                page.c.created_at,
+                page.c.updated_at,
+                page.c.is_archived,
+                ranked.c.snippet,
+                ranked.c.role,
+                ranked.c.created_at.label("last_message_at"),
+                ranked.c.message_count,
+                page.c.messages_tiered,
+            )
+            .outerjoin(ranked, and_(ranked.c.chat_id == page.c.id, ranked.c.rn == 1))
+            .order_by(desc(page.c.updated_at), desc(page.c.id))
+            .all()
+        )
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        # Chats tiered to cold storage keep their counts and preview on the batch rows
+        tiered_ids = [row.id for row in rows if row.messages_tiered == "true"]
+        cold_stats = {}
+        if tiered_ids:
+            batches = (
+                self.db.query(ColdMessageBatch)
+                .filter(ColdMessageBatch.chat_id.in_(tiered_ids))
+                .order_by(ColdMessageBatch.created_at)
+                .all()
+            )
+            for batch in batches:
+                count, _ = cold_stats.get(batch.chat_id, (0, None))
+                cold_stats[batch.chat_id] = (count + batch.message_count, batch)
+
+        chats = []
+        for row in rows:
+            last_message = None
+            message_count = row.message_count or 0
+            # A tiered chat may have new hot messages too: count both
+            cold_count, batch = cold_stats.get(row.id, (0, None))
+            message_count += cold_count
+            if row.snippet is not None:
+                last_message = {
+                    "role": row.role,
+                    "snippet": row.snippet,
+                    "created_at": row.last_message_at.isoformat()
+                }
+            elif batch is not None:
+                last_message = {
+                    "role": batch.last_role,
+                    "snippet": batch.last_snippet,
+                    "created_at": batch.last_created_at.isoformat() if batch.last_created_at else None
+                }
+            chats.append({
+                "id": row.id,
+                "title": row.title,
+                "user_id": row.user_id,
+                "created_at": row.created_at.isoformat(),
+                "updated_at": row.updated_at.isoformat(),
+                "is_archived": row.is_archived,
+                "message_count": message_count,
+                "last_message": last_message
+            })
+
+        next_cursor = None
+        if has_more and rows:
+            next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+
+        return chats, next_cursor
 
     def archive_chat(self, chat_id: str) -> bool:
         """Archive a chat"""
         chat = self.get_chat(chat_id)
         if chat:
             chat.is_archived = "true"
+            chat.archived_at = datetime.utcnow()
             self.db.commit()
+            mark_written(f"chat:{chat_id}", f"user:{chat.user_id}")
             return True
         return False
 
     def restore_chat(self, chat_id: str) -> bool:
-        """Restore an archived chat"""
+        """Restore an archived chat
+
+        Messages tiered to cold storage are not moved back here; reads fall
+        through to cold storage and the next new message rehydrates them.
+        """
         chat = self.get_chat(chat_id)
         if chat:
             chat.is_archived = "false"
+            chat.archived_at = None
             self.db.commit()
+            mark_written(f"chat:{chat_id}", f"user:{chat.user_id}")
             return True
         return False
\ No newline at end of file
@@ -0,0 +1,142 @@
+from app.core.config import settings
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import re
+
+# Per-message framing overhead in chat completion requests
+MESSAGE_OVERHEAD_TOKENS = 4
+TRUNCATION_MARKER = "\n…[truncated]"
+# Token counts of stored messages, by message id
+MESSAGE_TOKEN_CACHE_SIZE = 10000
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate
+
+    CJK characters are roughly one token each; other text averages about
+    four characters per token for OpenAI tokenizers. Not cached: a cache
+    keyed on the text would pin whole documents in memory, and one regex
+    pass is cheap next to the model call.
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+_message_tokens: "OrderedDict[str, int]" = OrderedDict()
+
+
+def message_tokens(message: Dict) -> int:
+    """Token estimate of a history message, cached by message id
+
+    Stored messages never change, and the same history is re-sent on every
+    turn of a chat. Only ids and counts are kept, not the text.
+    """
+    message_id = message.get("id")
+    if message_id is None:
+        return estimate_tokens(message["content"])
+    tokens = _message_tokens.get(message_id)
+    if tokens is not None:
+        _message_tokens.move_to_end(message_id)
+        return tokens
+    tokens = estimate_tokens(message["content"])
+    _message_tokens[message_id] = tokens
+    while len(_message_tokens) > MESSAGE_TOKEN_CACHE_SIZE:
+        _message_tokens.popitem(last=False)
+    return tokens
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to roughly max_tokens, keeping the beginning"""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    # Scale by the text's own chars-per-token ratio, then tighten if needed
+    cut = int(len(text) * max_tokens / tokens)
+    while cut > 0 and estimate_tokens(text[:cut]) > max_tokens:
+        cut = int(cut * 0.9)
+    return text[:cut] + TRUNCATION_MARKER
+
+
+class ContextBudgeter:
+    """Fits document context and conversation history into a token budget
+
+    The system prompt and current user message are always sent. What is
+    left goes to the most recent history and the linked documents; each
+    gets `document_share` / the rest of the budget, and whichever needs
+    less hands its unused share to the other.
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        response_reserve: Optional[int] = None,
+        document_share: float = 0.5
+    ):
+        self.max_tokens = max_tokens or settings.context_max_tokens
+        self.response_reserve = (
+            response_reserve if response_reserve is not None
+            else settings.context_response_reserve_tokens
+        )
+        self.document_share = document_share
+
+    def fit(
+        self,
+        system_prompt: str,
+        user_message: str,
+        document_context: Optional[str],
+        history: List[Dict]
+    ) -> Tuple[Optional[str], List[Dict]]:
+        """Return (document_context, history) trimmed to fit the budget
+
+        `system_prompt` is the prompt without the document context; history
+        is chronological and trimmed from the oldest end.
+        """
+        available = (
+            self.max_tokens
+            - self.response_reserve
+            - estimate_tokens(system_prompt)
+            - estimate_tokens(user_message)
+            - 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+        available = max(available, 0)
+
+        history_costs = [
+            message_tokens(msg) + MESSAGE_OVERHEAD_TOKENS for msg in history
+        ]
+        history_needed = sum(history_costs)
+        document_needed = estimate_tokens(document_context) if document_context else 0
+
+        if history_needed + document_needed <= available:
+            return document_context, history
+
+        document_budget = int(available * self.document_share)
+        history_budget = available - document_budget
+        if document_needed < document_budget:
+            history_budget += document_budget - document_needed
+            document_budget = document_needed
+        elif history_needed < history_budget:
+            document_budget += history_budget - history_needed
+            history_budget = history_needed
+
+        # Keep the newest messages that fit
+        kept = 0
+        used = 0
+        for cost in reversed(history_costs):
+            if used + cost > history_budget:
+                break
+            used += cost
+            kept += 1
+        trimmed_history = history[len(history) - kept:] if kept else []
+
+        trimmed_document = None
+        if document_context and document_budget > 0:
+            trimmed_document = truncate_to_tokens(document_context, document_budget)
+
+        return trimmed_document, trimmed_history
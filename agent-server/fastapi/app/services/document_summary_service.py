@@ -0,0 +1,191 @@
+from app.services.context_budget import estimate_tokens
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import asyncio
+import hashlib
+
+# Target and maximum chunk sizes in estimated tokens
+CHUNK_TARGET_TOKENS = 800
+CHUNK_MAX_TOKENS = 1500
+# Combined chunk summaries larger than this are reduced in groups first
+REDUCE_MAX_TOKENS = 3000
+SUMMARY_CONCURRENCY = 4
+CHUNK_CACHE_SIZE = 4096
+DOCUMENT_CACHE_SIZE = 256
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_document(text: str) -> List[str]:
+    """Split text into chunks on paragraph boundaries
+
+    A chunk ends after a paragraph whose content hash selects it as a
+    boundary (content-defined chunking) or when the next paragraph would
+    exceed CHUNK_MAX_TOKENS. Boundaries therefore depend on the paragraphs
+    themselves, so editing one paragraph only changes the chunk it is in.
+    """
+    paragraphs = [p for p in text.split("\n\n") if p.strip()]
+    modulus = max(1, CHUNK_TARGET_TOKENS // 100)
+
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+    for paragraph in paragraphs:
+        tokens = estimate_tokens(paragraph)
+        if current and current_tokens + tokens > CHUNK_MAX_TOKENS:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += tokens
+        if current_tokens >= CHUNK_TARGET_TOKENS // 4 and int(_hash(paragraph)[:8], 16) % modulus == 0:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+class _LRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.data: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.data.get(key)
+        if value is not None:
+            self.data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+
+# Process-wide caches shared by all summarizer instances
+_chunk_summaries = _LRU(CHUNK_CACHE_SIZE)
+_document_summaries = _LRU(DOCUMENT_CACHE_SIZE)
+# Document summaries by caller-supplied version (e.g. linked documents' updatedAt),
+# so unchanged documents are not even re-chunked to find their summary
+_versioned_summaries = _LRU(DOCUMENT_CACHE_SIZE)
+_in_flight: Dict[str, asyncio.Task] = {}
+
+
+class DocumentSummarizer:
+    """Map-reduce document summaries cached by content hash
+
+    Each chunk is summarized once per distinct content; chunk summaries
+    are reduced into a document summary that is cached under the hash of
+    its chunk hashes. Unchanged documents cost no LLM calls and an edit
+    re-summarizes only the affected chunk plus the reduce step.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    def get_cached(self, document: str, version: Optional[str] = None) -> Optional[str]:
+        """Return the document summary if it is already cached"""
+        if version is not None:
+            return _versioned_summaries.get(version)
+        return _document_summaries.get(self._document_key(chunk_document(document)))
+
+    def summarize_in_background(self, document: str, version: Optional[str] = None) -> asyncio.Task:
+        """Start (or join) summarizing a document and return the task"""
+        if version is not None:
+            return self._run_once("version:" + version, lambda: self._summarize_version(document, version))
+        key = self._document_key(chunk_document(document))
+        return self._run_once(key, lambda: self._summarize_document(document))
+
+    async def summarize(self, document: str, version: Optional[str] = None) -> str:
+        """Summarize a document, reusing cached chunk and document summaries"""
+        return await asyncio.shield(self.summarize_in_background(document, version))
+
+    async def _summarize_version(self, document: str, version: str) -> str:
+        summary = await self._summarize_document(document)
+        _versioned_summaries.set(version, summary)
+        return summary
+
+    @staticmethod
+    def _document_key(chunks: List[str]) -> str:
+        return _hash("|".join(_hash(chunk) for chunk in chunks))
+
+    def _run_once(self, key: str, factory) -> asyncio.Task:
+        task = _in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(factory())
+            _in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return task
+
+    @staticmethod
+    def _finish(key: str, task: asyncio.Task):
+        _in_flight.pop(key, None)
+        # Background runs may have no awaiter; log failures instead of leaking them
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Document summarization failed: {task.exception()}")
+
+    async def _summarize_document(self, document: str) -> str:
+        chunks = chunk_document(document)
+        if not chunks:
+            return ""
+        key = self._document_key(chunks)
+        cached = _document_summaries.get(key)
+        if cached is not None:
+            return cached
+
+        semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+        async def summarize_chunk(chunk: str) -> str:
+            chunk_key = _hash(chunk)
+            cached_chunk = _chunk_summaries.get(chunk_key)
+            if cached_chunk is not None:
+                return cached_chunk
+            async with semaphore:
+                summary = await self._run_once(
+                    "chunk:" + chunk_key, lambda: self._summarize_chunk(chunk)
+                )
+            _chunk_summaries.set(chunk_key, summary)
+            return summary
+
+        summaries = await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks))
+        summary = await self._reduce(list(summaries))
+        _document_summaries.set(key, summary)
+        return summary
+
+    async def _summarize_chunk(self, chunk: str) -> str:
+        prompt = f"""Summarize this part of a document. Keep key topics, facts, data and conclusions. Be concise.
+
+{chunk}"""
+        response = await self.llm.ainvoke([{"role": "system", "content": prompt}])
+        return response.content.strip()
+
+    async def _reduce(self, summaries: List[str]) -> str:
+        if len(summaries) == 1:
+            return summaries[0]
+
+        # Reduce in groups until the combined summaries fit one prompt
+        while sum(estimate_tokens(s) for s in summaries) > REDUCE_MAX_TOKENS and len(summaries) > 1:
+            groups = [summaries[i:i + 4] for i in range(0, len(summaries), 4)]
+            summaries = list(await asyncio.gather(*(self._combine(group) for group in groups)))
+
+        return await self._combine(summaries)
+
+    async def _combine(self, summaries: List[str]) -> str:
+        if len(summaries) == 1:
+            return summaries[0]
+        joined = "\n\n".join(f"Part {i + 1}:\n{s}" for i, s in enumerate(summaries))
+        prompt = f"""Combine these summaries of consecutive parts of the same documents into one structured summary that includes:
+1. Key topics and themes
+2. Important facts or data
+3. Main conclusions or insights
+4. Relevant context for answering questions
+
+Keep it concise but comprehensive.
+
+{joined}"""
+        response = await self.llm.ainvoke([{"role": "system", "content": prompt}])
+        return response.content.strip()
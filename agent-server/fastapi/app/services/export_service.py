@@ -0,0 +1,117 @@
+from sqlalchemy import select, asc, desc
+from sqlalchemy.orm import Session
+from app.models.chat import Chat, Message
+from app.services.tiering_service import MessageTieringService
+from typing import Iterator, Optional
+import json
+import zlib
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+# Bytes buffered before a chunk is handed to the response
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def _isoformat(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _message_line(chat_id: str, message_id: str, content: str, role: str, user_id: str,
+                  created_at: Optional[str], truncated: Optional[str]) -> str:
+    """One message line; hot and cold messages export with the same keys"""
+    return json.dumps({
+        "type": "message",
+        "chat_id": chat_id,
+        "id": message_id,
+        "content": content,
+        "role": role,
+        "user_id": user_id,
+        "created_at": created_at,
+        "truncated": truncated or "false"
+    }, ensure_ascii=False) + "\n"
+
+
+class ChatExportService:
+    """Streams a user's chats and messages as NDJSON
+
+    Rows are read with a server-side cursor as plain tuples, never as ORM
+    objects, so memory stays constant regardless of export size.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def iter_lines(self, user_id: str, include_archived: bool = True) -> Iterator[str]:
+        """Yield one JSON line per chat followed by one per message of that chat"""
+        stmt = (
+            select(
+                Chat.id, Chat.title, Chat.created_at, Chat.updated_at,
+                Chat.is_archived, Chat.messages_tiered,
+                Message.id, Message.role, Message.content, Message.user_id, Message.created_at,
+                Message.truncated
+            )
+            .outerjoin(Message, Message.chat_id == Chat.id)
+            .where(Chat.user_id == user_id)
+            .order_by(desc(Chat.updated_at), asc(Chat.id), asc(Message.created_at))
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        if not include_archived:
+            stmt = stmt.where(Chat.is_archived == "false")
+
+        current_chat_id = None
+        for row in self.db.execute(stmt):
+            (chat_id, title, chat_created_at, chat_updated_at, is_archived, tiered,
+             message_id, role, content, message_user_id, message_created_at, truncated) = row
+
+            if chat_id != current_chat_id:
+                current_chat_id = chat_id
+                yield json.dumps({
+                    "type": "chat",
+                    "id": chat_id,
+                    "title": title,
+                    "created_at": _isoformat(chat_created_at),
+                    "updated_at": _isoformat(chat_updated_at),
+                    "is_archived": is_archived
+                }, ensure_ascii=False) + "\n"
+
+                if tiered == "true":
+                    for message in MessageTieringService(self.db).load_cold_messages(chat_id):
+                        yield _message_line(
+                            chat_id, message["id"], message["content"], message["role"],
+                            message["user_id"], message["created_at"], message.get("truncated")
+                        )
+
+            if message_id is not None:
+                yield _message_line(
+                    chat_id, message_id, content, role, message_user_id,
+                    _isoformat(message_created_at), truncated
+                )
+
+    def iter_chunks(
+        self,
+        user_id: str,
+        include_archived: bool = True,
+        compress: bool = False
+    ) -> Iterator[bytes]:
+        """Yield the export as byte chunks, optionally as a gzip stream"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = []
+        buffered = 0
+
+        for line in self.iter_lines(user_id, include_archived):
+            data = line.encode("utf-8")
+            buffer.append(data)
+            buffered += len(data)
+            if buffered >= EXPORT_CHUNK_SIZE:
+                chunk = b"".join(buffer)
+                buffer, buffered = [], 0
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+
+        chunk = b"".join(buffer)
+        if compressor:
+            chunk = compressor.compress(chunk) + compressor.flush()
+        if chunk:
+            yield chunk
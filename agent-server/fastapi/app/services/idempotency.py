@@ -0,0 +1,97 @@
+from app.core.config import settings
+from app.core.metrics import metrics
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple, TypeVar
+import asyncio
+import hashlib
+import json
+import time
+
+T = TypeVar("T")
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key was reused with a different request body"""
+
+
+def request_fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Results of requests sent with an Idempotency-Key, for retries to reuse
+
+    The first request with a key runs; a retry while it is still running
+    awaits the same execution, and a retry after it finished gets the same
+    result. Failed executions are forgotten so they can be retried: those
+    that raise, and those whose result reusable() rejects (checked when the
+    execution finishes and again on every retry, for results that fail
+    later, like a stream). Entries are kept for idempotency_ttl_seconds, at
+    most idempotency_max_entries.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[float, str, asyncio.Future]]" = OrderedDict()
+
+    def _expire(self):
+        cutoff = time.monotonic() - settings.idempotency_ttl_seconds
+        while self._entries:
+            created_at = next(iter(self._entries.values()))[0]
+            if created_at >= cutoff and len(self._entries) <= settings.idempotency_max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    async def run(
+        self,
+        scope: str,
+        key: Optional[str],
+        fingerprint: str,
+        execute: Callable[[], Awaitable[T]],
+        reusable: Optional[Callable[[T], bool]] = None
+    ) -> T:
+        """Run execute() once per (scope, key); without a key it just runs
+
+        scope names the route and the user, e.g. "stream:<user_id>:<chat_id>".
+        """
+        if not key:
+            return await execute()
+
+        entry_key = f"{scope}:{key}"
+        self._expire()
+        entry = self._entries.get(entry_key)
+        if entry is not None:
+            _, entry_fingerprint, future = entry
+            if entry_fingerprint != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+            if future.done() and reusable is not None and not reusable(future.result()):
+                del self._entries[entry_key]
+                return await self.run(scope, key, fingerprint, execute, reusable)
+            metrics.increment(
+                "idempotent_replays", scope=scope.partition(":")[0],
+                state="completed" if future.done() else "in_flight"
+            )
+            # Shielded so a retry that gives up does not cancel the original
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._entries[entry_key] = (time.monotonic(), fingerprint, future)
+        try:
+            result = await execute()
+        except BaseException as error:
+            if self._entries.get(entry_key, (None, None, None))[2] is future:
+                del self._entries[entry_key]
+            if isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(error)
+                # Retrieved here so an execution nobody else waited on does not warn
+                future.exception()
+            raise
+        future.set_result(result)
+        if reusable is not None and not reusable(result):
+            if self._entries.get(entry_key, (None, None, None))[2] is future:
+                del self._entries[entry_key]
+        return result
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,171 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.database import mark_written
+from app.models.chat import Chat, Message
+from app.services.search_service import MessageSearchService
+from app.services.tiering_service import MessageTieringService
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+import json
+import uuid
+
+# Rows per executemany round trip
+INGEST_BATCH_SIZE = 1000
+# Cap on per-row errors echoed back to the client
+MAX_REPORTED_ERRORS = 1000
+# Longest accepted NDJSON line; longer lines are skipped and reported
+MAX_LINE_BYTES = 1024 * 1024
+VALID_ROLES = ("user", "assistant")
+
+
+class MessageIngestService:
+    """Bulk-imports messages from an NDJSON stream
+
+    Each line is one message: {"content", "role", optional "created_at",
+    and "chat_id" for multi-chat imports}. Messages are attributed to the
+    importing user and may only target that user's chats; a row naming a
+    different "user_id" is rejected. Lines are parsed as they arrive, valid
+    rows are inserted with executemany in batches, and each chat's
+    updated_at is bumped once when the import finishes.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._chats: Dict[str, Optional[Chat]] = {}
+
+    async def ingest(
+        self,
+        body: AsyncIterator[bytes],
+        user_id: str,
+        default_chat_id: Optional[str] = None
+    ) -> Dict:
+        inserted = 0
+        failed = 0
+        errors: List[Dict] = []
+        batch: List[Dict] = []
+        line_number = 0
+        pending = b""
+        # Set while discarding the rest of an over-long line
+        skipping = False
+
+        def record_error(line: int, error: str):
+            nonlocal failed
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line, "error": error})
+
+        def handle_line(raw: bytes):
+            nonlocal line_number
+            line_number += 1
+            if not raw.strip():
+                return
+            try:
+                batch.append(self._parse_row(raw, user_id, default_chat_id))
+            except ValueError as e:
+                record_error(line_number, str(e))
+
+        def skip_line():
+            nonlocal line_number
+            line_number += 1
+            record_error(line_number, f"Line exceeds {MAX_LINE_BYTES} bytes")
+
+        async for chunk in body:
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for raw in lines:
+                if skipping:
+                    # The tail of the over-long line, already reported
+                    skipping = False
+                    continue
+                if len(raw) > MAX_LINE_BYTES:
+                    skip_line()
+                else:
+                    handle_line(raw)
+            if len(pending) > MAX_LINE_BYTES:
+                if not skipping:
+                    skip_line()
+                    skipping = True
+                pending = b""
+            if len(batch) >= INGEST_BATCH_SIZE:
+                inserted += self._flush(batch)
+                batch = []
+
+        if pending and not skipping:
+            handle_line(pending)
+        if batch:
+            inserted += self._flush(batch)
+
+        touched = [chat for chat in self._chats.values() if chat is not None]
+        now = datetime.utcnow()
+        for chat in touched:
+            chat.updated_at = now
+        self.db.commit()
+
+        for chat in touched:
+            mark_written(f"chat:{chat.id}", f"user:{chat.user_id}")
+
+        return {
+            "inserted": inserted,
+            "failed": failed,
+            "errors": errors,
+            "errors_truncated": failed > len(errors)
+        }
+
+    def _parse_row(self, raw: bytes, user_id: str, default_chat_id: Optional[str]) -> Dict:
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            raise ValueError("Invalid JSON")
+        if not isinstance(data, dict):
+            raise ValueError("Each line must be a JSON object")
+
+        chat_id = data.get("chat_id") or default_chat_id
+        if default_chat_id and chat_id != default_chat_id:
+            raise ValueError("chat_id does not match the chat in the URL")
+        if not chat_id:
+            raise ValueError("Missing chat_id")
+        chat = self._get_chat(chat_id)
+        if chat is None or chat.user_id != user_id:
+            raise ValueError(f"Chat not found: {chat_id}")
+        if data.get("user_id") and data["user_id"] != user_id:
+            raise ValueError("user_id does not match the importing user")
+
+        content = data.get("content")
+        if not isinstance(content, str) or not content:
+            raise ValueError("Missing content")
+        role = data.get("role")
+        if role not in VALID_ROLES:
+            raise ValueError(f"Invalid role: {role!r}")
+
+        created_at = datetime.utcnow()
+        if data.get("created_at"):
+            try:
+                created_at = datetime.fromisoformat(str(data["created_at"]).replace("Z", "+00:00"))
+            except ValueError:
+                raise ValueError("Invalid created_at")
+            # Stored timestamps are naive UTC
+            if created_at.tzinfo is not None:
+                created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+        return {
+            "id": str(uuid.uuid4()),
+            "content": content,
+            "role": role,
+            "chat_id": chat_id,
+            "user_id": user_id,
+            "created_at": created_at
+        }
+
+    def _get_chat(self, chat_id: str) -> Optional[Chat]:
+        if chat_id not in self._chats:
+            chat = self.db.query(Chat).filter(Chat.id == chat_id).first()
+            # Imported history must land next to any tiered messages
+            if chat is not None and chat.messages_tiered == "true":
+                MessageTieringService(self.db).rehydrate_chat(chat)
+            self._chats[chat_id] = chat
+        return self._chats[chat_id]
+
+    def _flush(self, rows: List[Dict]) -> int:
+        self.db.execute(insert(Message), rows)
+        MessageSearchService(self.db).index_messages(rows)
+        return len(rows)
@@ -0,0 +1,136 @@
+from typing import List, Optional, Tuple
+
+_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class _Frame:
+    __slots__ = ("kind", "key", "expect_key")
+
+    def __init__(self, kind: str, key=None):
+        self.kind = kind  # "object" or "array"
+        self.key = key  # current key (object) or index (array)
+        self.expect_key = kind == "object"
+
+
+class IncrementalJSONParser:
+    """Incrementally scans a JSON object as model output arrives
+
+    Emits events for string values while they are still being generated:
+    ("delta", path, text) for each new piece and ("end", path, value) when
+    the string closes. Paths are dotted keys, e.g. "patch.content". Text
+    before the first "{" (such as a ```json fence) is skipped. Non-string
+    values are not reported; parse the full text at the end for those.
+    """
+
+    def __init__(self):
+        self.stack: List[_Frame] = []
+        self.started = False
+        self.done = False
+        self.in_string = False
+        self.string_is_key = False
+        self.escape = False
+        self.unicode_digits: Optional[str] = None
+        self.high_surrogate: Optional[int] = None
+        self.chars: List[str] = []
+        self.emitted = 0
+
+    def _path(self) -> str:
+        return ".".join(str(frame.key) for frame in self.stack)
+
+    def feed(self, text: str) -> List[Tuple]:
+        """Consume a chunk of model output and return the events it produced"""
+        events: List[Tuple] = []
+        for ch in text:
+            if self.done:
+                break
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self.stack.append(_Frame("object"))
+                continue
+            if self.in_string:
+                self._feed_string_char(ch, events)
+            else:
+                self._feed_structure_char(ch)
+
+        # Flush whatever string content arrived in this chunk as one delta
+        if self.in_string and not self.string_is_key and len(self.chars) > self.emitted:
+            events.append(("delta", self._path(), "".join(self.chars[self.emitted:])))
+            self.emitted = len(self.chars)
+        return events
+
+    def _feed_string_char(self, ch: str, events: List[Tuple]):
+        if self.unicode_digits is not None:
+            self.unicode_digits += ch
+            if len(self.unicode_digits) == 4:
+                self._append_code_point(int(self.unicode_digits, 16))
+                self.unicode_digits = None
+            return
+        if self.escape:
+            self.escape = False
+            if ch == "u":
+                self.unicode_digits = ""
+            else:
+                self.chars.append(_ESCAPES.get(ch, ch))
+            return
+        if ch == "\\":
+            self.escape = True
+            return
+        if ch == '"':
+            self._end_string(events)
+            return
+        self.chars.append(ch)
+
+    def _append_code_point(self, code: int):
+        if 0xD800 <= code <= 0xDBFF:
+            self.high_surrogate = code
+            return
+        if 0xDC00 <= code <= 0xDFFF and self.high_surrogate is not None:
+            code = 0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self.high_surrogate = None
+        self.chars.append(chr(code))
+
+    def _end_string(self, events: List[Tuple]):
+        value = "".join(self.chars)
+        top = self.stack[-1]
+        if self.string_is_key:
+            top.key = value
+        else:
+            path = self._path()
+            if len(self.chars) > self.emitted:
+                events.append(("delta", path, "".join(self.chars[self.emitted:])))
+            events.append(("end", path, value))
+        self.in_string = False
+        self.chars = []
+        self.emitted = 0
+
+    def _feed_structure_char(self, ch: str):
+        top = self.stack[-1]
+        if ch == '"':
+            self.in_string = True
+            self.string_is_key = top.kind == "object" and top.expect_key
+        elif ch == ":":
+            top.expect_key = False
+        elif ch == ",":
+            if top.kind == "object":
+                top.expect_key = True
+                top.key = None
+            else:
+                top.key += 1
+        elif ch == "{":
+            self.stack.append(_Frame("object"))
+        elif ch == "[":
+            self.stack.append(_Frame("array", 0))
+        elif ch in "}]":
+            self.stack.pop()
+            if not self.stack:
+                self.done = True
@@ -0,0 +1,67 @@
+from app.core.config import settings
+from app.core.metrics import metrics
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+import asyncio
+
+BatchRunner = Callable[[List[Dict[str, Any]]], Awaitable[List[Any]]]
+
+
+class MentionBatcher:
+    """Collects mentions on the same document for a short window and runs them as one call
+
+    The first mention for a document opens a window of
+    `mention_batch_window_ms`; every mention for that document arriving
+    within it joins the batch. The batch runner gets all of them at once
+    and each caller receives its own result.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+        self._runners: Dict[str, BatchRunner] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+
+    async def submit(self, key: str, mention: Dict[str, Any], runner: BatchRunner) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = []
+            self._pending[key] = batch
+            self._runners[key] = runner
+            self._timers[key] = loop.call_later(
+                settings.mention_batch_window_ms / 1000, self._schedule_flush, key
+            )
+        batch.append((mention, future))
+
+        if len(batch) >= settings.mention_batch_max_size:
+            self._schedule_flush(key)
+
+        return await future
+
+    def _schedule_flush(self, key: str):
+        # A batch flushed early at max size must not leave its window timer
+        # behind to cut the next batch for the same key short
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        runner = self._runners.pop(key, None)
+        if batch:
+            asyncio.create_task(self._flush(batch, runner))
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]], runner: BatchRunner):
+        metrics.increment("mention_batches")
+        metrics.increment("mentions_batched", len(batch))
+        try:
+            results = await runner([mention for mention, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+mention_batcher = MentionBatcher()
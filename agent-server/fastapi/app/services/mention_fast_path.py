@@ -0,0 +1,165 @@
+from app.services.blocknote_service import ExtractedDocument
+from typing import Dict, Optional
+import re
+
+# Building blocks for the instruction patterns below. Every pattern is
+# matched against the whole instruction, so anything beyond the plain
+# operation (e.g. "删除这段中的错别字") falls through to the model.
+_POLITE = r"(?:请|麻烦|帮我|帮忙)*"
+# An explicit object ("这段", "此块内容", "this paragraph"); never empty, so a
+# bare "删除" or "delete" is not enough to act on
+_TARGET = r"(?:把|将)?(?:这|此|该|本|当前)(?:一)?(?:(?:个|段|块|行|句|段落|部分|条)(?:内容|文字)?|内容|文字)"
+_EN_NOUN = r"(?:block|paragraph|line|section|sentence|item)"
+_EN_TARGET = rf"\s+(?:it|(?:this|that)(?:\s+{_EN_NOUN})?|the\s+{_EN_NOUN})"
+_QUOTED = r"[“\"'‘「『](?P<{name}>[^”\"'’」』]+)[”\"'’」』]"
+
+_DELETE_PATTERNS = [
+    re.compile(rf"{_POLITE}(?:{_TARGET}(?:删除|删掉|移除|去掉|删)(?:掉)?|(?:删除|删掉|移除|去掉|删)(?:掉)?{_TARGET})(?:吧)?"),
+    re.compile(rf"(?:please\s+)?(?:delete|remove){_EN_TARGET}(?:\s+please)?", re.IGNORECASE),
+]
+
+_DUPLICATE_PATTERNS = [
+    re.compile(
+        rf"{_POLITE}(?:{_TARGET}(?:复制|拷贝)(?:一份|一下|一遍|一次)?|(?:复制|拷贝)(?:一份|一下|一遍|一次)?{_TARGET})"
+    ),
+    re.compile(rf"(?:please\s+)?(?:duplicate|copy){_EN_TARGET}(?:\s+please)?", re.IGNORECASE),
+]
+
+_MOVE_PATTERNS = [
+    re.compile(
+        rf"{_POLITE}(?:{_TARGET})?(?:移动|挪动|移|挪|放)(?:到)?(?:文档)?"
+        r"(?P<where>最前面|最前|开头|顶部|最上面|最后面|最后|末尾|结尾|底部|最下面|上面|上方|前面|下面|下方|后面)(?:去)?"
+    ),
+    re.compile(rf"{_POLITE}(?:{_TARGET})?(?P<where>上移|下移)(?:一段|一块|一行|一下)?"),
+    re.compile(
+        rf"(?:please\s+)?move(?:{_EN_TARGET})?\s+(?:to\s+the\s+)?"
+        r"(?P<where>top|bottom|start|end|beginning|up|down)(?:\s+of\s+the\s+document)?",
+        re.IGNORECASE
+    ),
+]
+
+_REPLACE_PATTERNS = [
+    re.compile(
+        rf"{_POLITE}(?:把|将)?{_QUOTED.format(name='old')}(?:全部|都)?"
+        rf"(?:替换为|替换成|改为|改成|换成|改写为){_QUOTED.format(name='new')}"
+    ),
+    re.compile(
+        rf"(?:please\s+)?(?:replace|change)\s+{_QUOTED.format(name='old')}\s+(?:with|to|into|by)\s+{_QUOTED.format(name='new')}",
+        re.IGNORECASE
+    ),
+]
+
+_MOVE_DIRECTIONS = {
+    "最前面": "top", "最前": "top", "开头": "top", "顶部": "top", "最上面": "top",
+    "top": "top", "start": "top", "beginning": "top",
+    "最后面": "bottom", "最后": "bottom", "末尾": "bottom", "结尾": "bottom", "底部": "bottom",
+    "最下面": "bottom", "bottom": "bottom", "end": "bottom",
+    "上面": "up", "上方": "up", "前面": "up", "上移": "up", "up": "up",
+    "下面": "down", "下方": "down", "后面": "down", "下移": "down", "down": "down",
+}
+
+
+def normalize_instruction(instruction: str) -> str:
+    """Strip the @ai mention, surrounding whitespace and trailing punctuation"""
+    text = re.sub(r"@ai\s*", "", instruction, flags=re.IGNORECASE)
+    text = re.sub(r"\s+", " ", text).strip()
+    return re.sub(r"[。．.!！~～,，\s]+$", "", text)
+
+
+def _fullmatch(patterns, text: str) -> Optional[re.Match]:
+    for pattern in patterns:
+        match = pattern.fullmatch(text)
+        if match:
+            return match
+    return None
+
+
+def match_local_edit(instruction: str, document: ExtractedDocument, block_id: str) -> Optional[Dict]:
+    """Resolve a deterministic mention instruction without calling the model
+
+    Returns {"operation", "block_id", "content", "after_block_id", "reasoning"}
+    for delete / duplicate / move / quoted find-replace on the mentioned
+    block, or None when the instruction needs the model. Delete and
+    duplicate need an explicit object; find/replace only runs on blocks of
+    unstyled text.
+    """
+    block_text = document.block_text(block_id)
+    if block_text is None:
+        return None
+    text = normalize_instruction(instruction)
+    if not text:
+        return None
+
+    if _fullmatch(_DELETE_PATTERNS, text):
+        return {
+            "operation": "delete",
+            "block_id": block_id,
+            "content": None,
+            "reasoning": "已删除评论所在的块",
+        }
+
+    if _fullmatch(_DUPLICATE_PATTERNS, text):
+        # The editor copies the block itself, keeping its type, styles and children
+        return {
+            "operation": "duplicate",
+            "block_id": block_id,
+            "content": None,
+            "reasoning": "已在评论所在的块之后插入一份副本",
+        }
+
+    match = _fullmatch(_REPLACE_PATTERNS, text)
+    if match:
+        if document.block_span(block_id).styled:
+            # The patch is plain text; rewriting styled runs would drop their styles
+            return None
+        old, new = match.group("old"), match.group("new")
+        if old not in block_text:
+            # The text may live elsewhere in the document; let the model decide
+            return None
+        return {
+            "operation": "replace",
+            "block_id": block_id,
+            "content": block_text.replace(old, new),
+            "reasoning": f"已将“{old}”替换为“{new}”",
+        }
+
+    match = _fullmatch(_MOVE_PATTERNS, text)
+    if match:
+        return _move_edit(document, block_id, _MOVE_DIRECTIONS[match.group("where").lower()])
+
+    return None
+
+
+def _move_edit(document: ExtractedDocument, block_id: str, direction: str) -> Optional[Dict]:
+    """Move among top-level blocks; after_block_id None means the start of the document"""
+    siblings = [span.block_id for span in document.blocks if span.depth == 0]
+    if block_id not in siblings:
+        # Nested blocks (list children etc.) need the model to pick a parent
+        return None
+
+    position = siblings.index(block_id)
+    others = siblings[:position] + siblings[position + 1:]
+    if direction == "top":
+        new_position = 0
+    elif direction == "bottom":
+        new_position = len(others)
+    elif direction == "up":
+        new_position = max(0, position - 1)
+    else:
+        new_position = min(len(others), position + 1)
+
+    if new_position == position:
+        return {
+            "operation": "noop",
+            "block_id": block_id,
+            "content": None,
+            "reasoning": "该块已经在目标位置，无需移动",
+        }
+
+    return {
+        "operation": "move",
+        "block_id": block_id,
+        "content": None,
+        "after_block_id": others[new_position - 1] if new_position > 0 else None,
+        "reasoning": "已移动评论所在的块",
+    }
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Optional
 import uuid
 import asyncio
 import time
@@ -12,6 +12,45 @@ GLOBAL_TASKS = {}
 TASK_CLEANUP_INTERVAL = 3600  # 1 hour
 TASK_MAX_AGE = 7200  # 2 hours
 
+# Wake-ups for progress watchers, keyed by task id
+TASK_WATCHERS: Dict[str, asyncio.Event] = {}
+FINISHED_STATUSES = ("completed", "failed")
+
+
+def notify_task(task_id: str):
+    """Wake everyone watching a task after its status changed"""
+    waiter = TASK_WATCHERS.pop(task_id, None)
+    if waiter is not None:
+        waiter.set()
+
+
+def get_user_task(task_id: str, user_id: str) -> Optional[Dict]:
+    """The task if it was started by the user"""
+    task = GLOBAL_TASKS.get(task_id)
+    if task is not None and task.get("user_id") == user_id:
+        return task
+    return None
+
+
+async def watch_task(task_id: str) -> AsyncIterator[Dict]:
+    """Yield the task's status (without results) on every change until it finishes"""
+    last_update = None
+    while True:
+        task = GLOBAL_TASKS.get(task_id)
+        if task is None:
+            return
+        # Registered before yielding: a change made while the consumer is
+        # suspended sets this waiter, so the next wait returns at once
+        waiter = TASK_WATCHERS.setdefault(task_id, asyncio.Event())
+        if task["updated_at"] != last_update:
+            last_update = task["updated_at"]
+            snapshot = {key: value for key, value in task.items() if key not in ("results", "initial_requirements")}
+            yield snapshot
+            # The task may have moved on meanwhile; stop only after sending a finished status
+            if snapshot["status"] in FINISHED_STATUSES:
+                return
+        await waiter.wait()
+
 
 class RequirementService:
     def __init__(self, db: Session):
@@ -22,13 +61,14 @@ class RequirementService:
         # Start cleanup task if not already running
         self._ensure_cleanup_task()
 
-    async def start_requirement_generation(self, initial_requirements: str) -> str:
+    async def start_requirement_generation(self, initial_requirements: str, user_id: str) -> str:
         """Start the requirement generation process using LangGraph"""
         task_id = str(uuid.uuid4())
 
         # Store initial task status with timestamp
         self.tasks[task_id] = {
             "id": task_id,
+            "user_id": user_id,
             "status": "started",
             "initial_requirements": initial_requirements,
             "progress": 0,
@@ -50,6 +90,8 @@ class RequirementService:
             self.tasks[task_id]["status"] = "running"
             self.tasks[task_id]["message"] = "Running multi-agent requirement analysis with LangGraph"
             self.tasks[task_id]["progress"] = 5
+            self.tasks[task_id]["updated_at"] = time.time()
+            notify_task(task_id)
 
             # Create a progress callback to update task status in real-time
             async def progress_callback(current_step: str, progress: int, message: str):
@@ -58,6 +100,7 @@ class RequirementService:
                     self.tasks[task_id]["message"] = message
                     self.tasks[task_id]["current_step"] = current_step
                     self.tasks[task_id]["updated_at"] = time.time()
+                    notify_task(task_id)
                     print(f"[{task_id}] Progress: {progress}% - {message}")
 
             # Run the LangGraph workflow
@@ -72,28 +115,31 @@ class RequirementService:
                 self.tasks[task_id]["message"] = "Requirement generation completed successfully"
                 self.tasks[task_id]["results"] = result["results"]
                 self.tasks[task_id]["updated_at"] = time.time()
+                notify_task(task_id)
                 print(f"[{task_id}] Workflow completed successfully")
             else:
                 self.tasks[task_id]["status"] = "failed"
                 self.tasks[task_id]["message"] = f"LangGraph workflow failed: {result.get('error', 'Unknown error')}"
                 self.tasks[task_id]["updated_at"] = time.time()
+                notify_task(task_id)
                 print(f"[{task_id}] Workflow failed: {result.get('error', 'Unknown error')}")
 
         except Exception as e:
             self.tasks[task_id]["status"] = "failed"
             self.tasks[task_id]["message"] = f"Error during requirement generation: {str(e)}"
             self.tasks[task_id]["updated_at"] = time.time()
+            notify_task(task_id)
             print(f"[{task_id}] Exception: {str(e)}")
             import traceback
             traceback.print_exc()
 
-    def get_task_status(self, task_id: str) -> Optional[Dict]:
-        """Get the status of a requirement generation task"""
-        return self.tasks.get(task_id)
+    def get_task_status(self, task_id: str, user_id: str) -> Optional[Dict]:
+        """Get the status of a requirement generation task started by the user"""
+        return get_user_task(task_id, user_id)
 
-    def get_task_results(self, task_id: str) -> Optional[Dict]:
-        """Get the results of a completed requirement generation task"""
-        task = self.tasks.get(task_id)
+    def get_task_results(self, task_id: str, user_id: str) -> Optional[Dict]:
+        """Get the results of a completed requirement generation task started by the user"""
+        task = get_user_task(task_id, user_id)
         if task and task["status"] == "completed":
             return task["results"]
         return None
@@ -152,6 +198,7 @@ class RequirementService:
 
                 for task_id in tasks_to_remove:
                     del GLOBAL_TASKS[task_id]
+                    notify_task(task_id)
                     print(f"[CLEANUP] Removed old task: {task_id}")
 
                 if tasks_to_remove:
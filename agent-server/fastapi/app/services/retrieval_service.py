@@ -0,0 +1,202 @@
+from app.services.context_budget import estimate_tokens
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import math
+import re
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Target chunk size in estimated tokens
+CHUNK_TOKENS = 200
+# Chats whose index is kept in memory
+MAX_INDEXED_CHATS = 256
+
+_WORD_PATTERN = re.compile(r"[a-z0-9_]+")
+_CJK_RUN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words plus character bigrams for CJK runs"""
+    text = text.lower()
+    terms = _WORD_PATTERN.findall(text)
+    for run in _CJK_RUN_PATTERN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def chunk_text(text: str) -> List[str]:
+    """Pack lines into chunks of roughly CHUNK_TOKENS"""
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        tokens = estimate_tokens(line)
+        if current and current_tokens + tokens > CHUNK_TOKENS:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class _Chunk:
+    __slots__ = ("doc_id", "position", "text", "length", "term_freqs")
+
+    def __init__(self, doc_id: str, position: int, text: str):
+        self.doc_id = doc_id
+        self.position = position
+        self.text = text
+        self.term_freqs = Counter(tokenize(text))
+        self.length = sum(self.term_freqs.values())
+
+
+class ChatDocumentIndex:
+    """BM25 inverted index over the chunks of one chat's linked documents
+
+    Documents are (re)indexed individually, so an edit to one document only
+    re-chunks that document.
+    """
+
+    def __init__(self):
+        self.versions: Dict[str, datetime] = {}
+        self.titles: Dict[str, str] = {}
+        self.texts: Dict[str, str] = {}
+        self.chunks: Dict[Tuple[str, int], _Chunk] = {}
+        self.postings: Dict[str, Dict[Tuple[str, int], int]] = {}
+        self.total_length = 0
+
+    def document_ids(self) -> List[str]:
+        return list(self.versions)
+
+    def needs_update(self, doc_id: str, updated_at: datetime) -> bool:
+        return self.versions.get(doc_id) != updated_at
+
+    def add_document(self, doc_id: str, title: str, text: str, updated_at: datetime):
+        """Index a document, replacing any previous version"""
+        self.remove_document(doc_id)
+        self.versions[doc_id] = updated_at
+        self.titles[doc_id] = title
+        self.texts[doc_id] = text
+        for position, chunk_text_ in enumerate(chunk_text(text)):
+            chunk = _Chunk(doc_id, position, chunk_text_)
+            key = (doc_id, position)
+            self.chunks[key] = chunk
+            self.total_length += chunk.length
+            for term, freq in chunk.term_freqs.items():
+                self.postings.setdefault(term, {})[key] = freq
+
+    def remove_document(self, doc_id: str):
+        if doc_id not in self.versions:
+            return
+        for key in [key for key in self.chunks if key[0] == doc_id]:
+            chunk = self.chunks.pop(key)
+            self.total_length -= chunk.length
+            for term in chunk.term_freqs:
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(key, None)
+                    if not postings:
+                        del self.postings[term]
+        del self.versions[doc_id]
+        self.titles.pop(doc_id, None)
+        self.texts.pop(doc_id, None)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[float, _Chunk]]:
+        """Rank chunks against the query with BM25"""
+        if not self.chunks:
+            return []
+        n = len(self.chunks)
+        avg_length = self.total_length / n if n else 0
+        scores: Dict[Tuple[str, int], float] = {}
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, freq in postings.items():
+                length = self.chunks[key].length
+                norm = freq + BM25_K1 * (1 - BM25_B + BM25_B * length / (avg_length or 1))
+                scores[key] = scores.get(key, 0.0) + idf * freq * (BM25_K1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(score, self.chunks[key]) for key, score in ranked]
+
+    def version_key(self) -> Optional[str]:
+        """Identifies the exact set of (document, updatedAt) currently indexed"""
+        if not self.versions:
+            return None
+        parts = sorted(f"{doc_id}@{updated_at.isoformat() if updated_at else ''}"
+                       for doc_id, updated_at in self.versions.items())
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def full_text(self) -> str:
+        """All indexed documents, one paragraph per block, for whole-document summaries
+
+        Built from each document's extracted text rather than the retrieval
+        chunks, whose size-based boundaries shift after any edit, so that
+        summary chunking stays aligned to blocks.
+        """
+        sections = []
+        for doc_id in sorted(self.texts):
+            sections.append(f"### {self.titles.get(doc_id, 'Untitled')}")
+            sections.extend(line for line in self.texts[doc_id].splitlines() if line.strip())
+        return "\n\n".join(sections)
+
+    def leading_chunks(self) -> List[_Chunk]:
+        """Chunks in document order, used when the query matches nothing"""
+        return [self.chunks[key] for key in sorted(self.chunks, key=lambda k: (k[1], k[0]))]
+
+    def build_context(self, query: Optional[str], max_tokens: int, top_k: int) -> Optional[str]:
+        """Assemble the most relevant chunks into a prompt section within max_tokens"""
+        selected = [chunk for _, chunk in self.search(query, top_k)] if query else []
+        if not selected:
+            selected = self.leading_chunks()
+
+        picked = []
+        used = 0
+        for chunk in selected:
+            cost = estimate_tokens(chunk.text)
+            if used + cost > max_tokens:
+                continue
+            picked.append(chunk)
+            used += cost
+        if not picked:
+            return None
+
+        # Present chunks grouped by document and in reading order
+        picked.sort(key=lambda chunk: (chunk.doc_id, chunk.position))
+        sections = []
+        current_doc = None
+        for chunk in picked:
+            if chunk.doc_id != current_doc:
+                current_doc = chunk.doc_id
+                sections.append(f"### {self.titles.get(chunk.doc_id, 'Untitled')}")
+            sections.append(chunk.text)
+        return "\n\n".join(sections)
+
+
+# Per-chat indexes, least recently used evicted first
+_chat_indexes: "OrderedDict[str, ChatDocumentIndex]" = OrderedDict()
+
+
+def get_chat_index(chat_id: str) -> ChatDocumentIndex:
+    index = _chat_indexes.get(chat_id)
+    if index is None:
+        index = ChatDocumentIndex()
+        _chat_indexes[chat_id] = index
+        while len(_chat_indexes) > MAX_INDEXED_CHATS:
+            _chat_indexes.popitem(last=False)
+    else:
+        _chat_indexes.move_to_end(chat_id)
+    return index
@@ -0,0 +1,230 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.models.chat import Message
+from typing import Dict, List, Optional, Tuple
+from threading import Lock
+import html
+import re
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+MAX_SEARCH_LIMIT = 50
+# Characters of context kept on each side of the first hit in a snippet
+SNIPPET_RADIUS = 40
+# Trigram indexes only help terms of at least this many characters
+TRIGRAM_MIN_CHARS = 3
+
+# Engines whose search index has already been created in this process
+_initialized_engines = set()
+_init_lock = Lock()
+
+
+class MessageSearchService:
+    """Full-text search over chat messages
+
+    Chats are mostly Chinese, which word tokenizers cannot split, so both
+    backends index trigrams and match terms as substrings: a pg_trgm GIN
+    index on PostgreSQL and an FTS5 table with the trigram tokenizer on
+    SQLite. Terms shorter than three characters (e.g. "世界") cannot use a
+    trigram index and are matched with LIKE on the already-narrowed rows.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = db.get_bind().dialect.name
+
+    @staticmethod
+    def ensure_index(engine: Engine):
+        """Create the search index for this engine if it does not exist yet"""
+        with _init_lock:
+            if id(engine) in _initialized_engines:
+                return
+
+            dialect = engine.dialect.name
+            with engine.begin() as conn:
+                if dialect == "postgresql":
+                    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                    conn.execute(text(
+                        "CREATE INDEX IF NOT EXISTS ix_messages_content_trgm "
+                        "ON messages USING GIN (content gin_trgm_ops)"
+                    ))
+                elif dialect == "sqlite":
+                    existing = conn.execute(text(
+                        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+                    )).first()
+                    if existing and "trigram" not in existing[0]:
+                        # Built with the default unicode61 tokenizer; rebuild it
+                        conn.execute(text("DROP TABLE messages_fts"))
+                        existing = None
+                    if not existing:
+                        conn.execute(text(
+                            "CREATE VIRTUAL TABLE messages_fts "
+                            "USING fts5(content, message_id UNINDEXED, tokenize = 'trigram')"
+                        ))
+                        # Backfill messages written before the index existed
+                        conn.execute(text(
+                            "INSERT INTO messages_fts (content, message_id) "
+                            "SELECT content, id FROM messages"
+                        ))
+
+            _initialized_engines.add(id(engine))
+
+    def index_message(self, message: Message):
+        """Add a message to the search index in the caller's transaction
+
+        PostgreSQL maintains the expression index on insert, so only SQLite
+        needs an explicit write.
+        """
+        if self.dialect != "sqlite":
+            return
+        self.ensure_index(self.db.get_bind())
+        self.db.execute(
+            text("INSERT INTO messages_fts (content, message_id) VALUES (:content, :message_id)"),
+            {"content": message.content, "message_id": message.id}
+        )
+
+    def index_messages(self, rows: List[Dict]):
+        """Bulk variant of index_message for dicts with "id" and "content" keys"""
+        if self.dialect != "sqlite" or not rows:
+            return
+        self.ensure_index(self.db.get_bind())
+        self.db.execute(
+            text("INSERT INTO messages_fts (content, message_id) VALUES (:content, :message_id)"),
+            [{"content": row["content"], "message_id": row["id"]} for row in rows]
+        )
+
+    def remove_messages(self, message_ids: List[str]):
+        """Drop messages from the search index in the caller's transaction"""
+        if self.dialect != "sqlite" or not message_ids:
+            return
+        self.ensure_index(self.db.get_bind())
+        for message_id in message_ids:
+            self.db.execute(
+                text("DELETE FROM messages_fts WHERE message_id = :message_id"),
+                {"message_id": message_id}
+            )
+
+    def search(
+        self,
+        user_id: str,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        chat_id: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[int]]:
+        """Search a user's messages, best matches first
+
+        Returns one page of results and the offset of the next page, if any.
+        """
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+        offset = max(0, offset)
+        params = {
+            "user_id": user_id,
+            "limit": limit + 1,
+            "offset": offset,
+            "chat_id": chat_id,
+        }
+
+        terms = self._terms(query)
+        if not terms:
+            return [], None
+        # Every term must appear; short terms fall back to LIKE
+        for i, term in enumerate(terms):
+            params[f"like_{i}"] = "%" + self._escape_like(term) + "%"
+        long_terms = [term for term in terms if len(term) >= TRIGRAM_MIN_CHARS]
+
+        if self.dialect == "postgresql":
+            # ILIKE on the trigram-indexed column; the planner uses the index for long terms
+            conditions = [f"m.content ILIKE :like_{i} ESCAPE '\\'" for i in range(len(terms))]
+            params["query"] = " ".join(terms)
+            sql = f"""
+                SELECT m.id AS message_id, m.chat_id, c.title AS chat_title, m.role, m.created_at,
+                       m.content, word_similarity(:query, m.content) AS rank
+                FROM messages m
+                JOIN chats c ON c.id = m.chat_id
+                WHERE {" AND ".join(conditions)}
+                  AND c.user_id = :user_id
+                  AND (CAST(:chat_id AS VARCHAR) IS NULL OR m.chat_id = :chat_id)
+                ORDER BY rank DESC, m.created_at DESC
+                LIMIT :limit OFFSET :offset
+            """
+        elif self.dialect == "sqlite":
+            conditions = [
+                f"messages_fts.content LIKE :like_{i} ESCAPE '\\'"
+                for i, term in enumerate(terms) if len(term) < TRIGRAM_MIN_CHARS
+            ]
+            if long_terms:
+                params["query"] = self._to_fts5_query(long_terms)
+                conditions.insert(0, "messages_fts MATCH :query")
+                rank = "bm25(messages_fts)"
+            else:
+                rank = "0"
+            sql = f"""
+                SELECT m.id AS message_id, m.chat_id, c.title AS chat_title, m.role, m.created_at,
+                       m.content, {rank} AS rank
+                FROM messages_fts
+                JOIN messages m ON m.id = messages_fts.message_id
+                JOIN chats c ON c.id = m.chat_id
+                WHERE {" AND ".join(conditions)}
+                  AND c.user_id = :user_id
+                  AND (:chat_id IS NULL OR m.chat_id = :chat_id)
+                ORDER BY rank, m.created_at DESC
+                LIMIT :limit OFFSET :offset
+            """
+        else:
+            raise ValueError(f"Full-text search is not supported for {self.dialect}")
+
+        rows = self.db.execute(text(sql), params).mappings().all()
+
+        next_offset = offset + limit if len(rows) > limit else None
+        results = []
+        for row in rows[:limit]:
+            created_at = row["created_at"]
+            results.append({
+                "message_id": row["message_id"],
+                "chat_id": row["chat_id"],
+                "chat_title": row["chat_title"],
+                "role": row["role"],
+                "snippet": self._snippet(row["content"], terms),
+                "created_at": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at,
+                # bm25 is lower-is-better, flip it so higher is always better
+                "rank": float(-row["rank"] if self.dialect == "sqlite" else row["rank"])
+            })
+
+        return results, next_offset
+
+    @staticmethod
+    def _terms(query: str) -> List[str]:
+        return [term for term in query.split() if term]
+
+    @staticmethod
+    def _escape_like(term: str) -> str:
+        return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    @staticmethod
+    def _to_fts5_query(terms: List[str]) -> str:
+        """Quote each term so user input cannot inject FTS5 query syntax"""
+        return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+    @staticmethod
+    def _snippet(content: str, terms: List[str]) -> str:
+        """Text around the first hit, with every term occurrence highlighted
+
+        The message text is HTML-escaped, so only the highlight marks are markup.
+        """
+        pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+        match = pattern.search(content)
+        hit = match.start() if match else 0
+        start = max(0, hit - SNIPPET_RADIUS)
+        end = min(len(content), hit + SNIPPET_RADIUS * 2)
+        window = content[start:end]
+        parts = []
+        last = 0
+        for hit_match in pattern.finditer(window):
+            parts.append(html.escape(window[last:hit_match.start()]))
+            parts.append(f"{HIGHLIGHT_START}{html.escape(hit_match.group(0))}{HIGHLIGHT_END}")
+            last = hit_match.end()
+        parts.append(html.escape(window[last:]))
+        fragment = "".join(parts)
+        return ("…" if start > 0 else "") + fragment + ("…" if end < len(content) else "")
@@ -0,0 +1,140 @@
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
+import asyncio
+
+HEARTBEAT_FRAME = ": heartbeat\n\n"
+
+
+class ClientDisconnected(Exception):
+    """The client of a stream went away before the stream finished"""
+
+
+def format_event(data: str, event: Optional[str] = None, event_id: Optional[str] = None) -> str:
+    """Frame one text/event-stream event; multi-line data becomes several data: lines"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+async def coalesce_events(
+    events: AsyncIterator[Tuple[str, str]],
+    max_bytes: int,
+    max_delay: float
+) -> AsyncIterator[Tuple[str, str]]:
+    """Merge consecutive ("content", text) events
+
+    Buffered content is flushed once it reaches max_bytes, max_delay
+    seconds after the first buffered chunk, or when any other event kind
+    arrives (which is passed through unchanged, after the flush).
+    """
+    loop = asyncio.get_running_loop()
+    iterator = events.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    buffer = []
+    size = 0
+    deadline = 0.0
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = max(0.0, deadline - loop.time()) if buffer else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if not done:
+                # Time threshold reached while waiting for the next chunk
+                yield "content", "".join(buffer)
+                buffer, size = [], 0
+                continue
+
+            future, pending = pending, None
+            try:
+                kind, text = future.result()
+            except StopAsyncIteration:
+                break
+
+            if kind != "content":
+                if buffer:
+                    yield "content", "".join(buffer)
+                    buffer, size = [], 0
+                yield kind, text
+                continue
+
+            if not buffer:
+                deadline = loop.time() + max_delay
+            buffer.append(text)
+            size += len(text.encode("utf-8"))
+            if size >= max_bytes:
+                yield "content", "".join(buffer)
+                buffer, size = [], 0
+
+        if buffer:
+            yield "content", "".join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def with_heartbeats(frames: AsyncIterator[str], interval: float) -> AsyncIterator[str]:
+    """Pass SSE frames through, sending a comment frame whenever the stream is idle for interval seconds"""
+    iterator = frames.__aiter__()
+    pending: Optional[asyncio.Future] = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield HEARTBEAT_FRAME
+                continue
+
+            future, pending = pending, None
+            try:
+                frame = future.result()
+            except StopAsyncIteration:
+                break
+            yield frame
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def until_disconnected(
+    events: AsyncIterator,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    poll_interval: float
+) -> AsyncIterator:
+    """Pass events through until the client disconnects
+
+    On disconnect the pending upstream step is cancelled, which closes the
+    upstream generator chain, and ClientDisconnected is raised.
+    """
+    iterator = events.__aiter__()
+    pending: Optional[asyncio.Future] = None
+
+    async def watch():
+        while not await is_disconnected():
+            await asyncio.sleep(poll_interval)
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        while True:
+            pending = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({pending, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if pending not in done:
+                raise ClientDisconnected()
+
+            future, pending = pending, None
+            try:
+                item = future.result()
+            except StopAsyncIteration:
+                break
+            yield item
+    finally:
+        watcher.cancel()
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,215 @@
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.sse import format_event
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import json
+import uuid
+
+
+class StreamEvent(NamedTuple):
+    """One published event, with its SSE frame formatted once for all subscribers"""
+    seq: int
+    event: Optional[str]
+    data: str
+    frame: str
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Split a "<stream_id>:<seq>" event id; None if it is not one"""
+    if not event_id or ":" not in event_id:
+        return None
+    stream_id, _, seq = event_id.rpartition(":")
+    try:
+        return stream_id, int(seq)
+    except ValueError:
+        return None
+
+
+class ChatStream:
+    """One in-flight AI answer, readable by any number of subscribers
+
+    Frames are kept in a bounded ring buffer and every subscriber reads it
+    at its own cursor, so a reconnect with Last-Event-ID replays what it
+    missed and then continues live from the same generation. A subscriber
+    whose cursor has fallen off the buffer, or lags more than max_lag
+    events behind, gets a snapshot of the text so far instead of the events
+    it missed (drop-to-latest), so a slow reader never holds up the others.
+    """
+
+    def __init__(self, chat_id: str, buffer_size: int):
+        self.stream_id = str(uuid.uuid4())
+        self.chat_id = chat_id
+        self.frames: Deque[StreamEvent] = deque(maxlen=buffer_size)
+        self.seq = 0
+        self.parts: List[str] = []
+        self.title: Optional[str] = None
+        self.done = False
+        # The generation failed or was cut short; an idempotent retry starts a new one
+        self.failed = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._terminal: Optional[Tuple[Optional[str], str]] = None
+        self._waiter = asyncio.Event()
+
+    def publish(self, data: str, event: Optional[str] = None):
+        self.seq += 1
+        self.frames.append(self._event(self.seq, event, data))
+        self._notify()
+
+    def _event(self, seq: int, event: Optional[str], data: str) -> StreamEvent:
+        return StreamEvent(seq, event, data, format_event(data, event, f"{self.stream_id}:{seq}"))
+
+    def publish_content(self, text: str):
+        self.parts.append(text)
+        self.publish(json.dumps({"content": text}))
+
+    def publish_title(self, title: str):
+        self.title = title
+        self.publish(json.dumps({"title": title}), event="title")
+
+    def finish(self, data: str, event: Optional[str] = None):
+        """Publish the last frame ([DONE] or an error) and close the stream"""
+        self._terminal = (event, data)
+        self.publish(data, event)
+        self.done = True
+        self._notify()
+
+    def _notify(self):
+        self._waiter.set()
+        self._waiter = asyncio.Event()
+
+    def content(self) -> str:
+        return "".join(self.parts)
+
+    def _snapshot_event(self) -> StreamEvent:
+        data = {"snapshot": self.content()}
+        if self.title:
+            data["title"] = self.title
+        return self._event(self.seq, "snapshot", json.dumps(data))
+
+    async def events(self, last_seq: int = 0, max_lag: Optional[int] = None) -> AsyncIterator[StreamEvent]:
+        """Yield events after last_seq, then live events until the stream is done"""
+        cursor = last_seq
+        while True:
+            waiter = self._waiter
+            oldest = self.frames[0].seq if self.frames else self.seq + 1
+            if cursor < oldest - 1 or (max_lag and self.seq - cursor > max_lag):
+                # The events this subscriber missed are gone; catch it up in one event
+                metrics.increment("chat_stream_snapshots")
+                cursor = self.seq
+                yield self._snapshot_event()
+                if self.done and self._terminal:
+                    event, data = self._terminal
+                    yield self._event(self.seq, event, data)
+                    return
+                continue
+
+            pending = [entry for entry in list(self.frames) if entry.seq > cursor]
+            if pending:
+                for entry in pending:
+                    cursor += 1
+                    yield entry
+                    if max_lag and self.seq - cursor > max_lag:
+                        break
+                continue
+
+            if self.done:
+                return
+            await waiter.wait()
+
+    async def subscribe(self, last_seq: int = 0, max_lag: Optional[int] = None) -> AsyncIterator[str]:
+        """SSE frames of events()"""
+        async for entry in self.events(last_seq, max_lag):
+            yield entry.frame
+
+
+class StreamHub:
+    """Registry of in-flight chat streams, and per-chat pub/sub for viewers
+
+    A stream with no subscribers is cancelled after stream_resume_grace_seconds
+    unless someone reconnects, and a finished stream's buffer is freed
+    stream_replay_ttl_seconds after completion. Everyone following a chat
+    reads the same ChatStream, so one generation serves all viewers.
+    """
+
+    def __init__(self):
+        self.streams: Dict[str, ChatStream] = {}
+        # Latest stream per chat, and a wake-up per waiting chat follower for when a new one starts
+        self.chat_streams: Dict[str, ChatStream] = {}
+        self._chat_waiters: Dict[str, Set[asyncio.Event]] = {}
+
+    def create(self, chat_id: str) -> ChatStream:
+        stream = ChatStream(chat_id, settings.stream_replay_buffer_events)
+        self.streams[stream.stream_id] = stream
+        self.chat_streams[chat_id] = stream
+        for waiter in self._chat_waiters.pop(chat_id, ()):
+            waiter.set()
+        return stream
+
+    def get(self, stream_id: str) -> Optional[ChatStream]:
+        return self.streams.get(stream_id)
+
+    def attach(self, stream: ChatStream):
+        stream.subscribers += 1
+
+    def detach(self, stream: ChatStream):
+        stream.subscribers -= 1
+        if stream.subscribers <= 0 and not stream.done:
+            asyncio.get_running_loop().call_later(
+                settings.stream_resume_grace_seconds, self._cancel_if_abandoned, stream
+            )
+
+    def _cancel_if_abandoned(self, stream: ChatStream):
+        if stream.subscribers <= 0 and not stream.done and stream.task is not None:
+            stream.task.cancel()
+
+    def release(self, stream: ChatStream):
+        """Free the stream's buffer once reconnects are no longer expected"""
+        asyncio.get_running_loop().call_later(settings.stream_replay_ttl_seconds, self._forget, stream)
+
+    def _forget(self, stream: ChatStream):
+        # A reference kept elsewhere (e.g. for an idempotent retry) now replays as a snapshot
+        stream.frames.clear()
+        self.streams.pop(stream.stream_id, None)
+        if self.chat_streams.get(stream.chat_id) is stream:
+            del self.chat_streams[stream.chat_id]
+
+    async def follow_chat(self, chat_id: str) -> AsyncIterator[StreamEvent]:
+        """Yield the frames of every answer generated in a chat, as they are generated
+
+        Each new generation is announced with a "stream" event. A follower
+        joining mid-answer first gets what was generated so far; answers that
+        had already finished when it joined are skipped.
+        """
+        current = self.chat_streams.get(chat_id)
+        seen = current if current is not None and current.done else None
+        while True:
+            stream = self.chat_streams.get(chat_id)
+            if stream is None or stream is seen:
+                waiter = asyncio.Event()
+                waiters = self._chat_waiters.setdefault(chat_id, set())
+                waiters.add(waiter)
+                try:
+                    await waiter.wait()
+                finally:
+                    # A follower that goes away must not leave its waiter behind
+                    waiters.discard(waiter)
+                    if not waiters and self._chat_waiters.get(chat_id) is waiters:
+                        del self._chat_waiters[chat_id]
+                continue
+
+            seen = stream
+            metrics.increment("chat_stream_subscriptions", kind="follower")
+            data = json.dumps({"stream_id": stream.stream_id})
+            yield StreamEvent(0, "stream", data, format_event(data, "stream"))
+            self.attach(stream)
+            try:
+                async for entry in stream.events(0, max_lag=settings.stream_subscriber_max_lag):
+                    yield entry
+            finally:
+                self.detach(stream)
+
+
+stream_hub = StreamHub()
@@ -1,8 +1,20 @@
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage
 from app.core.config import settings
-from typing import List, Dict, Optional, AsyncGenerator
+from app.services.context_budget import ContextBudgeter
+from typing import List, Dict, Optional, AsyncGenerator, Tuple
 import json
+import re
+
+# How far into a first-turn reply the title line is looked for
+TITLE_LINE_MAX_CHARS = 200
+_TITLE_LINE_PATTERN = re.compile(r"^\s*(?:title|标题)\s*[:：]\s*(.*)$", re.IGNORECASE)
+
+FIRST_TURN_TITLE_INSTRUCTION = """
+
+This is the first message of a new chat. Start your reply with a single line of the form
+TITLE: <a concise 3-8 word title for this chat, in the user's language>
+followed by an empty line, then your answer. Do not mention the title in the answer."""
 
 
 class StreamingChatAgent:
@@ -14,22 +26,37 @@ class StreamingChatAgent:
             base_url=settings.openai_base_url,
             streaming=True,
         )
+        # Set when a response ended with the apology instead of the model's answer
+        self.failed = False
 
     async def stream_response(
         self,
         user_message: str,
         conversation_history: List[Dict],
-        document_context: Optional[str] = None
+        document_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None,
+        with_title: bool = False
     ) -> AsyncGenerator[str, None]:
-        """Stream AI response chunks"""
+        """Stream AI response chunks
+
+        With with_title the reply starts with a "TITLE: ..." line for the chat.
+        """
         try:
-            system_prompt = self.build_system_prompt(document_context)
+            # Fit document context and history into the token budget
+            fitted_context, fitted_history = ContextBudgeter().fit(
+                self.build_system_prompt(None, conversation_summary),
+                user_message,
+                document_context,
+                conversation_history
+            )
+            system_prompt = self.build_system_prompt(fitted_context, conversation_summary)
+            if with_title:
+                system_prompt += FIRST_TURN_TITLE_INSTRUCTION
             
             # Build message history
             messages = [{"role": "system", "content": system_prompt}]
             
-            # Add last 8 messages from conversation history
-            for msg in conversation_history[-8:]:
+            for msg in fitted_history:
                 role = "user" if msg["role"] == "user" else "assistant"
                 messages.append({"role": role, "content": msg["content"]})
             
@@ -43,9 +70,14 @@ class StreamingChatAgent:
 
         except Exception as error:
             print(f"Streaming error: {error}")
+            self.failed = True
             yield "Sorry, I encountered an error while processing your request."
 
-    def build_system_prompt(self, document_context: Optional[str] = None) -> str:
+    def build_system_prompt(
+        self,
+        document_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None
+    ) -> str:
         """Build system prompt for streaming chat"""
         prompt = """You are an AI assistant integrated into Jotlin, a Notion-like document editor.
 Help users with their documents and provide intelligent assistance.
@@ -58,6 +90,9 @@ Key capabilities:
 
 Be helpful, accurate, and conversational."""
 
+        if conversation_summary:
+            prompt += f"\n\nSummary of the earlier conversation:\n{conversation_summary}"
+
         if document_context:
             prompt += f"\n\nLinked Documents:\n{document_context}"
 
@@ -68,14 +103,88 @@ class StreamingService:
     def __init__(self):
         self.streaming_agent = StreamingChatAgent()
 
+    @property
+    def failed(self) -> bool:
+        """Whether the streamed response was the error apology rather than an answer"""
+        return self.streaming_agent.failed
+
     async def stream_chat_response(
         self,
         user_message: str,
         conversation_history: List[Dict],
-        document_context: Optional[str] = None
+        document_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """Stream chat response through the streaming agent"""
         async for chunk in self.streaming_agent.stream_response(
-            user_message, conversation_history, document_context
+            user_message, conversation_history, document_context, conversation_summary
         ):
-            yield chunk
\ No newline at end of file
+            yield chunk
+
+    async def stream_first_turn(
+        self,
+        user_message: str,
+        conversation_history: List[Dict],
+        document_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        """Stream the first answer of a chat together with its title, from one model call
+
+        Yields ("title", title) at most once, before any content, then
+        ("content", chunk). If the reply does not start with a title line, or
+        the model fails before it is complete, everything is passed through as
+        content and no title is yielded.
+        """
+        buffer = ""
+        title_done = False
+        # The blank line after the title may arrive in a later chunk
+        skip_blank = False
+        async for chunk in self.streaming_agent.stream_response(
+            user_message, conversation_history, document_context, conversation_summary, with_title=True
+        ):
+            if title_done:
+                if skip_blank:
+                    chunk = chunk.lstrip("\n")
+                    skip_blank = not chunk
+                if chunk:
+                    yield "content", chunk
+                continue
+
+            if self.streaming_agent.failed:
+                # The model failed before finishing the title line; drop the
+                # partial line and pass the apology through without a title
+                title_done = True
+                buffer = ""
+                yield "content", chunk
+                continue
+
+            buffer += chunk
+            if "\n" not in buffer and len(buffer) < TITLE_LINE_MAX_CHARS:
+                continue
+
+            title_done = True
+            title, rest = self._split_title_line(buffer)
+            if title:
+                yield "title", title
+                skip_blank = not rest
+            if rest:
+                yield "content", rest
+
+        if not title_done and buffer:
+            title, rest = self._split_title_line(buffer)
+            if title:
+                yield "title", title
+            if rest:
+                yield "content", rest
+
+    @staticmethod
+    def _split_title_line(text: str) -> Tuple[Optional[str], str]:
+        """Split a leading "TITLE: ..." line off the reply"""
+        first_line, _, rest = text.partition("\n")
+        match = _TITLE_LINE_PATTERN.match(first_line)
+        if not match:
+            return None, text
+        title = match.group(1).strip().strip('"\'“”*')
+        if len(title) > 60:
+            title = title[:57] + "..."
+        return title or None, rest.lstrip("\n")
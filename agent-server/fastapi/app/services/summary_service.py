@@ -0,0 +1,132 @@
+from langchain_openai import ChatOpenAI
+from sqlalchemy import asc
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.chat import Chat, ChatSummary, Message
+from app.services.tiering_service import MessageTieringService
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+
+# Chats with a summary update currently running or queued
+_pending_updates: Dict[str, asyncio.Task] = {}
+
+
+class ChatSummaryService:
+    """Maintains an incremental running summary per chat
+
+    Everything older than the last `summary_tail_messages` messages is
+    folded into the summary, so the prompt is the summary plus a short
+    verbatim tail no matter how long the chat gets.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._llm: Optional[ChatOpenAI] = None
+
+    @property
+    def llm(self) -> ChatOpenAI:
+        # Created on first update only; most instances just read the summary
+        if self._llm is None:
+            self._llm = ChatOpenAI(
+                model="gpt-4o-mini",
+                temperature=0.3,
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url,
+            )
+        return self._llm
+
+    def get_summary(self, chat_id: str) -> Optional[ChatSummary]:
+        """Get the stored summary for a chat"""
+        return self.db.query(ChatSummary).filter(ChatSummary.chat_id == chat_id).first()
+
+    @staticmethod
+    def recent_tail(history: List[Dict], summary: Optional[ChatSummary]) -> List[Dict]:
+        """Drop history messages already covered by the summary"""
+        if summary is None:
+            return history
+        return [
+            msg for msg in history
+            if datetime.fromisoformat(msg["created_at"]) > summary.summarized_until
+        ]
+
+    async def update_summary(self, chat_id: str) -> bool:
+        """Fold messages older than the recent tail into the chat's summary
+
+        Returns True when the summary changed.
+        """
+        if not settings.openai_api_key:
+            return False
+
+        summary = self.get_summary(chat_id)
+
+        # The last summary_tail_messages stay verbatim; everything before them can be folded
+        unsummarized = self._messages_since(chat_id, summary.summarized_until if summary else None)
+        new_messages = unsummarized[:max(0, len(unsummarized) - settings.summary_tail_messages)]
+
+        if len(new_messages) < settings.summary_min_new_messages:
+            return False
+
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in new_messages)
+        prompt = f"""You maintain a running summary of a conversation between a user and an AI assistant in a document editor.
+
+Current summary:
+{summary.summary if summary else "(none yet)"}
+
+New messages to fold in:
+{transcript}
+
+Write the updated summary. Keep facts, decisions, open questions, user preferences and references to documents. Drop small talk. Stay under 300 words and respond with the summary only."""
+
+        response = await self.llm.ainvoke([{"role": "system", "content": prompt}])
+        new_summary = response.content.strip()
+        if not new_summary:
+            return False
+
+        if summary is None:
+            summary = ChatSummary(chat_id=chat_id, summary=new_summary,
+                                  summarized_until=new_messages[-1]["created_at"])
+            self.db.add(summary)
+        else:
+            summary.summary = new_summary
+            summary.summarized_until = new_messages[-1]["created_at"]
+        self.db.commit()
+        return True
+
+    def _messages_since(self, chat_id: str, since: Optional[datetime]) -> List[Dict]:
+        """Chronological messages after `since`, including ones tiered to cold storage"""
+        messages = []
+        tiered = self.db.query(Chat.messages_tiered).filter(Chat.id == chat_id).scalar()
+        if tiered == "true":
+            for msg in MessageTieringService(self.db).load_cold_messages(chat_id):
+                created_at = datetime.fromisoformat(msg["created_at"])
+                if since is None or created_at > since:
+                    messages.append({"role": msg["role"], "content": msg["content"], "created_at": created_at})
+
+        query = self.db.query(Message.role, Message.content, Message.created_at).filter(Message.chat_id == chat_id)
+        if since is not None:
+            query = query.filter(Message.created_at > since)
+        messages.extend(
+            {"role": role, "content": content, "created_at": created_at}
+            for role, content, created_at in query.order_by(asc(Message.created_at))
+        )
+        return messages
+
+
+async def _run_summary_update(chat_id: str):
+    db = SessionLocal()
+    try:
+        await ChatSummaryService(db).update_summary(chat_id)
+    except Exception as e:
+        print(f"[SUMMARY] Failed to update summary for chat {chat_id}: {e}")
+    finally:
+        db.close()
+        _pending_updates.pop(chat_id, None)
+
+
+def schedule_summary_update(chat_id: str):
+    """Update a chat's summary in the background, at most one update per chat at a time"""
+    if chat_id in _pending_updates:
+        return
+    _pending_updates[chat_id] = asyncio.create_task(_run_summary_update(chat_id))
@@ -0,0 +1,181 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import asc
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.chat import Chat, Message, ColdMessageBatch
+from app.services.search_service import MessageSearchService
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import asyncio
+import json
+import uuid
+import zlib
+
+SNIPPET_LENGTH = 120
+
+
+def _compress_messages(messages: List[Dict]) -> bytes:
+    return zlib.compress(json.dumps(messages, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _decompress_messages(payload: bytes) -> List[Dict]:
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+class MessageTieringService:
+    """Moves messages of long-archived chats into compressed cold storage
+
+    Archived chats keep their rows in `chats`; only their messages move to
+    `cold_message_batches`, so the hot `messages` table and its indexes only
+    grow with active conversations. Reads fall through to cold storage
+    transparently and the first write after a restore moves them back.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def tier_archived_chats(
+        self,
+        older_than: Optional[timedelta] = None,
+        max_chats: int = 100
+    ) -> int:
+        """Move messages of chats archived before the cutoff to cold storage
+
+        Returns the number of chats tiered in this pass.
+        """
+        if older_than is None:
+            older_than = timedelta(days=settings.cold_storage_after_days)
+        cutoff = datetime.utcnow() - older_than
+
+        chats = (
+            self.db.query(Chat)
+            .filter(
+                Chat.is_archived == "true",
+                Chat.messages_tiered == "false",
+                Chat.archived_at.isnot(None),
+                Chat.archived_at < cutoff
+            )
+            .limit(max_chats)
+            .all()
+        )
+
+        tiered = 0
+        for chat in chats:
+            try:
+                if self._tier_chat(chat.id):
+                    tiered += 1
+                self.db.commit()
+            except Exception as e:
+                self.db.rollback()
+                print(f"[TIERING] Failed to tier chat {chat.id}: {e}")
+
+        return tiered
+
+    def _tier_chat(self, chat_id: str) -> bool:
+        # Lock the chat so a concurrent restore cannot interleave, and re-check it
+        chat = (
+            self.db.query(Chat)
+            .filter(Chat.id == chat_id, Chat.is_archived == "true", Chat.messages_tiered == "false")
+            .with_for_update()
+            .first()
+        )
+        if chat is None:
+            return False
+
+        messages = (
+            self.db.query(Message)
+            .filter(Message.chat_id == chat.id)
+            .order_by(asc(Message.created_at))
+            .all()
+        )
+
+        if messages:
+            last = messages[-1]
+            self.db.add(ColdMessageBatch(
+                id=str(uuid.uuid4()),
+                chat_id=chat.id,
+                payload=_compress_messages([
+                    {
+                        "id": msg.id,
+                        "content": msg.content,
+                        "role": msg.role,
+                        "user_id": msg.user_id,
+                        "created_at": msg.created_at.isoformat(),
+                        "truncated": msg.truncated
+                    }
+                    for msg in messages
+                ]),
+                message_count=len(messages),
+                last_role=last.role,
+                last_snippet=last.content[:SNIPPET_LENGTH],
+                last_created_at=last.created_at
+            ))
+
+            message_ids = [msg.id for msg in messages]
+            MessageSearchService(self.db).remove_messages(message_ids)
+            # Only the rows copied above; a message written meanwhile stays hot
+            self.db.query(Message).filter(Message.id.in_(message_ids)).delete(
+                synchronize_session=False
+            )
+
+        # Keep updated_at as is so tiering does not reorder the chat list
+        self.db.query(Chat).filter(Chat.id == chat.id).update(
+            {Chat.messages_tiered: "true", Chat.updated_at: Chat.updated_at},
+            synchronize_session=False
+        )
+        return True
+
+    def load_cold_messages(self, chat_id: str) -> List[Dict]:
+        """Read a chat's cold messages in chronological order without rehydrating"""
+        batches = (
+            self.db.query(ColdMessageBatch)
+            .filter(ColdMessageBatch.chat_id == chat_id)
+            .order_by(asc(ColdMessageBatch.created_at))
+            .all()
+        )
+        messages = []
+        for batch in batches:
+            messages.extend(_decompress_messages(batch.payload))
+        return messages
+
+    def rehydrate_chat(self, chat: Chat):
+        """Move a chat's cold messages back into the hot table (caller commits)"""
+        search_service = MessageSearchService(self.db)
+        for data in self.load_cold_messages(chat.id):
+            message = Message(
+                id=data["id"],
+                content=data["content"],
+                role=data["role"],
+                chat_id=chat.id,
+                user_id=data["user_id"],
+                created_at=datetime.fromisoformat(data["created_at"]),
+                truncated=data.get("truncated", "false")
+            )
+            self.db.add(message)
+            search_service.index_message(message)
+
+        self.db.query(ColdMessageBatch).filter(ColdMessageBatch.chat_id == chat.id).delete(
+            synchronize_session=False
+        )
+        chat.messages_tiered = "false"
+
+
+def _run_tiering_pass() -> int:
+    db = SessionLocal()
+    try:
+        return MessageTieringService(db).tier_archived_chats()
+    finally:
+        db.close()
+
+
+async def run_tiering_job():
+    """Periodically move long-archived chats to cold storage"""
+    while True:
+        try:
+            tiered = await asyncio.to_thread(_run_tiering_pass)
+            if tiered:
+                print(f"[TIERING] Moved {tiered} archived chats to cold storage")
+        except Exception as e:
+            print(f"[TIERING] Error during tiering pass: {str(e)}")
+
+        await asyncio.sleep(settings.cold_storage_interval_seconds)
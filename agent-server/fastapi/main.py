@@ -1,7 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.api import chats, requirements, chat_title, process_mention
+from app.core.database import engine
+from app.core.schema import upgrade_schema
+from app.core.metrics import metrics
+from app.api import chats, requirements, chat_title, process_mention, realtime
+from app.services.tiering_service import run_tiering_job
+from app.services.search_service import MessageSearchService
+import asyncio
 
 app = FastAPI(
     title="Jotlin AI Agent Server",
@@ -21,6 +27,26 @@ app.include_router(chats.router, prefix="/api/chats", tags=["chats"])
 app.include_router(requirements.router, prefix="/api/requirements", tags=["requirements"])
 app.include_router(chat_title.router, prefix="/api", tags=["chat-title"])
 app.include_router(process_mention.router, prefix="/api", tags=["mention"])
+app.include_router(realtime.router, prefix="/api", tags=["realtime"])
+
+
+background_tasks = []
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    # Schema and search index DDL run once, against the primary
+    upgrade_schema(engine)
+    MessageSearchService.ensure_index(engine)
+    background_tasks.append(asyncio.create_task(run_tiering_job()))
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
 
 
 @app.get("/")
@@ -30,4 +56,13 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    snapshot = metrics.snapshot()
+    local = metrics.get("mention_requests", path="local")
+    total = local + metrics.get("mention_requests", path="llm")
+    snapshot["mention_local_share"] = round(local / total, 4) if total else 0.0
+    return snapshot
\ No newline at end of file
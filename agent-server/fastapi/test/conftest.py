@@ -0,0 +1,52 @@
+"""
+Shared fixtures for the service tests: a throwaway SQLite database and settings overrides
+"""
+import os
+import sys
+import tempfile
+
+# Point the app at a scratch database before app.core.config is imported
+_db_dir = tempfile.mkdtemp(prefix="jotlin-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.models.chat import Base
+from app.services import search_service
+
+
+@pytest.fixture
+def db():
+    """Fresh schema per test"""
+    Base.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS messages_fts"))
+    Base.metadata.create_all(engine)
+    # As on app startup, the search index exists before any session writes
+    search_service._initialized_engines.clear()
+    search_service.MessageSearchService.ensure_index(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def override_settings():
+    """Set settings attributes for one test, restoring them afterwards"""
+    saved = {}
+
+    def apply(**values):
+        for key, value in values.items():
+            saved.setdefault(key, getattr(settings, key))
+            setattr(settings, key, value)
+
+    yield apply
+    for key, value in saved.items():
+        setattr(settings, key, value)
@@ -0,0 +1,167 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.services.ai_service import AIService
+from app.services.blocknote_service import apply_block_patches, extract_blocks, replace_inline_text
+
+
+def _doc():
+    return json.dumps([
+        {"id": "h", "type": "heading", "props": {"level": 2}, "content": [{"type": "text", "text": "Title", "styles": {}}]},
+        {"id": "empty", "type": "paragraph", "props": {}, "content": []},
+        {"id": "p", "type": "paragraph", "props": {}, "content": [
+            {"type": "text", "text": "bold", "styles": {"bold": True}},
+            {"type": "text", "text": " text", "styles": {}},
+        ]},
+    ])
+
+
+def test_empty_block_has_a_span():
+    extracted = extract_blocks(_doc())
+    assert [span.block_id for span in extracted.blocks] == ["h", "empty", "p"]
+    assert extracted.block_text("empty") == ""
+    assert extracted.block_text("p") == "bold text"
+
+
+def test_block_scope_is_plain_text():
+    extracted = AIService()._block_scope("改一下", _doc(), "h", "block")
+    assert extracted.block_text("h") == "Title"
+    assert extracted.block_text("p") == "bold text"
+
+
+def test_block_mention_prompt_asks_for_plain_text():
+    service = AIService()
+    extracted = service._block_scope("改一下", _doc(), "empty", "block")
+    prompt = service._build_block_mention_prompt(
+        "改一下", "edit", service._block_neighborhood(extracted, "empty"), "Doc", "empty"
+    )
+    assert "[empty] \n" in prompt
+    assert "**" not in prompt and "## Title" not in prompt
+    assert "不要使用Markdown语法" in prompt
+
+
+def test_patch_on_empty_block():
+    blocks = apply_block_patches(_doc(), [{"block_id": "empty", "operation": "replace", "content": "filled"}])
+    assert blocks[1]["id"] == "empty"
+    assert blocks[1]["content"] == [{"type": "text", "text": "filled", "styles": {}}]
+
+
+def _styled_doc():
+    return json.dumps([
+        {"id": "a", "type": "paragraph", "props": {}, "content": [
+            {"type": "text", "text": "Hello ", "styles": {}},
+            {"type": "text", "text": "bold", "styles": {"bold": True}},
+            {"type": "text", "text": " and ", "styles": {}},
+            {"type": "link", "href": "https://example.com", "content": [
+                {"type": "text", "text": "a link", "styles": {"italic": True}},
+            ]},
+            {"type": "mention", "props": {"user": "u1"}},
+            {"type": "text", "text": " teh end", "styles": {}},
+        ], "children": [
+            {"id": "child", "type": "paragraph", "props": {}, "content": [
+                {"type": "text", "text": "nested", "styles": {"underline": True}},
+            ], "children": []},
+        ]},
+        {"id": "b", "type": "bulletListItem", "props": {}, "content": [
+            {"type": "text", "text": "second", "styles": {}},
+        ], "children": []},
+    ])
+
+
+def test_replace_keeps_styles_links_and_mentions_outside_the_edit():
+    blocks = apply_block_patches(_styled_doc(), [
+        {"block_id": "a", "operation": "replace", "content": "Hello bold and a link the end"},
+    ])
+    content = blocks[0]["content"]
+    assert content[1] == {"type": "text", "text": "bold", "styles": {"bold": True}}
+    assert content[3]["href"] == "https://example.com"
+    assert content[3]["content"] == [{"type": "text", "text": "a link", "styles": {"italic": True}}]
+    assert content[4] == {"type": "mention", "props": {"user": "u1"}}
+    assert content[5] == {"type": "text", "text": " the end", "styles": {}}
+    assert blocks[0]["children"][0]["content"][0]["styles"] == {"underline": True}
+
+
+def test_replace_inside_a_styled_run_keeps_its_style():
+    inline = json.loads(_styled_doc())[0]["content"]
+    edited = replace_inline_text(inline, "Hello boldest and a link teh end")
+    assert edited[1] == {"type": "text", "text": "boldest", "styles": {"bold": True}}
+    # Appending at the end extends the last run; the input is not mutated
+    edited = replace_inline_text(inline, "Hello bold and a link teh end!")
+    assert edited[-1]["text"] == " teh end!"
+    assert inline[-1]["text"] == " teh end"
+
+
+def test_replace_drops_runs_and_links_that_become_empty():
+    inline = json.loads(_styled_doc())[0]["content"]
+    edited = replace_inline_text(inline, "Hello  teh end")
+    assert [item["type"] for item in edited] == ["text", "mention", "text"]
+    assert "".join(item.get("text", "") for item in edited) == "Hello  teh end"
+    assert replace_inline_text(None, "plain") == [{"type": "text", "text": "plain", "styles": {}}]
+
+
+def test_insert_after_and_delete_patches():
+    blocks = apply_block_patches(_styled_doc(), [
+        {"block_id": "child", "operation": "insert_after", "content": "new child"},
+        {"block_id": "b", "operation": "delete", "content": None},
+    ])
+    assert [block["id"] for block in blocks] == ["a"]
+    children = blocks[0]["children"]
+    assert children[0]["id"] == "child"
+    assert children[1]["type"] == "paragraph"
+    assert children[1]["content"] == [{"type": "text", "text": "new child", "styles": {}}]
+
+
+def test_map_reduce_merges_chunk_patches_and_keeps_styles(override_settings):
+    override_settings(mention_map_threshold_tokens=1, mention_chunk_tokens=1)
+    document = _styled_doc()
+    service = AIService()
+    chunks = service._document_chunks(document)
+    assert [[block_id for block_id, _, _ in chunk] for chunk in chunks] == [["a"], ["child"], ["b"]]
+
+    replies = {
+        "[a]": {"reasoning": "typo", "patches": [
+            {"block_id": "a", "operation": "replace", "content": "Hello bold and a link the end"},
+            # Outside this chunk: dropped
+            {"block_id": "b", "operation": "delete"},
+        ]},
+        "[b]": {"reasoning": "more", "patches": [
+            {"block_id": "b", "operation": "insert_after", "content": "third"},
+        ]},
+    }
+
+    async def ainvoke(messages):
+        prompt = messages[0].content
+        for marker, reply in replies.items():
+            if f"\n{marker}" in prompt:
+                return SimpleNamespace(content=json.dumps(reply))
+        raise RuntimeError("model unavailable")
+
+    service.chat_agent = SimpleNamespace(llm=SimpleNamespace(ainvoke=ainvoke))
+    result = asyncio.run(service._process_document_map_reduce("修正整篇文档的错别字", "edit", document, "Doc", chunks))
+
+    assert result.type == "modify_content"
+    assert result.patches == [
+        {"block_id": "a", "operation": "replace", "content": "Hello bold and a link the end"},
+        {"block_id": "b", "operation": "insert_after", "content": "third"},
+    ]
+    assert "1个分段处理失败" in result.reasoning
+    blocks = json.loads(result.content)
+    assert [block["id"] for block in blocks][:2] == ["a", "b"]
+    assert blocks[0]["content"][1]["styles"] == {"bold": True}
+    assert blocks[0]["content"][3]["type"] == "link"
+    assert blocks[2]["content"] == [{"type": "text", "text": "third", "styles": {}}]
+
+
+def test_map_reduce_reports_when_every_chunk_fails(override_settings):
+    override_settings(mention_map_threshold_tokens=1, mention_chunk_tokens=1)
+    document = _styled_doc()
+    service = AIService()
+
+    async def ainvoke(messages):
+        return SimpleNamespace(content="not json")
+
+    service.chat_agent = SimpleNamespace(llm=SimpleNamespace(ainvoke=ainvoke))
+    chunks = service._document_chunks(document)
+    result = asyncio.run(service._process_document_map_reduce("整篇文档改正式", "edit", document, "Doc", chunks))
+    assert result.type == "no_action"
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.chat import Chat, ColdMessageBatch, Message
+from app.services.chat_service import ChatService, encode_cursor
+
+
+def _chats(db, count):
+    service = ChatService(db)
+    base = datetime(2024, 1, 1)
+    ids = []
+    for i in range(count):
+        chat = service.create_chat(f"chat {i}", "u1")
+        chat.updated_at = base + timedelta(minutes=i // 2)  # pairs share updated_at
+        ids.append(chat.id)
+    db.commit()
+    order = sorted(db.query(Chat).all(), key=lambda c: (c.updated_at, c.id), reverse=True)
+    return [chat.id for chat in order]
+
+
+def test_cursor_walks_every_chat_once(db):
+    expected = _chats(db, 7)
+    service = ChatService(db)
+    seen, cursor = [], None
+    while True:
+        page, cursor = service.get_user_chats_page("u1", limit=3, cursor=cursor)
+        seen.extend(chat["id"] for chat in page)
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_no_cursor_when_last_page_is_exactly_full(db):
+    _chats(db, 4)
+    service = ChatService(db)
+    page, cursor = service.get_user_chats_page("u1", limit=2)
+    assert len(page) == 2 and cursor is not None
+    page, cursor = service.get_user_chats_page("u1", limit=2, cursor=cursor)
+    assert len(page) == 2 and cursor is None
+
+
+def test_invalid_cursor(db):
+    with pytest.raises(ValueError):
+        ChatService(db).get_user_chats_page("u1", cursor="not-a-cursor")
+
+
+def test_cursor_past_the_end_is_empty(db):
+    _chats(db, 2)
+    page, cursor = ChatService(db).get_user_chats_page("u1", cursor=encode_cursor(datetime(2000, 1, 1), ""))
+    assert page == [] and cursor is None
+
+
+def test_tiered_chat_counts_cold_and_hot_messages(db):
+    service = ChatService(db)
+    chat = service.create_chat("t", "u1")
+    chat.messages_tiered = "true"
+    db.add(ColdMessageBatch(id="b1", chat_id=chat.id, payload=b"", message_count=5))
+    db.commit()
+
+    page, _ = service.get_user_chats_page("u1")
+    assert page[0]["message_count"] == 5
+    assert page[0]["last_message"]["created_at"] is None
+
+    # Written straight to the hot table, as a message landing before rehydration would be
+    db.add(Message(id="m1", content="new", role="user", chat_id=chat.id, user_id="u1"))
+    db.commit()
+    page, _ = service.get_user_chats_page("u1")
+    assert page[0]["message_count"] == 6
+    assert page[0]["last_message"]["snippet"] == "new"
@@ -0,0 +1,128 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import chat_title
+from app.api.chat_title import ChatTitleGenerator
+from app.core.metrics import metrics
+
+
+class FakeLLM:
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    async def ainvoke(self, messages):
+        self.calls.append(messages[-1]["content"])
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(content=reply)
+
+
+@pytest.fixture
+def generator():
+    generator = ChatTitleGenerator.__new__(ChatTitleGenerator)
+    generator._cache = chat_title.OrderedDict()
+    generator.llm = FakeLLM()
+    return generator
+
+
+def _tier(tier):
+    return metrics.get("chat_title_requests", tier=tier)
+
+
+@pytest.mark.parametrize("requirement, title", [
+    ("Marketing plan for new app", "Marketing Plan for New App"),
+    ("Can you help me fix the login bug?", "Fix the Login Bug"),
+    ("how to bake bread", "How to Bake Bread"),
+    ("SQL joins", "SQL Joins"),
+    ("请帮我写一份周报", "写一份周报"),
+])
+def test_short_requirements_are_titled_locally(generator, requirement, title):
+    assert generator._local_title(requirement) == title
+
+
+@pytest.mark.parametrize("requirement", [
+    "how are you",
+    "ok thanks",
+    "I want a pony please",
+    "hi there",
+    "what is this?",
+    "你好",
+    "谢谢你",
+    "Fix the bug. Then deploy it",
+    "see https://example.com",
+    "one two three four five six seven eight nine",
+])
+def test_small_talk_and_complex_requirements_need_the_model(generator, requirement):
+    assert generator._local_title(requirement) is None
+
+
+def test_local_then_cache_tiers(generator):
+    local, cache = _tier("local"), _tier("cache")
+
+    async def run():
+        return [
+            await generator.generate_title("Marketing plan for new app"),
+            await generator.generate_title("  marketing PLAN for new app?"),
+        ]
+
+    assert asyncio.run(run()) == ["Marketing Plan for New App"] * 2
+    assert (_tier("local") - local, _tier("cache") - cache) == (1, 1)
+    assert generator.llm.calls == []
+
+
+def test_llm_tier_is_cached(generator):
+    generator.llm = FakeLLM('"Pony Acquisition"')
+    llm = _tier("llm")
+
+    async def run():
+        return [await generator.generate_title("I want a pony please") for _ in range(2)]
+
+    assert asyncio.run(run()) == ["Pony Acquisition"] * 2
+    assert len(generator.llm.calls) == 1
+    assert _tier("llm") - llm == 1
+
+
+def test_llm_failure_falls_back(generator):
+    generator.llm = FakeLLM(RuntimeError("down"))
+    requirement = "I would like to plan a trip to Japan and Korea next spring with my family"
+    title = asyncio.run(generator.generate_title(requirement))
+    assert title == "Plan a trip to Japan and Korea next spring with..."
+
+
+def test_batch_sends_only_uncached_unique_requirements(generator):
+    generator.llm = FakeLLM(json.dumps({"1": "Greeting", "2": "Pony Request"}))
+    requirements = ["Marketing plan for new app", "how are you", "How are you?", "I want a pony please"]
+
+    titles = asyncio.run(generator.generate_titles(requirements))
+
+    assert titles == ["Marketing Plan for New App", "Greeting", "Greeting", "Pony Request"]
+    assert generator.llm.calls == ["1. how are you\n2. I want a pony please"]
+
+
+def test_batch_missing_entries_fall_back(generator):
+    generator.llm = FakeLLM('{"1": "Greeting"}')
+    titles = asyncio.run(generator.generate_titles(["how are you", "ok thanks"]))
+    assert titles == ["Greeting", "Ok"]
+
+
+def test_generate_chat_titles_endpoint(generator, monkeypatch):
+    generator.llm = FakeLLM(json.dumps({"1": "Greeting"}))
+    monkeypatch.setattr(chat_title, "title_generator", generator)
+    app = FastAPI()
+    app.include_router(chat_title.router, prefix="/api")
+    client = TestClient(app)
+
+    response = client.post("/api/generate-chat-titles", json={"user_requirements": ["SQL joins", "how are you"]})
+    assert response.status_code == 200
+    assert response.json() == {"titles": ["SQL Joins", "Greeting"]}
+
+    too_many = ["SQL joins"] * (chat_title.MAX_BATCH_REQUIREMENTS + 1)
+    response = client.post("/api/generate-chat-titles", json={"user_requirements": too_many})
+    assert response.status_code == 400
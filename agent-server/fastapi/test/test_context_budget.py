@@ -0,0 +1,52 @@
+from app.services import context_budget
+from app.services.context_budget import (
+    ContextBudgeter, TRUNCATION_MARKER, estimate_tokens, message_tokens, truncate_to_tokens
+)
+
+
+def test_estimate_counts_cjk_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("你好世界") == 4
+    assert estimate_tokens("abcdefgh") == 2
+
+
+def test_estimate_is_not_cached():
+    assert not hasattr(estimate_tokens, "cache_info")
+
+
+def test_message_tokens_cached_by_id(monkeypatch):
+    calls = []
+    monkeypatch.setattr(context_budget, "estimate_tokens", lambda text: calls.append(text) or len(text))
+    message = {"id": "m-cache-1", "content": "abcd"}
+    assert message_tokens(message) == 4
+    assert message_tokens(message) == 4
+    assert calls == ["abcd"]
+    assert "abcd" not in context_budget._message_tokens.values()
+    # Messages without an id (e.g. not stored yet) are estimated every time
+    message_tokens({"content": "xy"})
+    message_tokens({"content": "xy"})
+    assert calls == ["abcd", "xy", "xy"]
+
+
+def test_message_token_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(context_budget, "MESSAGE_TOKEN_CACHE_SIZE", 2)
+    for i in range(5):
+        message_tokens({"id": f"m-bound-{i}", "content": "a"})
+    assert list(context_budget._message_tokens)[-2:] == ["m-bound-3", "m-bound-4"]
+    assert len(context_budget._message_tokens) == 2
+
+
+def test_truncate_keeps_the_beginning_within_budget():
+    text = "字" * 1000
+    cut = truncate_to_tokens(text, 100)
+    assert cut.endswith(TRUNCATION_MARKER)
+    assert estimate_tokens(cut[:-len(TRUNCATION_MARKER)]) <= 100
+
+
+def test_fit_keeps_newest_history():
+    history = [{"role": "user", "content": "字" * 100} for _ in range(10)]
+    budgeter = ContextBudgeter(max_tokens=600, response_reserve=0, document_share=0.5)
+    document, kept = budgeter.fit("", "", None, history)
+    assert document is None
+    assert 0 < len(kept) < len(history)
+    assert kept == history[-len(kept):]
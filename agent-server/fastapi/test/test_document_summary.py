@@ -0,0 +1,136 @@
+import asyncio
+from datetime import datetime
+
+from app.services.ai_service import DocumentChatAgent, classify_query
+from app.services.document_summary_service import DocumentSummarizer, chunk_document
+from app.services.retrieval_service import ChatDocumentIndex
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    def __init__(self, delay=0):
+        self.calls = 0
+        self.delay = delay
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        self.prompts.append(messages[0]["content"])
+        await asyncio.sleep(self.delay)
+        return FakeResponse("summary")
+
+
+def test_index_version_changes_only_with_updated_at():
+    index = ChatDocumentIndex()
+    assert index.version_key() is None
+    index.add_document("d1", "Doc", "first paragraph\n\nsecond paragraph", datetime(2024, 1, 1))
+    version = index.version_key()
+    index.add_document("d1", "Doc", "first paragraph\n\nsecond paragraph", datetime(2024, 1, 1))
+    assert index.version_key() == version
+    index.add_document("d1", "Doc", "edited", datetime(2024, 1, 2))
+    assert index.version_key() != version
+    assert index.full_text().startswith("### Doc")
+
+
+def test_document_turns_with_different_chunks_summarize_once():
+    agent = DocumentChatAgent.__new__(DocumentChatAgent)
+    agent.llm = FakeLLM()
+    linked = ("v1", "### Doc\n\nwhole document text")
+
+    async def run():
+        for chunks in ("chunk about pricing", "chunk about hiring", "chunk about roadmap"):
+            await agent.process_message("summarize the document", [], chunks, None, linked)
+            await asyncio.sleep(0)
+        # Background summary of v1 finished; later turns use it without new calls
+        await asyncio.sleep(0.01)
+        before = agent.llm.calls
+        await agent.process_message("give me an overview of the document", [], "another chunk", None, linked)
+        return before
+
+    before = asyncio.run(run())
+    # three answers plus one summary call, then one more answer
+    assert before == 4
+    assert agent.llm.calls == 5
+
+
+def test_large_documents_are_answered_from_chunks_while_summarizing(override_settings):
+    override_settings(document_context_max_tokens=10)
+    agent = DocumentChatAgent.__new__(DocumentChatAgent)
+    agent.llm = FakeLLM(delay=0.05)
+    linked = ("v-large", "### Doc\n\n" + "a long paragraph about the roadmap " * 200)
+
+    async def run():
+        first = asyncio.create_task(
+            agent.process_message("summarize the document", [], "retrieved chunk", None, linked)
+        )
+        # The answer does not wait for the summary: both calls are in flight together
+        await asyncio.sleep(0.01)
+        in_flight = agent.llm.calls
+        await first
+        await asyncio.sleep(0.1)
+        await agent.process_message("summarize the document", [], "retrieved chunk", None, linked)
+        return in_flight
+
+    in_flight = asyncio.run(run())
+    assert in_flight >= 2
+    answer_prompts = [p for p in agent.llm.prompts if p.startswith("You are an AI assistant")]
+    assert "Linked Documents:\nretrieved chunk" in answer_prompts[0]
+    assert "Document Analysis Summary:\nsummary" in answer_prompts[1]
+
+
+def test_classify_query_task_types():
+    assert classify_query("Please rewrite this paragraph") == {
+        "taskType": "writing_assistance", "needsDocumentAnalysis": False
+    }
+    assert classify_query("Summarize the document") == {
+        "taskType": "document_analysis", "needsDocumentAnalysis": True
+    }
+    assert classify_query("Why is the sky blue?") == {"taskType": "qa", "needsDocumentAnalysis": False}
+    assert classify_query("hello there") == {"taskType": "chat", "needsDocumentAnalysis": False}
+
+
+def test_classify_query_chinese_and_rule_order():
+    assert classify_query("帮我润色这段话")["taskType"] == "writing_assistance"
+    assert classify_query("总结一下这篇文档")["taskType"] == "document_analysis"
+    assert classify_query("这个是什么意思？")["taskType"] == "qa"
+    # Writing rules win over question words; document phrases still flag analysis
+    assert classify_query("How should I edit the summary?") == {
+        "taskType": "writing_assistance", "needsDocumentAnalysis": True
+    }
+    assert classify_query("What does it say according to the spec?") == {
+        "taskType": "qa", "needsDocumentAnalysis": True
+    }
+
+
+def test_one_block_edit_resummarizes_one_chunk():
+    blocks = [
+        f"Block {i} covers topic {i} " + " ".join(f"detail{i}x{j}" for j in range(15))
+        for i in range(80)
+    ]
+    index = ChatDocumentIndex()
+    index.add_document("d1", "Doc", "\n".join(blocks), datetime(2024, 1, 1))
+    before = index.full_text()
+    edited = list(blocks)
+    # Long enough to repack every later retrieval chunk
+    edited[20] = blocks[20] + " with a much longer ending sentence" * 4
+    index.add_document("d1", "Doc", "\n".join(edited), datetime(2024, 1, 2))
+    after = index.full_text()
+
+    # Summary chunks follow block boundaries, not the retrieval chunks
+    assert len(chunk_document(before)) > 2
+    assert len(set(chunk_document(after)) - set(chunk_document(before))) == 1
+
+    llm = FakeLLM()
+
+    async def run():
+        summarizer = DocumentSummarizer(llm)
+        await summarizer.summarize(before)
+        chunk_calls = sum(p.startswith("Summarize this part") for p in llm.prompts)
+        await summarizer.summarize(after)
+        return sum(p.startswith("Summarize this part") for p in llm.prompts) - chunk_calls
+
+    assert asyncio.run(run()) == 1
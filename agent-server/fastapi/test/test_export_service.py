@@ -0,0 +1,28 @@
+import json
+from datetime import datetime, timedelta
+
+from app.services.chat_service import ChatService
+from app.services.export_service import ChatExportService
+from app.services.tiering_service import MessageTieringService
+
+
+def _lines(db, user_id):
+    return [json.loads(line) for line in ChatExportService(db).iter_lines(user_id)]
+
+
+def test_hot_and_cold_messages_export_with_the_same_keys(db):
+    chats = ChatService(db)
+    hot = chats.create_chat("hot", "u1")
+    chats.create_message(hot.id, "hi", "user", "u1")
+    chats.create_message(hot.id, "partial", "assistant", "u1", truncated=True)
+    cold = chats.create_chat("cold", "u1")
+    chats.create_message(cold.id, "old", "user", "u1")
+    cold.is_archived = "true"
+    cold.archived_at = datetime.utcnow() - timedelta(days=90)
+    db.commit()
+    assert MessageTieringService(db).tier_archived_chats() == 1
+
+    messages = [line for line in _lines(db, "u1") if line["type"] == "message"]
+    assert len(messages) == 3
+    assert len({tuple(sorted(m)) for m in messages}) == 1
+    assert {m["content"]: m["truncated"] for m in messages} == {"hi": "false", "partial": "true", "old": "false"}
@@ -0,0 +1,162 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.api import process_mention as process_mention_api
+from app.services.ai_service import AIResponse, AIService
+from app.services.idempotency import IdempotencyConflict, IdempotencyStore, request_fingerprint
+from app.services.streaming_service import StreamingService
+
+
+def _counter(*results):
+    calls = []
+
+    async def execute():
+        calls.append(None)
+        result = results[min(len(calls), len(results)) - 1]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return execute, calls
+
+
+def test_retry_gets_the_stored_result():
+    store = IdempotencyStore()
+    execute, calls = _counter("first", "second")
+
+    async def run():
+        return [await store.run("s:u1", "k", "f", execute) for _ in range(2)]
+
+    assert asyncio.run(run()) == ["first", "first"]
+    assert len(calls) == 1
+
+
+def test_concurrent_retry_awaits_the_original():
+    store = IdempotencyStore()
+    calls = []
+
+    async def execute():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def run():
+        return await asyncio.gather(*(store.run("s:u1", "k", "f", execute) for _ in range(3)))
+
+    assert asyncio.run(run()) == [1, 1, 1]
+
+
+def test_key_reused_with_different_body_conflicts():
+    store = IdempotencyStore()
+    execute, _ = _counter("ok")
+
+    async def run():
+        await store.run("s:u1", "k", request_fingerprint({"a": 1}), execute)
+        await store.run("s:u1", "k", request_fingerprint({"a": 2}), execute)
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(run())
+
+
+def test_keys_are_scoped():
+    store = IdempotencyStore()
+    execute, calls = _counter("a", "b")
+
+    async def run():
+        return [await store.run(scope, "k", "f", execute) for scope in ("s:u1", "s:u2")]
+
+    assert asyncio.run(run()) == ["a", "b"]
+
+
+def test_raised_failure_is_forgotten():
+    store = IdempotencyStore()
+    execute, calls = _counter(RuntimeError("boom"), "ok")
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await store.run("s:u1", "k", "f", execute)
+        return await store.run("s:u1", "k", "f", execute)
+
+    assert asyncio.run(run()) == "ok"
+    assert len(calls) == 2
+
+
+def test_unreusable_result_is_not_stored():
+    store = IdempotencyStore()
+    execute, calls = _counter("error", "ok")
+
+    async def run():
+        return [await store.run("s:u1", "k", "f", execute, reusable=lambda r: r != "error") for _ in range(3)]
+
+    assert asyncio.run(run()) == ["error", "ok", "ok"]
+    assert len(calls) == 2
+
+
+def test_result_that_fails_later_is_run_again():
+    store = IdempotencyStore()
+    first, second = SimpleNamespace(failed=False), SimpleNamespace(failed=False)
+    execute, calls = _counter(first, second)
+
+    async def run():
+        results = [await store.run("s:u1", "k", "f", execute, reusable=lambda s: not s.failed)]
+        # e.g. a stream that was still generating when stored, then failed
+        first.failed = True
+        results.append(await store.run("s:u1", "k", "f", execute, reusable=lambda s: not s.failed))
+        return results
+
+    assert asyncio.run(run()) == [first, second]
+
+
+def test_entries_expire(override_settings):
+    override_settings(idempotency_max_entries=1)
+    store = IdempotencyStore()
+    execute, calls = _counter("a", "b", "c")
+
+    async def run():
+        await store.run("s:u1", "k1", "f", execute)
+        await store.run("s:u1", "k2", "f", execute)
+        return await store.run("s:u1", "k1", "f", execute)
+
+    assert asyncio.run(run()) == "c"
+
+
+def test_failed_mention_is_not_replayed(monkeypatch):
+    results = [
+        AIResponse(type="no_action", reasoning="AI处理时出错: timeout"),
+        AIResponse(type="suggest_edit", suggestion="ok", reasoning="r"),
+    ]
+
+    async def process_mention_request(self, **kwargs):
+        return results.pop(0)
+
+    monkeypatch.setattr(AIService, "process_mention_request", process_mention_request)
+    request = process_mention_api.MentionRequest(prompt="@ai 润色一下", document_content="", block_id="b1")
+
+    async def run():
+        return [
+            await process_mention_api.process_mention(request, idempotency_key="mention-retry", user_id="u1")
+            for _ in range(3)
+        ]
+
+    first, second, third = asyncio.run(run())
+    assert first.type == "no_action"
+    assert second.type == third.type == "suggest_edit"
+    assert results == []
+
+
+def test_streaming_error_marks_the_response_failed():
+    service = StreamingService()
+
+    async def astream(messages):
+        raise RuntimeError("model unavailable")
+        yield
+
+    service.streaming_agent.llm = SimpleNamespace(astream=astream)
+
+    async def run():
+        return [chunk async for chunk in service.stream_chat_response("hi", [])]
+
+    assert asyncio.run(run()) == ["Sorry, I encountered an error while processing your request."]
+    assert service.failed
@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from app.models.chat import Message
+from app.services import ingest_service
+from app.services.chat_service import ChatService
+from app.services.ingest_service import MessageIngestService
+
+
+async def _body(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _ingest(db, *chunks, user_id="u1", chat_id=None):
+    return asyncio.run(MessageIngestService(db).ingest(_body(*chunks), user_id, default_chat_id=chat_id))
+
+
+def _line(**row):
+    return json.dumps(row).encode() + b"\n"
+
+
+def test_rows_are_attributed_to_the_caller(db):
+    chat = ChatService(db).create_chat("t", "u1")
+    result = _ingest(
+        db,
+        _line(content="mine", role="user"),
+        _line(content="forged", role="user", user_id="someone-else"),
+        _line(content="explicit", role="assistant", user_id="u1"),
+        chat_id=chat.id
+    )
+    assert result["inserted"] == 2
+    assert result["errors"] == [{"line": 2, "error": "user_id does not match the importing user"}]
+    assert {m.user_id for m in db.query(Message)} == {"u1"}
+
+
+def test_other_users_chats_are_rejected(db):
+    other = ChatService(db).create_chat("t", "u2")
+    result = _ingest(db, _line(chat_id=other.id, content="x", role="user"))
+    assert result["inserted"] == 0
+    assert result["errors"][0]["error"].startswith("Chat not found")
+
+
+def test_over_long_line_is_skipped_and_reported(db, monkeypatch):
+    monkeypatch.setattr(ingest_service, "MAX_LINE_BYTES", 64)
+    chat = ChatService(db).create_chat("t", "u1")
+    long_line = b'{"content": "' + b"x" * 200
+    result = _ingest(
+        db,
+        _line(content="before", role="user"),
+        long_line[:100], long_line[100:], b'", "role": "user"}\n',
+        _line(content="after", role="user"),
+        chat_id=chat.id
+    )
+    assert result["inserted"] == 2
+    assert result["errors"] == [{"line": 2, "error": "Line exceeds 64 bytes"}]
+
+
+def test_unterminated_body_does_not_buffer_without_bound(db, monkeypatch):
+    monkeypatch.setattr(ingest_service, "MAX_LINE_BYTES", 64)
+    chat = ChatService(db).create_chat("t", "u1")
+    result = _ingest(db, *([b"y" * 50] * 10), chat_id=chat.id)
+    assert result["failed"] == 1
+    assert result["inserted"] == 0
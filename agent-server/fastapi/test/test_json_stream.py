@@ -0,0 +1,105 @@
+import json
+
+from app.services.json_stream import IncrementalJSONParser
+
+
+def feed_all(chunks):
+    parser = IncrementalJSONParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return parser, events
+
+
+def ends(events):
+    return [(path, value) for kind, path, value in events if kind == "end"]
+
+
+def deltas(events, path):
+    return "".join(text for kind, event_path, text in events if kind == "delta" and event_path == path)
+
+
+def every_split(text):
+    """Each way of cutting text into two chunks, plus one character per chunk"""
+    for i in range(len(text) + 1):
+        yield [text[:i], text[i:]]
+    yield list(text)
+
+
+def test_escapes_split_across_chunks():
+    text = json.dumps({"content": 'line\n"quoted"\\tab\tslash/'})
+    expected = json.loads(text)["content"]
+    for chunks in every_split(text):
+        parser, events = feed_all(chunks)
+        assert parser.done
+        assert ends(events) == [("content", expected)]
+        assert deltas(events, "content") == expected
+
+
+def test_unicode_escape_split_across_chunks():
+    text = '{"content": "caf\\u00e9 \\u4e2d\\u6587"}'
+    for chunks in every_split(text):
+        _, events = feed_all(chunks)
+        assert ends(events) == [("content", "café 中文")]
+        assert deltas(events, "content") == "café 中文"
+
+
+def test_surrogate_pair_split_across_chunks():
+    text = json.dumps({"content": "ok 😀!"})
+    assert "\\ud83d\\ude00" in text
+    for chunks in every_split(text):
+        _, events = feed_all(chunks)
+        assert ends(events) == [("content", "ok 😀!")]
+        # The high surrogate alone never leaks into a delta
+        assert deltas(events, "content") == "ok 😀!"
+
+
+def test_nested_objects_and_arrays():
+    value = {
+        "type": "patch",
+        "patch": {"block_id": "b1", "operation": "replace", "content": "new {text} [x]"},
+        "patches": [
+            {"block_id": "a", "content": "first"},
+            {"block_id": "b", "content": "second"},
+        ],
+        "matrix": [["x", "y"], ["z"]],
+        "count": 3,
+        "flag": True,
+        "reasoning": "done",
+    }
+    text = json.dumps(value)
+    for chunks in every_split(text):
+        parser, events = feed_all(chunks)
+        assert parser.done
+        assert ends(events) == [
+            ("type", "patch"),
+            ("patch.block_id", "b1"),
+            ("patch.operation", "replace"),
+            ("patch.content", "new {text} [x]"),
+            ("patches.0.block_id", "a"),
+            ("patches.0.content", "first"),
+            ("patches.1.block_id", "b"),
+            ("patches.1.content", "second"),
+            ("matrix.0.0", "x"),
+            ("matrix.0.1", "y"),
+            ("matrix.1.0", "z"),
+            ("reasoning", "done"),
+        ]
+
+
+def test_code_fenced_input_is_unwrapped():
+    text = 'Here you go:\n```json\n{"type": "modify_content", "content": "hi"}\n```\nTrailing {"ignored": "x"}'
+    for chunks in every_split(text):
+        parser, events = feed_all(chunks)
+        assert parser.done
+        assert ends(events) == [("type", "modify_content"), ("content", "hi")]
+
+
+def test_deltas_arrive_while_string_is_open():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"content": "Hel') == [("delta", "content", "Hel")]
+    assert parser.feed("lo wor") == [("delta", "content", "lo wor")]
+    assert parser.feed('ld", "type"') == [("delta", "content", "ld"), ("end", "content", "Hello world")]
+    # Keys are never reported
+    assert parser.feed(': "x"}') == [("delta", "type", "x"), ("end", "type", "x")]
+    assert parser.done
@@ -0,0 +1,79 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.services.ai_service import AIService
+from app.services.blocknote_service import extract_blocks
+from app.services.mention_batcher import MentionBatcher
+
+
+def _recording_runner(batches):
+    async def runner(mentions):
+        batches.append([mention["n"] for mention in mentions])
+        return [mention["n"] * 10 for mention in mentions]
+    return runner
+
+
+def test_each_caller_gets_its_own_result(override_settings):
+    override_settings(mention_batch_window_ms=20, mention_batch_max_size=10)
+    batches = []
+
+    async def run():
+        batcher = MentionBatcher()
+        runner = _recording_runner(batches)
+        return await asyncio.gather(*(batcher.submit("doc", {"n": n}, runner) for n in range(3)))
+
+    assert asyncio.run(run()) == [0, 10, 20]
+    assert batches == [[0, 1, 2]]
+
+
+def test_early_flush_cancels_the_window_timer(override_settings):
+    override_settings(mention_batch_window_ms=100, mention_batch_max_size=2)
+    batches = []
+
+    async def run():
+        batcher = MentionBatcher()
+        runner = _recording_runner(batches)
+        # Fills the batch and flushes before the window ends
+        await asyncio.gather(batcher.submit("doc", {"n": 1}, runner), batcher.submit("doc", {"n": 2}, runner))
+        assert batcher._timers == {}
+        # The next batch opens its own full window; the first batch's timer
+        # would otherwise fire about now and flush it alone
+        await asyncio.sleep(0.06)
+        third = asyncio.ensure_future(batcher.submit("doc", {"n": 3}, runner))
+        await asyncio.sleep(0.06)
+        fourth = asyncio.ensure_future(batcher.submit("doc", {"n": 4}, runner))
+        await asyncio.gather(third, fourth)
+
+    asyncio.run(run())
+    assert batches == [[1, 2], [3, 4]]
+
+
+def test_batch_results_matched_by_request_number():
+    document = json.dumps([
+        {"id": "a", "type": "paragraph", "content": [{"type": "text", "text": "first", "styles": {}}]},
+        {"id": "b", "type": "paragraph", "content": [{"type": "text", "text": "second", "styles": {}}]},
+    ])
+    extracted = extract_blocks(document)
+    service = AIService()
+    reply = json.dumps({"results": [
+        {"request": "2", "type": "patch", "reasoning": "r2",
+         "patch": {"block_id": "b", "operation": "replace", "content": "SECOND"}},
+        {"request": 1, "type": "patch", "reasoning": "r1",
+         "patch": {"block_id": "a", "operation": "delete"}},
+        {"request": None, "type": "no_action"},
+    ]})
+
+    async def ainvoke(messages):
+        return SimpleNamespace(content=reply)
+
+    service.chat_agent = SimpleNamespace(llm=SimpleNamespace(ainvoke=ainvoke))
+    mentions = [
+        {"instruction": "删掉这段", "action_type": "delete", "extracted": extracted,
+         "document_title": "Doc", "block_id": "a"},
+        {"instruction": "改成大写", "action_type": "modify", "extracted": extracted,
+         "document_title": "Doc", "block_id": "b"},
+    ]
+    results = asyncio.run(service.process_block_mention_batch(mentions))
+    assert [r.patch["operation"] for r in results] == ["delete", "replace"]
+    assert results[1].patch["content"] == "SECOND"
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from app.services.ai_service import AIService
+from app.services.blocknote_service import extract_blocks
+from app.services.mention_fast_path import match_local_edit
+
+
+def _text(text, **styles):
+    return {"type": "text", "text": text, "styles": styles}
+
+
+DOCUMENT = extract_blocks(json.dumps([
+    {"id": "a", "type": "paragraph", "content": [_text("第一段，旧的说法")]},
+    {"id": "b", "type": "paragraph", "content": [_text("加粗", bold=True), _text("旧的说法")]},
+    {"id": "c", "type": "paragraph", "content": [
+        {"type": "link", "href": "https://example.com", "content": [_text("旧的说法")]},
+    ]},
+]))
+
+
+@pytest.mark.parametrize("instruction", ["@ai 删除这段", "把这一段删掉吧", "请删除此段落。", "delete this paragraph", "remove it"])
+def test_delete_with_explicit_object(instruction):
+    assert match_local_edit(instruction, DOCUMENT, "a")["operation"] == "delete"
+
+
+@pytest.mark.parametrize("instruction", ["删除", "删掉吧", "@ai 删", "delete", "please remove", "删除这段中的错别字"])
+def test_delete_without_object_goes_to_model(instruction):
+    assert match_local_edit(instruction, DOCUMENT, "a") is None
+
+
+def test_duplicate_is_its_own_operation():
+    edit = match_local_edit("复制这段", DOCUMENT, "b")
+    assert edit["operation"] == "duplicate"
+    assert edit["content"] is None
+    assert match_local_edit("复制一份", DOCUMENT, "b") is None
+
+    response = AIService()._local_mention("duplicate this block", json.dumps([
+        {"id": "a", "type": "paragraph", "content": [_text("x")]},
+    ]), "a", "auto")
+    assert response.type == "duplicate_content"
+    assert response.patch == {"block_id": "a", "operation": "duplicate"}
+
+
+def test_replace_only_on_unstyled_blocks():
+    edit = match_local_edit("把“旧的”改成“新的”", DOCUMENT, "a")
+    assert edit["operation"] == "replace"
+    assert edit["content"] == "第一段，新的说法"
+    assert match_local_edit("把“旧的”改成“新的”", DOCUMENT, "b") is None
+    assert match_local_edit("把“旧的”改成“新的”", DOCUMENT, "c") is None
+
+
+def test_move_without_object_still_applies_to_the_block():
+    edit = match_local_edit("移到最后", DOCUMENT, "a")
+    assert edit["operation"] == "move"
+    assert edit["after_block_id"] == "c"
+    assert match_local_edit("move this block to the top", DOCUMENT, "c")["after_block_id"] is None
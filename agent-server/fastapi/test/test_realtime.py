@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("jose")
+pytest.importorskip("langgraph")
+
+from jose import jwt
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api import chats, realtime
+from app.core.config import settings
+from app.services.chat_service import ChatService
+from app.services.requirement_service import GLOBAL_TASKS, notify_task, watch_task
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(chats.router, prefix="/api/chats")
+    app.include_router(realtime.router, prefix="/api")
+    return TestClient(app)
+
+
+def _token(user_id):
+    return jwt.encode({"sub": user_id}, settings.secret_key, algorithm=settings.algorithm)
+
+
+def _task(task_id, user_id, status="running"):
+    GLOBAL_TASKS[task_id] = {
+        "id": task_id, "user_id": user_id, "status": status, "progress": 0, "message": "",
+        "results": {}, "initial_requirements": "x", "created_at": time.time(), "updated_at": time.time(),
+    }
+
+
+def test_invalid_token_is_rejected(client):
+    with pytest.raises(WebSocketDisconnect) as error:
+        with client.websocket_connect("/api/ws?token=nope") as ws:
+            ws.receive_json()
+    assert error.value.code == 1008
+
+
+def test_subscribe_only_to_own_chats(client, db):
+    mine = ChatService(db).create_chat("mine", "u1").id
+    theirs = ChatService(db).create_chat("theirs", "u2").id
+    with client.websocket_connect(f"/api/ws?token={_token('u1')}") as ws:
+        ws.send_json({"type": "subscribe", "channel": f"chat:{theirs}", "ref": 1})
+        assert ws.receive_json() == {
+            "channel": f"chat:{theirs}", "event": "error", "data": {"detail": "Chat not found"}, "ref": 1
+        }
+        ws.send_json({"type": "chat", "chat_id": theirs, "message": "hi", "ref": 2})
+        assert ws.receive_json()["data"] == {"detail": "Chat not found"}
+        ws.send_json({"type": "subscribe", "channel": f"chat:{mine}", "ref": 3})
+        assert ws.receive_json() == {
+            "channel": f"chat:{mine}", "event": "opened", "data": {"credits": settings.ws_channel_window}, "ref": 3
+        }
+
+
+def test_chat_created_over_http_opens_over_the_socket(client, db):
+    headers = {"Authorization": f"Bearer {_token('u1')}"}
+    response = client.post("/api/chats/create", json={"title": "Plans"}, headers=headers)
+    assert response.status_code == 200
+    chat_id = response.json()["id"]
+    assert response.json()["user_id"] == "u1"
+    assert client.get(f"/api/chats/{chat_id}", headers=headers).status_code == 200
+
+    with client.websocket_connect(f"/api/ws?token={_token('u1')}") as ws:
+        ws.send_json({"type": "subscribe", "channel": f"chat:{chat_id}", "ref": 1})
+        assert ws.receive_json()["event"] == "opened"
+
+    # Other users, anonymous requests included, do not see it
+    with client.websocket_connect(f"/api/ws?token={_token('u2')}") as ws:
+        ws.send_json({"type": "subscribe", "channel": f"chat:{chat_id}", "ref": 1})
+        assert ws.receive_json()["data"] == {"detail": "Chat not found"}
+    assert client.get(f"/api/chats/{chat_id}").status_code == 404
+
+
+def test_invalid_bearer_token_is_rejected_over_http(client, db):
+    response = client.post("/api/chats/create", json={"title": "x"}, headers={"Authorization": "Bearer nope"})
+    assert response.status_code == 401
+    anonymous = client.post("/api/chats/create", json={"title": "x"})
+    assert anonymous.json()["user_id"] == "default_user"
+
+
+def test_binary_frame_is_an_error_not_a_disconnect(client, db):
+    chat_id = ChatService(db).create_chat("mine", "u1").id
+    with client.websocket_connect(f"/api/ws?token={_token('u1')}") as ws:
+        ws.send_bytes(b"\x00\x01")
+        assert ws.receive_json() == {
+            "channel": None, "event": "error", "data": {"detail": "Binary frames are not supported"}
+        }
+        ws.send_json({"type": "subscribe", "channel": f"chat:{chat_id}", "ref": 1})
+        assert ws.receive_json()["event"] == "opened"
+
+
+def test_subscribe_only_to_own_requirement_tasks(client, db):
+    _task("t-theirs", "u2")
+    _task("t-mine", "u1", status="completed")
+    try:
+        with client.websocket_connect(f"/api/ws?token={_token('u1')}") as ws:
+            ws.send_json({"type": "subscribe", "channel": "requirement:t-theirs"})
+            assert ws.receive_json()["data"] == {"detail": "Task not found"}
+            ws.send_json({"type": "subscribe", "channel": "requirement:t-mine"})
+            assert ws.receive_json()["event"] == "opened"
+            progress = ws.receive_json()
+            assert progress["event"] == "progress" and progress["data"]["status"] == "completed"
+            assert "results" not in progress["data"]
+            assert ws.receive_json()["event"] == "closed"
+    finally:
+        GLOBAL_TASKS.pop("t-theirs", None)
+        GLOBAL_TASKS.pop("t-mine", None)
+
+
+def test_database_error_fails_the_request_not_the_connection(client, db, monkeypatch):
+    chat_id = ChatService(db).create_chat("mine", "u1").id
+
+    def broken(self, chat_id, user_id):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(realtime.ChatService, "get_user_chat", broken)
+    with client.websocket_connect(f"/api/ws?token={_token('u1')}") as ws:
+        ws.send_json({"type": "chat", "chat_id": chat_id, "message": "hi", "ref": "r1"})
+        assert ws.receive_json() == {
+            "channel": None, "event": "error", "data": {"detail": "database is down"}, "ref": "r1"
+        }
+        ws.send_json({"type": "subscribe", "channel": f"chat:{chat_id}", "ref": "r2"})
+        reply = ws.receive_json()
+        assert (reply["channel"], reply["ref"], reply["event"]) == (f"chat:{chat_id}", "r2", "error")
+
+
+def test_watch_task_sees_change_made_while_consumer_is_suspended():
+    async def run():
+        _task("t-race", "u1")
+        watcher = watch_task("t-race")
+        first = await watcher.__anext__()
+        # The consumer is busy with the first update when the task finishes
+        GLOBAL_TASKS["t-race"].update(status="completed", updated_at=time.time() + 1)
+        notify_task("t-race")
+        second = await asyncio.wait_for(watcher.__anext__(), 1)
+        await watcher.aclose()
+        return first, second
+
+    try:
+        first, second = asyncio.run(run())
+    finally:
+        GLOBAL_TASKS.pop("t-race", None)
+    assert (first["status"], second["status"]) == ("running", "completed")
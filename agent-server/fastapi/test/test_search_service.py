@@ -0,0 +1,64 @@
+from app.core.database import engine
+from app.services.chat_service import ChatService
+from app.services.search_service import MessageSearchService
+
+
+def _seed(db):
+    chats = ChatService(db)
+    chat = chats.create_chat("搜索", "u1")
+    chats.create_message(chat.id, "你好世界，今天天气不错", "user", "u1")
+    chats.create_message(chat.id, "Deploy the search index tonight", "assistant", "u1")
+    other = chats.create_chat("other", "u2")
+    chats.create_message(other.id, "你好世界", "user", "u2")
+    return chat
+
+
+def test_short_cjk_term_matches_substring(db):
+    chat = _seed(db)
+    results, next_offset = MessageSearchService(db).search("u1", "世界")
+    assert [r["chat_id"] for r in results] == [chat.id]
+    assert "<mark>世界</mark>" in results[0]["snippet"]
+    assert next_offset is None
+
+
+def test_long_cjk_and_english_terms(db):
+    _seed(db)
+    service = MessageSearchService(db)
+    assert len(service.search("u1", "今天天气")[0]) == 1
+    results = service.search("u1", "SEARCH deploy")[0]
+    assert len(results) == 1
+    assert "<mark>search</mark>" in results[0]["snippet"]
+
+
+def test_every_term_must_match(db):
+    _seed(db)
+    assert MessageSearchService(db).search("u1", "世界 deploy")[0] == []
+
+
+def test_like_wildcards_are_literal(db):
+    _seed(db)
+    assert MessageSearchService(db).search("u1", "%")[0] == []
+
+
+def test_index_built_with_old_tokenizer_is_rebuilt(db):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE messages_fts")
+        conn.exec_driver_sql("CREATE VIRTUAL TABLE messages_fts USING fts5(content, message_id UNINDEXED)")
+    chats = ChatService(db)
+    chat = chats.create_chat("t", "u1")
+    chats.create_message(chat.id, "旧索引里的世界", "user", "u1")
+    assert MessageSearchService(db).search("u1", "索引里的")[0] == []
+
+    from app.services import search_service
+    search_service._initialized_engines.clear()
+    MessageSearchService.ensure_index(engine)
+    assert len(MessageSearchService(db).search("u1", "索引里的")[0]) == 1
+
+
+def test_snippet_escapes_message_html(db):
+    chats = ChatService(db)
+    chat = chats.create_chat("x", "u1")
+    chats.create_message(chat.id, "<script>alert(1)</script> payload <b>", "user", "u1")
+    snippet = MessageSearchService(db).search("u1", "payload")[0][0]["snippet"]
+    assert "<script>" not in snippet and "<b>" not in snippet
+    assert snippet == "&lt;script&gt;alert(1)&lt;/script&gt; <mark>payload</mark> &lt;b&gt;"
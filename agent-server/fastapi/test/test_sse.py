@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.services.sse import (
+    HEARTBEAT_FRAME,
+    ClientDisconnected,
+    coalesce_events,
+    format_event,
+    until_disconnected,
+    with_heartbeats,
+)
+
+
+async def _timed(items):
+    """Yield (delay, item) pairs, sleeping delay seconds before each item"""
+    for delay, item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_format_event_splits_multiline_data():
+    assert format_event("a\nb", event="content", event_id="3") == "id: 3\nevent: content\ndata: a\ndata: b\n\n"
+    assert format_event("x") == "data: x\n\n"
+
+
+def test_coalesce_flushes_at_the_byte_threshold():
+    events = _timed([(0, ("content", "ab")), (0, ("content", "cd")), (0, ("content", "é")), (0, ("content", "f"))])
+    result = asyncio.run(_collect(coalesce_events(events, max_bytes=4, max_delay=10)))
+    # "é" is two bytes, so "éf" stays under the threshold until the end
+    assert result == [("content", "abcd"), ("content", "éf")]
+
+
+def test_coalesce_flushes_after_max_delay_while_waiting():
+    events = _timed([(0, ("content", "a")), (0, ("content", "b")), (0.2, ("content", "c"))])
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        flushed = []
+        async for kind, text in coalesce_events(events, max_bytes=1024, max_delay=0.05):
+            flushed.append((text, loop.time() - start))
+        return flushed
+
+    flushed = asyncio.run(run())
+    assert [text for text, _ in flushed] == ["ab", "c"]
+    # "ab" went out at the deadline, not when "c" arrived
+    assert flushed[0][1] < 0.15
+
+
+def test_coalesce_flushes_before_other_event_kinds():
+    events = _timed([(0, ("content", "a")), (0, ("title", "T")), (0, ("content", "b")), (0, ("content", "c"))])
+    result = asyncio.run(_collect(coalesce_events(events, max_bytes=1024, max_delay=10)))
+    assert result == [("content", "a"), ("title", "T"), ("content", "bc")]
+
+
+def test_heartbeats_while_idle():
+    frames = _timed([(0, "data: 1\n\n"), (0.2, "data: 2\n\n")])
+    result = asyncio.run(_collect(with_heartbeats(frames, interval=0.05)))
+    assert result[0] == "data: 1\n\n"
+    assert result[-1] == "data: 2\n\n"
+    # About one heartbeat per interval of silence, and nothing else in between
+    assert 2 <= len(result[1:-1]) <= 4
+    assert set(result[1:-1]) == {HEARTBEAT_FRAME}
+
+
+def test_no_heartbeats_when_frames_keep_coming():
+    frames = _timed([(0.01, "data: 1\n\n"), (0.01, "data: 2\n\n")])
+    assert asyncio.run(_collect(with_heartbeats(frames, interval=0.1))) == ["data: 1\n\n", "data: 2\n\n"]
+
+
+def test_until_disconnected_passes_everything_while_connected():
+    async def connected():
+        return False
+
+    events = _timed([(0, 1), (0.01, 2), (0, 3)])
+    assert asyncio.run(_collect(until_disconnected(events, connected, poll_interval=0.005))) == [1, 2, 3]
+
+
+def test_until_disconnected_stops_and_closes_upstream():
+    state = {"disconnected": False, "closed": False}
+
+    async def is_disconnected():
+        return state["disconnected"]
+
+    async def upstream():
+        try:
+            yield 1
+            while True:
+                await asyncio.sleep(1)
+                yield 2
+        finally:
+            state["closed"] = True
+
+    async def run():
+        received = []
+        with pytest.raises(ClientDisconnected):
+            async for item in until_disconnected(upstream(), is_disconnected, poll_interval=0.005):
+                received.append(item)
+                state["disconnected"] = True
+        return received
+
+    assert asyncio.run(run()) == [1]
+    assert state["closed"]
@@ -0,0 +1,199 @@
+import asyncio
+import json
+
+from app.services.stream_hub import ChatStream, StreamHub, parse_event_id
+
+
+async def _collect(events):
+    return [entry async for entry in events]
+
+
+def test_parse_event_id():
+    assert parse_event_id("abc:def:12") == ("abc:def", 12)
+    assert parse_event_id("abc") is None
+    assert parse_event_id("abc:x") is None
+    assert parse_event_id(None) is None
+
+
+def test_resume_replays_only_missed_events():
+    async def run():
+        stream = ChatStream("c1", buffer_size=10)
+        for text in ["a", "b", "c"]:
+            stream.publish_content(text)
+        stream.finish("[DONE]")
+        return await _collect(stream.events(last_seq=2))
+
+    events = asyncio.run(run())
+    assert [(e.seq, e.data) for e in events] == [(3, json.dumps({"content": "c"})), (4, "[DONE]")]
+    assert events[0].frame.startswith("id: ")
+    assert parse_event_id(events[0].frame.split("\n")[0][4:])[1] == 3
+
+
+def test_cursor_off_the_buffer_gets_snapshot_then_terminal():
+    async def run():
+        stream = ChatStream("c1", buffer_size=2)
+        stream.publish_title("T")
+        for text in ["a", "b", "c"]:
+            stream.publish_content(text)
+        stream.finish("[DONE]")
+        return await _collect(stream.events(last_seq=0))
+
+    events = asyncio.run(run())
+    assert [e.event for e in events] == ["snapshot", None]
+    assert json.loads(events[0].data) == {"snapshot": "abc", "title": "T"}
+    assert events[1].data == "[DONE]"
+
+
+def test_live_subscriber_sees_events_as_published():
+    async def run():
+        stream = ChatStream("c1", buffer_size=10)
+        reader = asyncio.ensure_future(_collect(stream.events()))
+        await asyncio.sleep(0)
+        stream.publish_content("a")
+        await asyncio.sleep(0)
+        stream.publish_content("b")
+        stream.finish("[DONE]")
+        return await reader
+
+    assert [e.seq for e in asyncio.run(run())] == [1, 2, 3]
+
+
+def test_lagging_subscriber_drops_to_latest():
+    async def run():
+        stream = ChatStream("c1", buffer_size=100)
+        for i in range(10):
+            stream.publish_content(str(i))
+        stream.finish("[DONE]")
+        return await _collect(stream.events(last_seq=0, max_lag=3))
+
+    events = asyncio.run(run())
+    assert events[0].event == "snapshot"
+    assert json.loads(events[0].data)["snapshot"] == "0123456789"
+    assert events[-1].data == "[DONE]"
+
+
+def test_abandoned_stream_is_cancelled_after_grace(override_settings):
+    override_settings(stream_resume_grace_seconds=0.01)
+
+    async def run():
+        hub = StreamHub()
+        stream = hub.create("c1")
+        stream.task = asyncio.ensure_future(asyncio.sleep(10))
+        hub.attach(stream)
+        hub.detach(stream)
+        await asyncio.sleep(0.05)
+        return stream.task.cancelled()
+
+    assert asyncio.run(run())
+
+
+def test_reconnect_within_grace_keeps_stream(override_settings):
+    override_settings(stream_resume_grace_seconds=0.01)
+
+    async def run():
+        hub = StreamHub()
+        stream = hub.create("c1")
+        stream.task = asyncio.ensure_future(asyncio.sleep(10))
+        hub.attach(stream)
+        hub.detach(stream)
+        hub.attach(hub.get(stream.stream_id))
+        await asyncio.sleep(0.05)
+        cancelled = stream.task.cancelled()
+        stream.task.cancel()
+        return cancelled
+
+    assert not asyncio.run(run())
+
+
+def test_forgotten_stream_replays_as_snapshot(override_settings):
+    override_settings(stream_replay_ttl_seconds=0)
+
+    async def run():
+        hub = StreamHub()
+        stream = hub.create("c1")
+        stream.publish_content("hello")
+        stream.finish("[DONE]")
+        hub.release(stream)
+        await asyncio.sleep(0.01)
+        assert hub.get(stream.stream_id) is None
+        return await _collect(stream.events())
+
+    events = asyncio.run(run())
+    assert [e.event for e in events] == ["snapshot", None]
+
+
+def test_follower_gets_each_new_generation():
+    async def run():
+        hub = StreamHub()
+        old = hub.create("c1")
+        old.finish("[DONE]")
+        received = []
+
+        async def follow():
+            async for entry in hub.follow_chat("c1"):
+                received.append(entry)
+                if entry.data == "[DONE]":
+                    return
+
+        follower = asyncio.ensure_future(follow())
+        await asyncio.sleep(0)
+        stream = hub.create("c1")
+        await asyncio.sleep(0)
+        stream.publish_content("hi")
+        stream.finish("[DONE]")
+        await asyncio.wait_for(follower, 1)
+        return stream, received
+
+    stream, received = asyncio.run(run())
+    assert received[0].event == "stream"
+    assert json.loads(received[0].data) == {"stream_id": stream.stream_id}
+    assert [e.data for e in received[1:]] == [json.dumps({"content": "hi"}), "[DONE]"]
+
+
+def test_departed_followers_leave_no_waiters():
+    async def run():
+        hub = StreamHub()
+
+        async def follow():
+            async for _ in hub.follow_chat("c1"):
+                pass
+
+        followers = [asyncio.ensure_future(follow()) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert len(hub._chat_waiters["c1"]) == 2
+
+        # One follower disconnects; the other still wakes up for the next stream
+        followers[0].cancel()
+        await asyncio.gather(followers[0], return_exceptions=True)
+        assert len(hub._chat_waiters["c1"]) == 1
+
+        followers[1].cancel()
+        await asyncio.gather(followers[1], return_exceptions=True)
+        return hub
+
+    hub = asyncio.run(run())
+    assert hub._chat_waiters == {}
+
+
+def test_remaining_follower_still_wakes_after_another_leaves():
+    async def run():
+        hub = StreamHub()
+        received = []
+
+        async def follow():
+            async for entry in hub.follow_chat("c1"):
+                received.append(entry.event)
+                return
+
+        leaving = asyncio.ensure_future(follow())
+        staying = asyncio.ensure_future(follow())
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.gather(leaving, return_exceptions=True)
+        hub.create("c1")
+        await asyncio.wait_for(staying, 1)
+        return hub, received
+
+    hub, received = asyncio.run(run())
+    assert received == ["stream"]
+    assert hub._chat_waiters == {}
@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services.streaming_service import TITLE_LINE_MAX_CHARS, StreamingChatAgent, StreamingService
+
+
+class FakeLLM:
+    def __init__(self, *chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    async def astream(self, messages):
+        for chunk in self.chunks:
+            yield SimpleNamespace(content=chunk)
+        if self.error:
+            raise self.error
+
+
+def _service(*chunks, error=None):
+    agent = StreamingChatAgent.__new__(StreamingChatAgent)
+    agent.llm = FakeLLM(*chunks, error=error)
+    agent.failed = False
+    service = StreamingService.__new__(StreamingService)
+    service.streaming_agent = agent
+    return service
+
+
+def _first_turn(service):
+    async def run():
+        return [event async for event in service.stream_first_turn("Plan a trip", [])]
+
+    return asyncio.run(run())
+
+
+def test_title_line_split_across_chunks():
+    service = _service("TI", "TLE: Trip ", "Plan\n", "\nHello ", "world")
+    assert _first_turn(service) == [("title", "Trip Plan"), ("content", "Hello "), ("content", "world")]
+    assert not service.failed
+
+
+def test_title_and_answer_in_one_chunk():
+    service = _service('标题：“日本旅行计划”\n\n好的，', "我们开始")
+    assert _first_turn(service) == [("title", "日本旅行计划"), ("content", "好的，"), ("content", "我们开始")]
+
+
+def test_missing_title_line_is_passed_through_as_content():
+    service = _service("Sure", "! Here is\n", "the plan")
+    assert _first_turn(service) == [("content", "Sure! Here is\n"), ("content", "the plan")]
+
+    long_line = "x" * TITLE_LINE_MAX_CHARS
+    events = _first_turn(_service(long_line, "more"))
+    assert events == [("content", long_line), ("content", "more")]
+
+
+def test_short_reply_without_newline_is_flushed_at_the_end():
+    assert _first_turn(_service("Hi", " there")) == [("content", "Hi there")]
+    assert _first_turn(_service("TITLE: Greeting")) == [("title", "Greeting")]
+
+
+def test_error_before_title_yields_only_the_apology():
+    service = _service("TITLE: Tri", error=RuntimeError("connection reset"))
+    events = _first_turn(service)
+    assert events == [("content", "Sorry, I encountered an error while processing your request.")]
+    assert service.failed
+
+
+def test_error_after_title_keeps_the_title():
+    service = _service("TITLE: Trip Plan\n\nDay one", error=RuntimeError("connection reset"))
+    events = _first_turn(service)
+    assert events[:2] == [("title", "Trip Plan"), ("content", "Day one")]
+    assert events[2][1].startswith("Sorry")
+    assert service.failed
@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.services.chat_service import ChatService
+from app.services.summary_service import ChatSummaryService
+from app.services.tiering_service import MessageTieringService
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages[0]["content"])
+        return FakeResponse("summary")
+
+
+def test_reading_a_summary_does_not_build_a_client(db):
+    service = ChatSummaryService(db)
+    assert service.get_summary("missing") is None
+    assert service._llm is None
+
+
+def test_update_folds_cold_history_and_keeps_the_tail(db, override_settings):
+    override_settings(summary_tail_messages=2, summary_min_new_messages=2)
+    chats = ChatService(db)
+    chat = chats.create_chat("t", "u1")
+    for i in range(4):
+        chats.create_message(chat.id, f"cold {i}", "user", "u1")
+    chat.is_archived = "true"
+    chat.archived_at = datetime.utcnow() - timedelta(days=90)
+    db.commit()
+    assert MessageTieringService(db).tier_archived_chats() == 1
+    # Restored chats keep their cold batch until the next write; fold it in anyway
+    chat.is_archived = "false"
+    db.commit()
+
+    service = ChatSummaryService(db)
+    service._llm = FakeLLM()
+    assert asyncio.run(service.update_summary(chat.id))
+
+    prompt = service._llm.prompts[0]
+    assert "cold 0" in prompt and "cold 1" in prompt
+    assert "cold 2" not in prompt and "cold 3" not in prompt
+    assert service.get_summary(chat.id).summary == "summary"
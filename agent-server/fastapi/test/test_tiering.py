@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, inspect, text
+
+from app.core.schema import upgrade_schema
+from app.models.chat import Chat, ColdMessageBatch, Message
+from app.services import tiering_service
+from app.services.chat_service import ChatService
+from app.services.tiering_service import MessageTieringService
+
+
+def _archived_chat(db, messages=3, days=60):
+    chats = ChatService(db)
+    chat = chats.create_chat("old", "u1")
+    for i in range(messages):
+        chats.create_message(chat.id, f"message {i}", "user" if i % 2 == 0 else "assistant", "u1")
+    chat.is_archived = "true"
+    chat.archived_at = datetime.utcnow() - timedelta(days=days)
+    db.commit()
+    return chat
+
+
+def test_tier_and_rehydrate_round_trip(db):
+    chat = _archived_chat(db)
+    assert MessageTieringService(db).tier_archived_chats() == 1
+
+    db.expire_all()
+    assert db.query(Message).filter(Message.chat_id == chat.id).count() == 0
+    assert db.query(ColdMessageBatch).filter(ColdMessageBatch.chat_id == chat.id).one().message_count == 3
+    history = ChatService(db).get_conversation_history(chat.id, limit=10)
+    assert [m["content"] for m in history] == ["message 0", "message 1", "message 2"]
+
+    chats = ChatService(db)
+    chats.restore_chat(chat.id)
+    chats.create_message(chat.id, "back again", "user", "u1")
+    db.expire_all()
+    assert db.query(Message).filter(Message.chat_id == chat.id).count() == 4
+    assert db.query(ColdMessageBatch).count() == 0
+
+
+def test_recently_archived_chat_is_not_tiered(db):
+    _archived_chat(db, days=1)
+    assert MessageTieringService(db).tier_archived_chats() == 0
+
+
+def test_message_written_during_tiering_is_kept(db, monkeypatch):
+    chat = _archived_chat(db)
+    original = tiering_service.MessageSearchService.remove_messages
+
+    def write_meanwhile(self, message_ids):
+        # Lands between the SELECT of the messages and their DELETE
+        self.db.add(Message(id="late", content="late", role="user", chat_id=chat.id, user_id="u1"))
+        self.db.flush()
+        original(self, message_ids)
+
+    monkeypatch.setattr(tiering_service.MessageSearchService, "remove_messages", write_meanwhile)
+    MessageTieringService(db).tier_archived_chats()
+
+    db.expire_all()
+    assert [m.id for m in db.query(Message).filter(Message.chat_id == chat.id)] == ["late"]
+    history = ChatService(db).get_conversation_history(chat.id, limit=10)
+    assert [m["content"] for m in history][-1] == "late"
+    assert len(history) == 4
+
+
+def test_upgrade_schema_adds_columns_and_backfills(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE chats (id VARCHAR PRIMARY KEY, title VARCHAR NOT NULL, user_id VARCHAR NOT NULL, "
+            "created_at DATETIME, updated_at DATETIME, is_archived VARCHAR)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE messages (id VARCHAR PRIMARY KEY, content TEXT NOT NULL, role VARCHAR NOT NULL, "
+            "chat_id VARCHAR NOT NULL REFERENCES chats (id), user_id VARCHAR NOT NULL, created_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO chats VALUES ('c1', 't', 'u1', '2024-01-01 00:00:00', '2024-02-01 00:00:00', 'true')"
+        ))
+        conn.execute(text("INSERT INTO messages VALUES ('m1', 'hi', 'user', 'c1', 'u1', '2024-01-01 00:00:00')"))
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)  # safe to run on every start
+
+    columns = {c["name"] for c in inspect(engine).get_columns("chats")}
+    assert {"archived_at", "messages_tiered"} <= columns
+    assert "cold_message_batches" in inspect(engine).get_table_names()
+    assert "Document" not in inspect(engine).get_table_names()
+    assert [i["name"] for i in inspect(engine).get_indexes("chats")] == ["ix_chats_user_archived_updated"]
+    assert "ix_messages_chat_created" in {i["name"] for i in inspect(engine).get_indexes("messages")}
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT archived_at, messages_tiered FROM chats WHERE id = 'c1'")).one()
+    assert row.messages_tiered == "false"
+    assert str(row.archived_at).startswith("2024-02-01")
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT truncated FROM messages WHERE id = 'm1'")).scalar() == "false"
@@ -12,7 +12,7 @@ export async function POST(req: NextRequest) {
       return new NextResponse('Unauthorized', { status: 401 })
     }
 
-    const { prompt, document_content, document_title, block_id } = await req.json()
+    const { prompt, document_content, document_title, block_id, document_id, mode } = await req.json()
 
     if (!prompt) {
       return new NextResponse('Bad Request', { status: 400 })
@@ -34,6 +34,9 @@ export async function POST(req: NextRequest) {
           document_content: document_content || '',
           document_title: document_title || '',
           block_id: block_id || '',
+          // 同一文档上的并发提及按 document_id 合并；mode 为 auto | block | document
+          document_id: document_id,
+          mode: mode || 'auto',
         }),
       })
 
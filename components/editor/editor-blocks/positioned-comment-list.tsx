@@ -99,6 +99,40 @@ const getBlockContent = (editor: BlockNoteEditor<any, any>, blockId: string): st
   }
 }
 
+// 移动指定块：没有afterBlockId时移动到文档开头
+const moveBlock = (editor: BlockNoteEditor<any, any>, targetBlockId: string, afterBlockId?: string) => {
+  const targetBlock = editor.getBlock(targetBlockId)
+  const anchorBlock = afterBlockId ? editor.getBlock(afterBlockId) : undefined
+  if (!targetBlock || (afterBlockId && !anchorBlock)) {
+    toast.error('找不到要移动的内容块')
+    return
+  }
+  editor.removeBlocks([targetBlock])
+  if (anchorBlock) {
+    editor.insertBlocks([targetBlock], anchorBlock, 'after')
+  } else {
+    editor.insertBlocks([targetBlock], editor.document[0], 'before')
+  }
+  toast.info('AI已移动指定内容')
+}
+
+// 去掉块及其子块的id，插入时由编辑器分配新id
+const withoutIds = ({ id, children, ...block }: any): any => ({
+  ...block,
+  children: (children || []).map(withoutIds),
+})
+
+// 在指定块之后插入一份完整副本（保留类型、属性、样式和子块）
+const duplicateBlock = (editor: BlockNoteEditor<any, any>, targetBlockId: string) => {
+  const targetBlock = editor.getBlock(targetBlockId)
+  if (!targetBlock) {
+    toast.error('找不到要复制的内容块')
+    return
+  }
+  editor.insertBlocks([withoutIds(targetBlock)], targetBlock, 'after')
+  toast.info('AI已复制指定内容')
+}
+
 // 计算评论相对于侧边栏的位置
 const calculateCommentPosition = (
   blockId: string,
@@ -859,6 +893,10 @@ export function PositionedCommentList({
             } else {
               toast.error('找不到要删除的内容块')
             }
+          } else if (instruction.type === 'move_block' && instruction.targetBlockId) {
+            moveBlock(editor, instruction.targetBlockId, instruction.afterBlockId)
+          } else if (instruction.type === 'duplicate_block' && instruction.targetBlockId) {
+            duplicateBlock(editor, instruction.targetBlockId)
           }
         } catch (error) {
           console.error('Error applying AI instruction:', error)
@@ -1144,6 +1182,10 @@ export function PositionedCommentList({
             } else {
               toast.error('找不到要删除的内容块')
             }
+          } else if (instruction.type === 'move_block' && instruction.targetBlockId) {
+            moveBlock(editor, instruction.targetBlockId, instruction.afterBlockId)
+          } else if (instruction.type === 'duplicate_block' && instruction.targetBlockId) {
+            duplicateBlock(editor, instruction.targetBlockId)
           }
         } catch (error) {
           console.error('Error applying AI instruction:', error)
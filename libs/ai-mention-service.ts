@@ -15,9 +15,22 @@ export interface AIMentionContext {
 }
 
 export interface AIAction {
-  type: 'modify_content' | 'add_content' | 'suggest_edit' | 'delete_content' | 'no_action'
+  type:
+    | 'modify_content'
+    | 'add_content'
+    | 'suggest_edit'
+    | 'delete_content'
+    | 'move_content'
+    | 'duplicate_content'
+    | 'no_action'
   content?: string | Array<any> | object
   blockId?: string
+  patch?: {
+    block_id: string
+    operation: 'replace' | 'insert_after' | 'delete' | 'move' | 'duplicate'
+    content?: string | null
+    after_block_id?: string | null // 移动时的目标位置，null表示文档开头
+  }
   suggestion?: string
   reasoning?: string
 }
@@ -72,6 +85,7 @@ export async function processAIMentionDirect(context: AIMentionContext): Promise
           document_content: context.documentContent || '',
           document_title: context.documentTitle || '',
           block_id: context.blockId || '',
+          document_id: context.documentId,
         }),
       })
 
@@ -134,6 +148,7 @@ export async function processAIMention(context: AIMentionContext): Promise<AIAct
       document_content: document.content || '',
       document_title: document.title,
       block_id: context.blockId,
+      document_id: context.documentId,
     })
 
     return aiResponse
@@ -236,6 +251,8 @@ async function callAIService(
     document_content: string
     document_title: string
     block_id: string
+    document_id?: string
+    mode?: 'auto' | 'block' | 'document'
   }
 ): Promise<AIAction> {
   try {
@@ -278,7 +295,7 @@ export async function applyAIModification(
   message: string
   newContent?: string
   insertInstruction?: {
-    type: 'add_block' | 'modify_block' | 'delete_block'
+    type: 'add_block' | 'modify_block' | 'delete_block' | 'move_block' | 'duplicate_block'
     content?: string
     afterBlockId?: string
     targetBlockId?: string
@@ -309,8 +326,9 @@ export async function applyAIModification(
           type: 'add_block',
           content:
             typeof modification.content === 'string' ? modification.content : JSON.stringify(modification.content),
-          afterBlockId: commentBlockId,
-          insertAtEnd: true, // 建议插入到文档末尾
+          // 块级补丁插入到指定块之后，否则插入到文档末尾
+          afterBlockId: modification.patch?.block_id || commentBlockId,
+          insertAtEnd: !modification.patch,
         },
       }
     }
@@ -367,6 +385,31 @@ export async function applyAIModification(
       }
     }
 
+    // 支持移动操作（afterBlockId为空时移动到文档开头）
+    if (modification.type === 'move_content' && modification.blockId) {
+      return {
+        success: true,
+        message: `AI回复：${modification.reasoning}`,
+        insertInstruction: {
+          type: 'move_block',
+          targetBlockId: modification.blockId,
+          afterBlockId: modification.patch?.after_block_id || undefined,
+        },
+      }
+    }
+
+    // 支持复制操作（副本插入到原块之后）
+    if (modification.type === 'duplicate_content' && modification.blockId) {
+      return {
+        success: true,
+        message: `AI回复：${modification.reasoning}`,
+        insertInstruction: {
+          type: 'duplicate_block',
+          targetBlockId: modification.blockId,
+        },
+      }
+    }
+
     return {
       success: false,
       message: 'AI响应格式不正确',